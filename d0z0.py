@@ -1,15 +1,45 @@
-import concurrent.futures
+import contextlib
+import mmap
 import os
+import re
 import subprocess
 import shutil
+import tempfile
+import time
+
+import instrumentation
+from delphes_card import read_card, subsystems
+from executors import CondorExecutor, FakeQueueExecutor, JobLostError, LocalExecutor, SlurmExecutor
+from file_checks import check_analysis, check_file, check_hepmc, check_root
+from results_store import results_db_path
+from scheduler import Task, run_graph
+from stage_cache import StageCache
+from sweep import generate_cards, sweep_values
+from worker_pool import WorkerError, WorkerPool
 
 
 
 ########### CHANGE THIS TO YOUR LOCAL DIRECTORY #############
 d0z0_path = "/home/submit/escaso/summer2025/d0z0"
+gun_module = os.path.join(d0z0_path, "hepmc_gun.py")
 ceph_path = "/ceph/submit/data/user/e/escaso/FCC/summer2025/d0z0_results"
 input_path = os.path.join(d0z0_path, "gun_input")
 hepmc_path = os.path.join(d0z0_path, "gun_hepmc")
+cache_path = os.path.join(ceph_path, ".stage_cache")
+
+cards_path = f"{d0z0_path}/delphes/cards"
+generated_cards_path = os.path.join(cards_path, "generated")
+output_card = f"{cards_path}/output.tcl"
+fccanalyses_setup = "/work/submit/jaeyserm/software/FCCAnalyses/setup.sh"
+worker_script = f"{d0z0_path}/delphes/worker.py"
+
+# where the stage commands run when no other executor is given (see executors.py)
+local_executor = LocalExecutor()
+
+# failures worth retrying (a crashed or lost job, a dead or hung worker), as opposed to bad inputs
+# (a WorkerCallError, raised by the analysis/plot code itself, is not retried)
+transient_errors = (subprocess.CalledProcessError, WorkerError, JobLostError)
+max_retries = 2
 
 pdg_dict = {
     # Quarks
@@ -46,78 +76,583 @@ class Gun_directories:
         for path in [self.root, self.analysis, self.d0_plots, self.z0_plots]:
             os.makedirs(path, exist_ok=True)
 
-### GENERATE DETECTOR RESPONSE ###
-def detector_response(root_dir, detector_card, hepmcs_directory, max_workers = 12):
 
-    def helper_response(hepmc):
+def detector_card_path(detector):
+    # hand-made cards in delphes/cards, sweep variants (sweep.py) in delphes/cards/generated
+    card = f"{cards_path}/{detector}.tcl"
+    if not os.path.exists(card) and os.path.exists(f"{generated_cards_path}/{detector}.tcl"):
+        return f"{generated_cards_path}/{detector}.tcl"
+    return card
 
-        filename, _ = os.path.splitext(hepmc)
 
-        command = (
-            f"source {d0z0_path}/particleGun/env.sh && "
-            "DelphesHepMC_EDM4HEP "
-            f"{detector_card} "
-            f"{d0z0_path}/delphes/cards/output.tcl "
-            f"{root_dir}/{filename}.root "
-            f"{hepmcs_directory}/{hepmc}"
-        )
+def detector_radius(detector, subsystem, layer):
+    # radius (mm) of the studied layer, from the card; -1 when there is none (e.g. "inside_pipe", -1)
+    if subsystem not in subsystems or layer < 1:
+        return -1
+    return read_card(detector_card_path(detector)).layer_radius(subsystem, layer)
+
+
+# compressed gun output (hepmc_gun.py) is decompressed on the fly into the Delphes stdin
+decompressors = {".gz": "gzip -dc", ".zst": "zstd -dc"}
+
+
+def hepmc_sample_name(gun_hepmc):
+    # mu_minus_theta_10_p_1.hepmc[.gz|.zst] -> mu_minus_theta_10_p_1
+    name, ext = os.path.splitext(gun_hepmc)
+    if ext in decompressors:
+        name, _ = os.path.splitext(name)
+    return name
+
 
-        subprocess.run(["bash", "-lc", command], check=True)
+def hepmc_event_ranges(hepmc_file, nshards):
+    """
+    Splits a plain HepMC3 ASCII file into nshards blocks of consecutive events of about the same
+    size (all gun events have about the same length), cut at event boundaries.
+    Returns the length of the header and the (start, stop) byte range of every block.
+    """
+
+    with open(hepmc_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_end = mm.find(b"\nE ") + 1
+        footer = mm.rfind(b"HepMC::Asciiv3-END_EVENT_LISTING")
+        if header_end == 0 or footer == -1:
+            raise ValueError(f"{hepmc_file} is not a complete HepMC3 ASCII file")
+
+        bounds = [header_end]
+        for shard in range(1, nshards):
+            # first event starting after the approximate cut
+            start = mm.find(b"\nE ", header_end + (footer - header_end)*shard//nshards - 1, footer) + 1
+            bounds.append(max(start, bounds[-1]) if start > 0 else footer)
+        bounds.append(footer)
+
+    return header_end, list(zip(bounds[:-1], bounds[1:]))
+
+
+def sample_shards(hepmc_files, nshards):
+    """
+    (hepmc_file, shard, nshards) Delphes jobs of one sample: the files themselves when the gun
+    already wrote several (gunHEPMC3 nshards) or a single compressed file (it can't be seeked),
+    nshards event ranges of the file otherwise.
+    """
+
+    if len(hepmc_files) > 1 or nshards == 1 or os.path.splitext(hepmc_files[0])[1] in decompressors:
+        return [(hepmc_file, 0, 1) for hepmc_file in hepmc_files]
+    return [(hepmc_files[0], shard, nshards) for shard in range(nshards)]
+
+
+### GENERATE DETECTOR RESPONSE ###
+def response_sample(hepmc_file, root_file, detector_card, shard = 0, nshards = 1, cache = None, executor = None):
+    """
+    shard/nshards: only run Delphes on that block of events of hepmc_file (see hepmc_event_ranges)
+    """
+
+    # the Delphes output only depends on the two cards and the events
+    if cache is not None:
+        key = cache.key("delphes", files=[detector_card, output_card, hepmc_file], params=[shard, nshards] if nshards > 1 else [], outputs=[root_file])
+        if cache.is_done(key):
+            print(f"Skipping Delphes on {hepmc_file}{f' (shard {shard}/{nshards})' if nshards > 1 else ''}: up to date")
+            return
+
+    check_hepmc(hepmc_file)
+
+    # "-": the reader takes the events from stdin, nothing decompressed is written to disk
+    decompress = decompressors.get(os.path.splitext(hepmc_file)[1])
+
+    if nshards > 1:
+        # header + the events of the shard + end of listing, straight from the file
+        header_end, ranges = hepmc_event_ranges(hepmc_file, nshards)
+        start, stop = ranges[shard]
+        events = (
+            f"{{ head -c {header_end} {hepmc_file}; tail -c +{start + 1} {hepmc_file} | head -c {stop - start}; "
+            "echo HepMC::Asciiv3-END_EVENT_LISTING; } | "
+        )
+    elif decompress:
+        events = f"{decompress} {hepmc_file} | "
+    else:
+        events = ""
+
+    command = (
+        f"source {d0z0_path}/particleGun/env.sh && "
+        f"{f'set -o pipefail && {events}' if events else ''}"
+        "DelphesHepMC_EDM4HEP "
+        f"{detector_card} "
+        f"{output_card} "
+        f"{root_file} "
+        f"{'-' if events else hepmc_file}"
+    )
+
+    (executor or local_executor).run(command, name=f"delphes_{os.path.basename(root_file)}")
+    check_root(root_file)
+
+    if cache is not None:
+        cache.mark_done(key, [root_file])
+
+
+def open_fifo(fifo, process, poll = 0.1):
+    """
+    Write end of a FIFO read by process. A plain open() would block forever if the process
+    died before opening its input, so poll in non-blocking mode until it is there.
+    """
+
+    while True:
+        try:
+            fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError:
+            if process.poll() is not None:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+            time.sleep(poll)
+
+    os.set_blocking(fd, True)
+    return os.fdopen(fd, 'w')
+
+
+def stream_response_sample(input_card, responses, cache = None):
+    """
+    Streaming version of response_sample: the events of one gun card are generated in-process
+    (hepmc_gun.py) and teed through one FIFO per detector to Delphes processes running at the
+    same time, so no HepMC file is written at all.
+    responses: (detector_card, root_file) pairs fed with the same events
+    """
+
+    # numpy is only needed for streaming
+    import hepmc_gun
+
+    # the events only depend on the gun card and the generator
+    keys = {}
+    if cache is not None:
+        for detector_card, root_file in responses:
+            keys[root_file] = cache.key("delphes_stream", files=[detector_card, output_card, input_card, gun_module], outputs=[root_file])
+        responses = [(detector_card, root_file) for detector_card, root_file in responses if not cache.is_done(keys[root_file])]
+
+    if not responses:
+        print(f"Skipping Delphes on {input_card}: up to date")
+        return
+
+    check_file(input_card)
+
+    with tempfile.TemporaryDirectory() as fifo_dir:
+        processes, streams = [], []
+        try:
+            for i, (detector_card, root_file) in enumerate(responses):
+                os.makedirs(os.path.dirname(root_file), exist_ok=True)
+                fifo = os.path.join(fifo_dir, f"{i}.hepmc")
+                os.mkfifo(fifo)
+
+                # the HepMC reader seeks its input file to get its length, which a FIFO has not:
+                # the events go to stdin ("-") as for the compressed and sharded inputs
+                command = (
+                    f"source {d0z0_path}/particleGun/env.sh && "
+                    "DelphesHepMC_EDM4HEP "
+                    f"{detector_card} "
+                    f"{output_card} "
+                    f"{root_file} "
+                    f"- < {fifo}"
+                )
+                processes.append(subprocess.Popen(["bash", "-lc", command]))
+                streams.append(hepmc_gun.ThreadedStream(open_fifo(fifo, processes[-1])))
+
+            hepmc_gun.generate(input_card, streams, chunk_size=1000)
+
+        except BrokenPipeError:
+            # one Delphes stopped reading, its exit code is reported below
+            pass
+
+        finally:
+            # closing the FIFOs ends the event loops, also of the other Delphes when one of them died
+            errors = []
+            for stream in streams:
+                try:
+                    stream.close()
+                except Exception as e:
+                    errors.append(e)
+            for process in processes:
+                instrumentation.wait(process)
+
+    for process in processes:
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    if errors:
+        raise errors[0]
+
+    for _, root_file in responses:
+        check_root(root_file)
+
+    if cache is not None:
+        for detector_card, root_file in responses:
+            cache.mark_done(keys[root_file], [root_file])
+
+
+def detector_response(root_dir, detector_card, hepmcs_directory, max_workers = 12, retries = max_retries, cache = None, executor = None):
 
     # run response for each sample
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
-        for gun_hepmc in os.listdir(hepmcs_directory):
-            pool.submit(helper_response, gun_hepmc)
+    tasks = []
+    for gun_hepmc in os.listdir(hepmcs_directory):
+        filename = hepmc_sample_name(gun_hepmc)
+        tasks.append(Task(f"{filename}/delphes", response_sample, f"{hepmcs_directory}/{gun_hepmc}", f"{root_dir}/{filename}.root", detector_card,
+                          cache=cache, executor=executor))
+
+    run_graph(tasks, max_workers=max_workers, retries=retries, retry_on=transient_errors)
 
  
 ### ANALYZE RESULTS ###
-def analyze_trk(roots_directory, analysis_directory, analysis_filename = f"{d0z0_path}/delphes/analysis_trk.py", max_workers = 12):
+def check_analysis_output(analysis_file):
+    # an unusable output (e.g. cut short by a killed job) is removed, so it is never taken for a finished one
+    try:
+        check_analysis(analysis_file)
+    except (FileNotFoundError, ValueError):
+        if os.path.exists(analysis_file):
+            os.remove(analysis_file)
+        raise
+
+
+def analyze_sample(root_file, analysis_file, analysis_filename = f"{d0z0_path}/delphes/analysis_trk.py", unbinned = False, cache = None, workers = None, executor = None):
+    """
+    root_file: Delphes output of the sample, or the list of its shards (merged by the analysis)
+    """
+
+    root_files = root_file if isinstance(root_file, list) else [root_file]
+
+    # functions.h is JIT-compiled by the analysis, so it is part of its version
+    if cache is not None:
+        key = cache.key("analysis", files=[analysis_filename, f"{d0z0_path}/delphes/functions.h"], artifacts=root_files, params=[unbinned], outputs=[analysis_file])
+        if cache.is_done(key):
+            print(f"Skipping {analysis_filename} on {root_file}: up to date")
+            return
+
+    for shard_file in root_files:
+        check_root(shard_file)
+
+    print(f"Running {analysis_filename} on {root_file}")
+
+    # persistent workers already have ROOT and FCCAnalyses loaded
+    if workers is not None:
+        if unbinned:
+            workers.call("analysis_unbinned", input_file=root_file, output_file=analysis_file)
+        else:
+            workers.call("analysis", input_file=root_file, output_file=analysis_file)
+
+    else:
+        command = (
+            f"source {fccanalyses_setup} && "
+            f"python {analysis_filename} "
+            f"--input {' '.join(root_files)} "
+            f"--output {analysis_file}"
+            f"{' --unbinned' if unbinned else ''}"
+        )
+
+        (executor or local_executor).run(command, name=f"analysis_{os.path.basename(analysis_file)}")
+
+    check_analysis_output(analysis_file)
+
+    if cache is not None:
+        cache.mark_done(key, [analysis_file])
+
+
+def analyze_trk(roots_directory, analysis_directory, analysis_filename = f"{d0z0_path}/delphes/analysis_trk.py", max_workers = 12, retries = max_retries, cache = None, executor = None):
+
+    tasks = [Task(f"{sample_name}/analysis", analyze_sample, f"{roots_directory}/{sample_name}", f"{analysis_directory}/{sample_name}",
+                  analysis_filename=analysis_filename, cache=cache, executor=executor)
+             for sample_name in os.listdir(roots_directory)]
+
+    run_graph(tasks, max_workers=max_workers, retries=retries, retry_on=transient_errors)
+
+
+def analyze_detector(root_files, analysis_directory, analysis_filename = f"{d0z0_path}/delphes/analysis_trk.py", nthreads = 0, cache = None, workers = None, executor = None):
+    """
+    Batch version of analyze_sample: every sample of a detector in a single RDataFrame pass.
+    Only samples whose cache key changed are analyzed.
+    """
 
-    def helper_analyze(sample_name):
-        print(f"Running {analysis_filename} on {sample_name}")
+    keys = {}
+    if cache is not None:
+        for root_file in root_files:
+            keys[root_file] = cache.key("analysis", files=[analysis_filename, f"{d0z0_path}/delphes/functions.h"], artifacts=[root_file], params=[False],
+                                        outputs=[os.path.join(analysis_directory, os.path.basename(root_file))])
+        root_files = [root_file for root_file in root_files if not cache.is_done(keys[root_file])]
 
+    if not root_files:
+        print(f"Skipping {analysis_filename} on {analysis_directory}: up to date")
+        return
+
+    for root_file in root_files:
+        check_root(root_file)
+
+    print(f"Running {analysis_filename} on {len(root_files)} samples in one pass")
+
+    if workers is not None:
+        workers.call("analysis_batch", inputs=root_files, output_dir=analysis_directory, nthreads=nthreads)
+
+    else:
         command = (
-            "source /work/submit/jaeyserm/software/FCCAnalyses/setup.sh && "
-            f"python {analysis_filename} "
-            f"--input {roots_directory}/{sample_name} "
-            f"--output {analysis_directory}/{sample_name}"
+            f"source {fccanalyses_setup} && "
+            f"python {analysis_filename} --batch "
+            f"--threads {nthreads} "
+            f"--input {' '.join(root_files)} "
+            f"--output {analysis_directory}"
         )
 
-        subprocess.run(["bash", "-lc", command], check=True)
+        (executor or local_executor).run(command, name=f"analysis_{os.path.basename(os.path.dirname(analysis_directory))}")
 
+    # every output is checked; the good ones are recorded even if others are not, so that a retry
+    # only redoes the bad ones
+    failures = []
+    for root_file in root_files:
+        analysis_file = os.path.join(analysis_directory, os.path.basename(root_file))
+        try:
+            check_analysis_output(analysis_file)
+        except (FileNotFoundError, ValueError) as error:
+            failures.append(str(error))
+            continue
+        if cache is not None:
+            cache.mark_done(keys[root_file], [analysis_file])
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
-        for sample_name in os.listdir(roots_directory):
-            pool.submit(helper_analyze, sample_name)
+    if failures:
+        raise ValueError(f"{len(failures)} of {len(root_files)} batch analysis outputs unusable:\n" + "\n".join(failures))
 
 
 ### PLOT RESULTS ###
-def plot_d0z0(input_dir, d0_dir, z0_dir, gun_analysis_directory, subsystem, layer, radius, plot_filename = f"{d0z0_path}/delphes/plot_d0z0.py", max_workers = 12):
-            
-    def helper_plot(sample_name):
+# modules imported by plot_d0z0.py: they compute or store the plotted numbers, so they are part of its version
+plot_modules = [f"{d0z0_path}/delphes/resolution.py", f"{d0z0_path}/results_store.py"]
 
-        name_no_ext = os.path.splitext(sample_name)[0]
+def plot_sample(analysis_file, input_card, d0_dir, z0_dir, subsystem, layer, radius, plot_filename = f"{d0z0_path}/delphes/plot_d0z0.py",
+                unbinned = False, metrics_only = False, results_db = None, detector = None, cache = None, workers = None, executor = None):
 
-        for hist_name, hist_abrev, output_dir in zip(["RP_TRK_D0_um", "RP_TRK_Z0_um"],["d0", "z0"], [d0_dir, z0_dir]):
+    name_no_ext = os.path.splitext(os.path.basename(analysis_file))[0]
+
+    for hist_name, hist_abrev, output_dir in zip(["RP_TRK_D0_um", "RP_TRK_Z0_um"],["d0", "z0"], [d0_dir, z0_dir]):
+
+        # with metrics_only only the JSON needed by plot_ratios.py/r_vs_res.py is made, see render_sample
+        outputs = [f"{output_dir}/{name_no_ext}.{ext}" for ext in (["json"] if metrics_only else ["json", "png", "pdf"])]
+        if results_db is not None:
+            outputs.append(results_db)
+
+        if cache is not None:
+            key = cache.key(
+                "plot",
+                files=[plot_filename, input_card, *plot_modules],
+                artifacts=[analysis_file],
+                params=[hist_name, subsystem, layer, radius, unbinned, metrics_only, results_db, detector],
+                outputs=outputs,
+            )
+            if cache.is_done(key):
+                print(f"Skipping {hist_abrev} plot of {analysis_file}: up to date")
+                continue
+
+        check_analysis(analysis_file)
+        check_file(input_card)
+
+        if workers is not None:
+            workers.call(
+                "compute_res_unbinned" if unbinned else "compute_res",
+                input_file=analysis_file,
+                output_name=f"{output_dir}/{name_no_ext}",
+                input_card=input_card,
+                hist_name=hist_name,
+                hist_abrev=hist_abrev,
+                subsystem=subsystem,
+                layer=layer,
+                radius=radius,
+                render=not metrics_only,
+                results_db=results_db,
+                detector=detector,
+            )
 
+        else:
             command = (
-                "source /work/submit/jaeyserm/software/FCCAnalyses/setup.sh && "
+                f"source {fccanalyses_setup} && "
                 f"python {plot_filename} "
-                f"--input {gun_analysis_directory}/{sample_name} "
+                f"--input {analysis_file} "
                 f"--output {output_dir}/{name_no_ext} "
-                f"--inputCard {input_dir}/{name_no_ext}.input "
+                f"--inputCard {input_card} "
                 f"--histName {hist_name} "
                 f"--histAbreviation {hist_abrev} "
                 f"--subsystem {subsystem} "
                 f"--layer {layer} "
                 f"--radius {radius} "
+                f"{'--unbinned ' if unbinned else ''}"
+                f"{'--metricsOnly ' if metrics_only else ''}"
+                f"{f'--resultsDb {results_db} --detector {detector}' if results_db is not None else ''}"
             )
 
-            subprocess.run(["bash", "-lc", command], check=True)
+            (executor or local_executor).run(command, name=f"{hist_abrev}_{name_no_ext}")
+
+        if cache is not None:
+            cache.mark_done(key, outputs)
+
+
+def render_sample(analysis_file, d0_dir, z0_dir, plot_filename = f"{d0z0_path}/delphes/plot_d0z0.py", unbinned = False, workers = None, executor = None):
+    """
+    Draws the d0/z0 canvases of a sample whose metrics were computed with metrics_only.
+    """
+
+    name_no_ext = os.path.splitext(os.path.basename(analysis_file))[0]
+
+    for hist_name, hist_abrev, output_dir in zip(["RP_TRK_D0_um", "RP_TRK_Z0_um"],["d0", "z0"], [d0_dir, z0_dir]):
+
+        if workers is not None:
+            workers.call(
+                "render_res",
+                input_file=analysis_file,
+                output_name=f"{output_dir}/{name_no_ext}",
+                hist_name=hist_name,
+                hist_abrev=hist_abrev,
+                unbinned=unbinned,
+            )
+
+        else:
+            command = (
+                f"source {fccanalyses_setup} && "
+                f"python {plot_filename} --render "
+                f"--input {analysis_file} "
+                f"--output {output_dir}/{name_no_ext} "
+                f"--histName {hist_name} "
+                f"--histAbreviation {hist_abrev} "
+                f"{'--unbinned' if unbinned else ''}"
+            )
+
+            (executor or local_executor).run(command, name=f"render_{hist_abrev}_{name_no_ext}")
+
+
+def render_tasks(optimization_config, detector, samples, unbinned = False, workers = None, executor = None):
+    """
+    Lazy render step: canvases only for the requested samples (names without extension,
+    e.g. "mu_minus_theta_10_p_1") of a detector already run with metrics_only.
+    """
+
+    gun_dirs = Gun_directories(os.path.join(optimization_config, detector))
+    analysis_ext = "npz" if unbinned else "root"
+
+    return [Task(f"{detector}/{filename}/render", render_sample,
+                 f"{gun_dirs.analysis}/{filename}.{analysis_ext}", gun_dirs.d0_plots, gun_dirs.z0_plots,
+                 unbinned=unbinned, workers=workers, executor=executor)
+            for filename in samples]
+
+
+def plot_d0z0(input_dir, d0_dir, z0_dir, gun_analysis_directory, subsystem, layer, radius, plot_filename = f"{d0z0_path}/delphes/plot_d0z0.py",
+              max_workers = 12, retries = max_retries, cache = None, executor = None):
+
+    tasks = []
+    for sample_name in os.listdir(gun_analysis_directory):
+        name_no_ext = os.path.splitext(sample_name)[0]
+        tasks.append(Task(f"{name_no_ext}/plot", plot_sample, f"{gun_analysis_directory}/{sample_name}", f"{input_dir}/{name_no_ext}.input",
+                          d0_dir, z0_dir, subsystem, layer, radius, plot_filename=plot_filename, cache=cache, executor=executor))
+
+    run_graph(tasks, max_workers=max_workers, retries=retries, retry_on=transient_errors)
+
+
+### FULL PIPELINE AS A TASK GRAPH ###
+def stream_tasks(optimization_config, detectors, inputs_directory = input_path, cache = None):
+    """
+    Delphes tasks of the streaming mode: one per gun card, feeding the same events to every
+    detector at once (see stream_response_sample), each taking one scheduler slot per detector.
+    Returned by sample name, to be passed as responses to pipeline_tasks.
+    """
+
+    tasks = {}
+    for input_card in sorted(os.listdir(inputs_directory)):
+        filename = os.path.splitext(input_card)[0]
+        responses = [(detector_card_path(detector), f"{Gun_directories(os.path.join(optimization_config, detector)).root}/{filename}.root")
+                     for detector in detectors]
+        # one Delphes per detector runs for the whole task
+        tasks[filename] = Task(f"all_detectors/{filename}/delphes", stream_response_sample, f"{inputs_directory}/{input_card}", responses,
+                               cache=cache, slots=len(responses))
+
+    return tasks
+
+
+def pipeline_tasks(optimization_config, detector, subsystem, layer, radius, hepmcs_directory = hepmc_path,
+                   batch_analysis = False, unbinned = False, metrics_only = False, nshards = 1, responses = None, cache = None, workers = None, executor = None):
+    """
+    HepMC -> Delphes ROOT -> analysis ROOT -> d0/z0 JSON for every sample of one detector.
+    Each stage only waits for the previous stage of the same sample.
+    With batch_analysis the whole detector is analyzed in one RDataFrame pass once all its
+    Delphes jobs are done, which trades that wait for paying the ROOT startup once.
+    With unbinned the analysis keeps the raw d0/z0 residuals (.npz) and the resolution is
+    computed from them without histograms (not combined with batch_analysis).
+    With metrics_only no canvases are drawn, see render_tasks.
+    The metrics of every sample are also appended to the campaign results store.
+    With nshards > 1 Delphes runs on nshards event ranges of every sample in parallel, and the
+    analysis reads all the shards of a sample as one dataset (shards written by the gun itself,
+    <sample>_shard<k>.hepmc, are used as they are).
+    responses: Delphes tasks shared with other detectors (stream_tasks), by sample name;
+    None runs Delphes on the files of hepmcs_directory.
+    executor: where the stage commands run (see executors.py), None for this machine
+    radius: None to read it from the card (layer of the subsystem)
+    """
+
+    if batch_analysis and unbinned:
+        raise ValueError("The batch analysis only produces histograms, it cannot be combined with unbinned")
+
+    analysis_ext = "npz" if unbinned else "root"
+
+    detector_card = detector_card_path(detector)
+    if radius is None:
+        radius = detector_radius(detector, subsystem, layer)
+    os.makedirs(os.path.join(d0z0_path, optimization_config, detector), exist_ok=True)
+
+    gun_dirs = Gun_directories(os.path.join(optimization_config, detector))
+    gun_dirs.create_directories()
+
+    results_db = results_db_path(os.path.join(d0z0_path, optimization_config))
+
+    # sample name -> Delphes tasks and their ROOT files
+    root_files = {}
+    if responses is None:
+        # sample name -> HepMC files (one, or the shards written by gunHEPMC3)
+        samples = {}
+        for gun_hepmc in sorted(os.listdir(hepmcs_directory)):
+            name = re.sub(r"_shard\d+$", "", hepmc_sample_name(gun_hepmc))
+            samples.setdefault(name, []).append(f"{hepmcs_directory}/{gun_hepmc}")
+
+        responses = {}
+        for filename, hepmc_files in samples.items():
+            shards = sample_shards(hepmc_files, nshards)
+            if len(shards) == 1:
+                root_files[filename] = [f"{gun_dirs.root}/{filename}.root"]
+                responses[filename] = [Task(f"{detector}/{filename}/delphes", response_sample,
+                                            hepmc_files[0], root_files[filename][0], detector_card, cache=cache, executor=executor)]
+            else:
+                root_files[filename] = [f"{gun_dirs.root}/{filename}_shard{i}.root" for i in range(len(shards))]
+                responses[filename] = [Task(f"{detector}/{filename}/delphes{i}", response_sample,
+                                            hepmc_file, root_files[filename][i], detector_card, shard=shard, nshards=n, cache=cache, executor=executor)
+                                       for i, (hepmc_file, shard, n) in enumerate(shards)]
+        own_responses = [task for tasks in responses.values() for task in tasks]
+
+    else:
+        # the caller runs the shared tasks once for all detectors
+        samples = list(responses)
+        root_files = {filename: [f"{gun_dirs.root}/{filename}.root"] for filename in samples}
+        responses = {filename: [task] for filename, task in responses.items()}
+        own_responses = []
+
+    analyses = {}
+    if batch_analysis:
+        if any(len(files) > 1 for files in root_files.values()):
+            raise ValueError("The batch analysis writes one output per Delphes file, it cannot be combined with sharding")
+
+        batch = Task(f"{detector}/all_samples/analysis", analyze_detector,
+                     [files[0] for files in root_files.values()], gun_dirs.analysis,
+                     cache=cache, workers=workers, executor=executor, deps=[task for tasks in responses.values() for task in tasks])
+        analyses = {filename: batch for filename in samples}
+    else:
+        for filename in samples:
+            analyses[filename] = Task(f"{detector}/{filename}/analysis", analyze_sample,
+                                      root_files[filename] if len(root_files[filename]) > 1 else root_files[filename][0],
+                                      f"{gun_dirs.analysis}/{filename}.{analysis_ext}",
+                                      unbinned=unbinned, cache=cache, workers=workers, executor=executor, deps=responses[filename])
+
+    plots = {}
+    for filename in samples:
+        plots[filename] = Task(f"{detector}/{filename}/plot", plot_sample,
+                               f"{gun_dirs.analysis}/{filename}.{analysis_ext}", f"{input_path}/{filename}.input", gun_dirs.d0_plots, gun_dirs.z0_plots,
+                               subsystem, layer, radius, unbinned=unbinned, metrics_only=metrics_only,
+                               results_db=results_db, detector=detector, cache=cache, workers=workers, executor=executor, deps=[analyses[filename]])
+
+    # the batch analysis task is shared by all samples, list it once
+    unique_analyses = {task.name: task for task in analyses.values()}
+
+    return own_responses + list(unique_analyses.values()) + list(plots.values())
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
-        for sample_name in os.listdir(gun_analysis_directory):
-            pool.submit(helper_plot, sample_name)
 
 if __name__ == "__main__":
         
@@ -126,11 +661,12 @@ if __name__ == "__main__":
     #######################################
     # optimization_config = "inside_pipe"
     #
-    # for detector in ["IDEA_base25", "IDEA_inside_10","IDEA_inside_10_original_wmb"]:
-    #
-    #     subsystem = "inside_pipe"
-    #     layer = -1
-    #     radius = -1
+    # detectors = [
+    #     # detector, subsystem, layer, radius
+    #     ("IDEA_base25", "inside_pipe", -1, -1),
+    #     ("IDEA_inside_10", "inside_pipe", -1, -1),
+    #     ("IDEA_inside_10_original_wmb", "inside_pipe", -1, -1),
+    # ]
     #
     #######################################
 
@@ -140,21 +676,81 @@ if __name__ == "__main__":
     #########################################
 
     optimization_config = "VTXIB_r1"
-    
-    for detector, radius in zip(["IDEA_VTXIB_r1_117", "IDEA_base25", "IDEA_VTXIB_r1_157"], [11.7, 13.7, 15.7]):
-    
-        subsystem = "VTXIB"
-        layer = 1 # because r1 means first radius, aka the first layer of the vertex inner barrel
-
-        detector_card = f"{d0z0_path}/delphes/cards/{detector}.tcl"
-        detector_path = os.path.join(d0z0_path, optimization_config, detector)
-        os.makedirs(detector_path, exist_ok=True)
-
-        gun_dirs = Gun_directories(os.path.join(optimization_config, detector))
-        gun_dirs.create_directories()
-
-        detector_response(root_dir=gun_dirs.root, detector_card=detector_card, hepmcs_directory=hepmc_path)
-        analyze_trk(roots_directory=gun_dirs.root, analysis_directory=gun_dirs.analysis)
-        plot_d0z0(input_dir=input_path, d0_dir=gun_dirs.d0_plots, z0_dir=gun_dirs.z0_plots , gun_analysis_directory=gun_dirs.analysis,
-                  subsystem=subsystem, layer=layer, radius=radius)
-        
\ No newline at end of file
+
+    # layer 1 because r1 means first radius, aka the first layer of the vertex inner barrel
+    detectors = [
+        # detector, subsystem, layer, radius (None: read from the card, here 11.7, 13.7 and 15.7 mm)
+        ("IDEA_VTXIB_r1_117", "VTXIB", 1, None),
+        ("IDEA_base25", "VTXIB", 1, None),
+        ("IDEA_VTXIB_r1_157", "VTXIB", 1, None),
+    ]
+
+    #########################################
+    # OPTION #3: SWEEP ONE LAYER OF A CARD  #
+    #########################################
+    # the cards are generated from the base card (sweep.py) into delphes/cards/generated, e.g.
+    # VTXIB layer 1 from 11 to 20 mm in steps of 0.5 mm:
+    #
+    # optimization_config = "VTXIB_r1_scan"
+    #
+    # detectors = generate_cards(f"{cards_path}/IDEA_base25.tcl", "VTXIB", 1, "r", sweep_values(11, 20, 0.5), generated_cards_path)
+    #
+    #########################################
+
+    # only compute the JSON numbers in the sweep, and draw the canvases of the samples in render_samples
+    metrics_only = False
+    render_samples = [] # e.g. ["mu_minus_theta_10_p_1"]
+
+    # generate each gun sample once, in-process, and stream it to the Delphes of every detector
+    # at the same time instead of reading the files of gun_hepmc (needs numpy)
+    stream_gun = False
+
+    # Delphes jobs per sample (event ranges run in parallel, merged by the analysis), so the wall
+    # time scales with the total number of events rather than with the number of cards
+    nshards = 1
+
+    # where the stages run: None for this machine, or one batch job per stage, e.g.
+    # CondorExecutor(jobs_path), SlurmExecutor(jobs_path) or FakeQueueExecutor(jobs_path) (local stand-in).
+    # Batch stages do not use the persistent workers, and max_workers becomes the number of jobs in flight.
+    jobs_path = os.path.join(ceph_path, ".jobs")
+    executor = None
+    max_workers = 12
+
+    # stages whose inputs did not change since the last run are skipped
+    cache = StageCache(cache_path)
+
+    # a worker that does not answer a call for this long is restarted and the call retried
+    worker_timeout = 6*3600
+
+    # analysis and plots go to a few ROOT processes that stay alive for the whole run
+    with (WorkerPool(fccanalyses_setup, worker_script, nworkers=4, timeout=worker_timeout) if executor is None else contextlib.nullcontext()) as workers:
+
+        # one graph for all detectors, sharing a single worker budget
+        tasks, responses = [], None
+        if stream_gun:
+            responses = stream_tasks(optimization_config, [detector for detector, _, _, _ in detectors], cache=cache)
+            tasks += list(responses.values())
+
+        for detector, subsystem, layer, radius in detectors:
+            tasks += pipeline_tasks(optimization_config, detector, subsystem, layer, radius, batch_analysis=False, unbinned=False,
+                                    metrics_only=metrics_only, nshards=nshards, responses=responses, cache=cache, workers=workers, executor=executor)
+
+        # wall/CPU/RSS/I/O of every stage go to trace.jsonl, summarized at the end
+        # (python instrumentation.py trace.jsonl -c trace.json for a Chrome/Perfetto timeline)
+        tracer = instrumentation.Tracer(os.path.join(d0z0_path, optimization_config, "trace.jsonl"))
+
+        try:
+            # failed stages are retried, a status table of every stage is written next to the plots
+            run_graph(tasks, max_workers=max_workers, retries=max_retries, retry_on=transient_errors,
+                      status_file=os.path.join(d0z0_path, optimization_config, "status.txt"), tracer=tracer)
+
+            if metrics_only and render_samples:
+                tasks = []
+                for detector, _, _, _ in detectors:
+                    tasks += render_tasks(optimization_config, detector, render_samples, workers=workers, executor=executor)
+
+                run_graph(tasks, max_workers=max_workers, retries=max_retries, retry_on=transient_errors, tracer=tracer)
+
+        finally:
+            print(instrumentation.summary(tracer.events))
+            instrumentation.write_chrome_trace(tracer.events, os.path.join(d0z0_path, optimization_config, "trace.json"))
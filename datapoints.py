@@ -0,0 +1,138 @@
+import numpy as np
+
+### STRUCT-OF-ARRAYS RESULT POINTS ###
+# The points plotted by plot_ratios.py and r_vs_res.py, kept as one numpy array per column
+# (detector, param, theta, p, cosTheta, subsystem, layer, radius, nevents, the plotted value and
+# its statistical error) instead of one Python object per point in nested dicts and lists.
+# Selecting, sorting, grouping and the ratios between detectors (errors included) are array
+# operations on all the points at once. Every column of a group is a contiguous float64 slice,
+# which is what TGraph takes, so graphs are built without copies.
+# Colors and markers are looked up once per momentum by the plotting scripts, not stored per point.
+
+columns = ["detector", "param", "theta", "p", "cosTheta", "subsystem", "layer", "radius", "nevents", "value", "error"]
+
+
+class DataPoints:
+
+    __slots__ = ["columns"]
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows, value_name):
+        """
+        Points of the rows of a campaign (results_store.load_campaign), value_name being the
+        metric to plot (e.g. "sigma", "res_quantile"). The error is its <value_name>_err column,
+        nan when the campaign has none.
+        """
+
+        error_name = f"{value_name}_err"
+
+        if len(rows) and value_name not in rows.dtype.names:
+            raise ValueError(f"No {value_name} in the results, known: {', '.join(rows.dtype.names)}")
+
+        data = {
+            "detector": rows["detector"].astype(str),
+            "param": rows["param"].astype(str),
+            "theta": rows["theta"].astype(np.float64),
+            "p": rows["p"].astype(np.float64),
+            "subsystem": rows["subsystem"].astype(str),
+            "layer": rows["layer"].astype(np.int64),
+            "radius": rows["radius"].astype(np.float64),
+            "nevents": rows["nevents"].astype(np.int64),
+            "value": rows[value_name].astype(np.float64) if len(rows) else np.zeros(0),
+            "error": rows[error_name].astype(np.float64) if error_name in (rows.dtype.names or ()) else np.full(len(rows), np.nan),
+        }
+        data["cosTheta"] = np.cos(np.radians(data["theta"]))
+        return cls(data)
+
+    def __len__(self):
+        return len(self.columns["value"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def take(self, index):
+        # index: boolean mask, integer indices or a slice
+        return DataPoints({name: column[index] for name, column in self.columns.items()})
+
+    def select(self, **values):
+        """
+        Points whose columns equal the given values, e.g. select(param="d0", detector=...).
+        """
+
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in values.items():
+            mask &= self.columns[name] == value
+        return self.take(mask)
+
+    def sort(self, *names):
+        """
+        Points sorted by the given columns, the first one varying slowest.
+        """
+
+        if not names or not len(self):
+            return self
+        return self.take(np.lexsort([self.columns[name] for name in reversed(names)]))
+
+    def groups(self, *names, order = ()):
+        """
+        (values of names, points) for every distinct combination of the given columns, in
+        increasing order, the points of a group being sorted by the columns in order.
+        The groups are slices of one sorted copy.
+        """
+
+        points = self.sort(*names, *order)
+        if not len(points):
+            return
+
+        keys = [points.columns[name] for name in names]
+        changes = np.zeros(len(points) - 1, dtype=bool)
+        for key in keys:
+            changes |= key[1:] != key[:-1]
+        bounds = np.concatenate([[0], np.flatnonzero(changes) + 1, [len(points)]])
+
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            yield tuple(key[start].item() for key in keys), points.take(slice(start, stop))
+
+    def match(self, other, names):
+        """
+        Index in other of the point with the same values of names as each point, -1 if none.
+        """
+
+        n = len(self)
+        if not len(other):
+            return np.full(n, -1)
+
+        # every combination of names as one integer code, shared by both sets of points
+        codes = np.zeros(n + len(other), dtype=np.int64)
+        for name in names:
+            unique, inverse = np.unique(np.concatenate([self.columns[name], other.columns[name]]), return_inverse=True)
+            codes = codes*len(unique) + inverse
+
+        mine, theirs = codes[:n], codes[n:]
+        order = np.argsort(theirs, kind="stable")
+        index = order[np.minimum(np.searchsorted(theirs[order], mine), len(theirs) - 1)]
+        return np.where(theirs[index] == mine, index, -1)
+
+    def ratio(self, other, names):
+        """
+        The points that have a point of other with the same values of names, with value divided
+        by its value (0 where it is 0). The errors are propagated for independent samples,
+        r sqrt((e1/v1)^2 + (e2/v2)^2), except between a point and itself (same detector), whose
+        ratio is exactly 1.
+        """
+
+        index = self.match(other, names)
+        points = self.take(index >= 0)
+        index = index[index >= 0]
+        denominator, denominator_error = other.columns["value"][index], other.columns["error"][index]
+
+        columns = dict(points.columns)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            columns["value"] = np.divide(points["value"], denominator, out=np.zeros(len(points)), where=denominator != 0)
+            relative = np.hypot(points["error"]/points["value"], denominator_error/denominator)
+        same = points["detector"] == other.columns["detector"][index]
+        columns["error"] = np.where(same, 0, np.where(denominator != 0, np.abs(columns["value"])*relative, np.nan))
+        return DataPoints(columns)
@@ -1,5 +1,6 @@
 import argparse
 import sys, os, glob, math
+import numpy as np
 import ROOT
 import logging
 
@@ -35,9 +36,7 @@ bins_z0_um = (200000, -1000, 1000) # range mm, bins um
 ## vertex fitter: https://indico.cern.ch/event/1003610/contributions/4214579/attachments/2187815/3696958/Bedeschi_Vertexing_Feb2021.pdf
 ## perf. plots: https://indico.cern.ch/event/965346/contributions/4062989/attachments/2125687/3578824/vertexing.pdf
 
-def analysis(input_file, output_file):
-
-    df = ROOT.RDataFrame("events", input_file)
+def define_columns(df):
 
     df = df.Alias("MCRecoAssociations0", "_MCRecoAssociations_rec.index")
     df = df.Alias("MCRecoAssociations1", "_MCRecoAssociations_sim.index")
@@ -60,6 +59,13 @@ def analysis(input_file, output_file):
     df = df.Define("RP_TRK_phi_cov", "ReconstructedParticle2Track::getRP2TRK_phi_cov(ReconstructedParticles, _EFlowTrack_trackStates)")
     df = df.Define("RP_TRK_tanlambda_cov", "ReconstructedParticle2Track::getRP2TRK_tanLambda_cov(ReconstructedParticles, _EFlowTrack_trackStates)")
 
+    return df
+
+
+def book_histograms(df):
+
+    df = define_columns(df)
+
     h_RP_TRK_D0 = df.Histo1D(("RP_TRK_D0", "", *bins_d0), "RP_TRK_D0")
     h_RP_TRK_Z0 = df.Histo1D(("RP_TRK_Z0", "", *bins_z0), "RP_TRK_Z0")
 
@@ -69,28 +75,102 @@ def analysis(input_file, output_file):
     h_RP_TRK_D0_cov = df.Histo1D(("RP_TRK_D0_cov", "", *bins_d0), "RP_TRK_D0_cov")
     h_RP_TRK_Z0_cov = df.Histo1D(("RP_TRK_Z0_cov", "", *bins_z0), "RP_TRK_Z0_cov")
 
+    # nothing runs yet, these are lazy results
+    return [h_RP_TRK_D0, h_RP_TRK_Z0, h_RP_TRK_D0_um, h_RP_TRK_Z0_um, h_RP_TRK_D0_cov, h_RP_TRK_Z0_cov]
+
+
+def write_histograms(hists, output_file):
 
     # write output
     fout = ROOT.TFile(output_file, "RECREATE")
-    h_RP_TRK_D0.Write()
-    h_RP_TRK_Z0.Write()
-    h_RP_TRK_D0_um.Write()
-    h_RP_TRK_Z0_um.Write()
-    h_RP_TRK_D0_cov.Write()
-    h_RP_TRK_Z0_cov.Write()
+    for h in hists:
+        h.Write()
 
     fout.Close()
 
 
+def analysis(input_file, output_file):
+    # input_file can also be a list of files (the shards of one sample), read as one dataset
+
+    df = ROOT.RDataFrame("events", input_file)
+    write_histograms(book_histograms(df), output_file)
+
+
+def analysis_unbinned(input_file, output_file, columns = ("RP_TRK_D0_um", "RP_TRK_Z0_um")):
+    """
+    Writes the raw per-track residuals instead of 200k-bin histograms: one flat float32 array
+    per column in a compressed .npz, keyed by the same names the histograms have.
+    plot_d0z0.py --unbinned computes exact quantiles and unbinned fits from it.
+    """
+
+    df = define_columns(ROOT.RDataFrame("events", input_file))
+    events = df.AsNumpy(list(columns))
+
+    residuals = {}
+    for column in columns:
+        # one RVec per event, flattened to one entry per track by a single concatenation (the RVecs
+        # are read through their array interface, no Python loop over the events)
+        rvecs = events[column]
+        residuals[column] = np.concatenate(rvecs).astype(np.float32, copy=False) if len(rvecs) else np.empty(0, dtype=np.float32)
+
+    np.savez_compressed(output_file, **residuals)
+
+
+def analysis_batch(inputs, output_dir, nthreads = 0):
+    """
+    Same as analysis() for many samples at once: all event loops run together in this
+    process (RunGraphs + implicit MT), so the interpreter and JIT startup is paid only once.
+    inputs: directory with the Delphes ROOT files (e.g. gun_root) or a list of files
+    One output file with the same name as the input is written per sample to output_dir.
+    nthreads: 0 means all cores
+    """
+
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    if len(inputs) == 1 and os.path.isdir(inputs[0]):
+        inputs = [os.path.join(inputs[0], f) for f in sorted(os.listdir(inputs[0])) if f.endswith(".root")]
+
+    # must be enabled before the dataframes are built
+    ROOT.EnableImplicitMT(nthreads)
+
+    booked = {}
+    for input_file in inputs:
+        df = ROOT.RDataFrame("events", input_file)
+        booked[os.path.basename(input_file)] = book_histograms(df)
+
+    logger.info(f"Running {len(booked)} samples with {ROOT.GetThreadPoolSize()} threads")
+    ROOT.RDF.RunGraphs([h for hists in booked.values() for h in hists])
+
+    for sample_name, hists in booked.items():
+        write_histograms(hists, os.path.join(output_dir, sample_name))
+
+    # back to the single core default for whoever uses this process next
+    ROOT.DisableImplicitMT()
+
+
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("-i", "--input", type=str, help="Input file", required=True)
-    parser.add_argument("-o", "--output", type=str, help="Output file", required=True)
+    parser.add_argument("-i", "--input", type=str, nargs="+", help="Input file(s) of one sample, e.g. its Delphes shards (input directory or files with --batch)", required=True)
+    parser.add_argument("-o", "--output", type=str, help="Output file (output directory with --batch)", required=True)
+
+    #not required:
+    parser.add_argument("-b", "--batch", action="store_true", help="analyze every .root file of the input directory in one pass")
+    parser.add_argument("-t", "--threads", type=int, default=0, help="number of threads in batch mode (0: all cores)")
+    parser.add_argument("-u", "--unbinned", action="store_true", help="write the raw d0/z0 residuals (.npz) instead of histograms")
     args = parser.parse_args()
 
+    if args.batch and args.unbinned:
+        parser.error("--unbinned is only available per sample, not with --batch")
+
     logger.info(f"Start analysis")
-    analysis(args.input, args.output)
+    if args.unbinned:
+        analysis_unbinned(args.input, args.output)
+    elif args.batch:
+        analysis_batch(args.input, args.output, nthreads=args.threads)
+    else:
+        analysis(args.input, args.output)
     logger.info(f"Done! Output saved to {args.output}")
 
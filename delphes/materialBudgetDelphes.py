@@ -3,87 +3,114 @@ import sys,argparse
 import os
 import ROOT
 import math
+import numpy as np
 from collections import OrderedDict
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from delphes_card import read_card
+
 ROOT.gROOT.SetBatch(True)
 ROOT.gStyle.SetOptStat(0)
 ROOT.gStyle.SetOptTitle(0)
 
-# function to read the geometry defined in the TrackCovariance module
+# geometry defined in the TrackCovariance module (see delphes_card.py), one [type, label, min,
+# max, position, thickness, X0] list per layer, and the labels in order of appearance
 def read_delphes_card(delphes_card):
     geometry = []
     detectors = []
-    with open(delphes_card) as f:
-        isGeom = False
-        for line in f:
-            line = line.rstrip('\n')
-            if not line:
-                continue
-            if not line.isspace() and line.replace(' ', '')[0] == "#":
-                continue
-            
-            if "set" in line and "DetectorGeometry" in line:
-                isGeom = True
-                continue
-            if not isGeom:
-                continue
-            if "}" in line:
-                isGeom = False
-                continue
-            tmp = line.split()
-            cfg = [int(tmp[0]), str(tmp[1]), float(tmp[2]), float(tmp[3]), float(tmp[4]), float(tmp[5]), float(tmp[6])]
-            if not str(tmp[1]) in detectors:
-                detectors.append(str(tmp[1]))
-            geometry.append(cfg)
+    for layer in read_card(delphes_card).geometry:
+        geometry.append([layer.type, layer.label, layer.zmin, layer.zmax, layer.r, layer.w, layer.X0])
+        if not layer.label in detectors:
+            detectors.append(layer.label)
 
     return geometry, detectors
 
+def layer_budget(kind, low, high, position, thickness, X0, theta):
+    """
+    Material budget x/X0 (%) of every layer crossed by a straight line at each polar angle theta
+    (deg, in 0..90): array (len(theta), layers), for all angles and layers at once.
+    """
+
+    theta = np.radians(np.asarray(theta, dtype=np.float64))[:, None]
+    sint, cost, tant = np.sin(theta), np.cos(theta), np.tan(theta)
+
+    # barrel: crossed if the line is still inside the layer length at its radius
+    barrel = (kind == 1) & (position / tant < high)
+    # endcap: crossed between its inner and outer radius (only one quadrant, assume symmetric)
+    r = position * tant
+    endcap = (kind == 2) & (position >= 0) & (r > low) & (r < high)
+
+    return np.where(barrel, 100.*thickness/X0/sint, 0) + np.where(endcap, 100.*thickness/X0/cost, 0)
+
+
+def geometry_arrays(geometry):
+    # the layers as (kind, low, high, position, thickness, X0) arrays, without the magnet
+    geometry = [g for g in geometry if g[1] != 'MAG']
+    columns = np.array([g[2:7] for g in geometry], dtype=np.float64).reshape(-1, 5).T
+    return np.array([g[0] for g in geometry]), [g[1] for g in geometry], *columns
+
+
+def material_budget(geometry, detectors, theta):
+    """
+    Material budget x/X0 (%) per material: array (len(detectors), len(theta)).
+    """
+
+    kind, labels, *columns = geometry_arrays(geometry)
+    label = np.array([detectors.index(m) for m in labels])
+    x0 = layer_budget(kind, *columns, theta)
+
+    # sum the layers of each material
+    return (label == np.arange(len(detectors))[:, None]).astype(np.float64) @ x0.T
+
+
+def library_budget(cards, theta):
+    """
+    Material budget of many cards at once: the layers of all cards go into one table, evaluated in
+    one broadcast and summed per (card, material).
+    Returns the materials (union over the cards) and an array (len(cards), materials, len(theta)).
+    """
+
+    tables, materials = [], []
+    for i, card in enumerate(cards):
+        # parsed once, then from the delphes_card cache
+        geometry, _ = read_delphes_card(card)
+        kind, labels, *columns = geometry_arrays(geometry)
+        for m in labels:
+            if m not in materials:
+                materials.append(m)
+        tables.append((np.full(len(kind), i), np.array([materials.index(m) for m in labels], dtype=np.int64), kind, *columns))
+
+    card_index, label, kind, *columns = [np.concatenate(column) for column in zip(*tables)]
+    x0 = layer_budget(kind, *columns, theta)
+
+    # sum the layers of each (card, material): sort by it and add up the runs
+    index = card_index*len(materials) + label
+    order = np.argsort(index, kind="stable")
+    starts = np.flatnonzero(np.diff(index[order], prepend=-1))
+    budget = np.zeros((len(cards)*len(materials), len(x0)))
+    budget[index[order][starts]] = np.add.reduceat(x0[:, order], starts, axis=1).T
+
+    return materials, budget.reshape(len(cards), len(materials), len(x0))
+
+
 def main(args, detector_groups, colors):
 
     geometry, detectors = read_delphes_card(args.input)
     print(detectors)
     bins_max = 90 if args.xaxis == "theta" else 1
 
-    # make an histogram for each material
+    # bin centers, and their polar angle
+    centers = (np.arange(args.bins) + 0.5) * bins_max / args.bins
+    theta = centers if args.xaxis == "theta" else np.degrees(np.arccos(centers))
+    budget = material_budget(geometry, detectors, theta)
+
+    # make an histogram for each material, filled at once (SetContent includes under/overflow)
     hists = {}
-    for m in detectors:
+    for i, m in enumerate(detectors):
         h = ROOT.TH1D(m, "", args.bins, 0, bins_max)
+        h.SetContent(np.concatenate([[0.], budget[i], [0.]]))
         hists[m] = h
 
-    # loop over the geometry and calculate material budget for each material
-    for xBin in range(1, args.bins+1):
-        if args.xaxis == "theta":
-            theta = hists[detectors[0]].GetBinCenter(xBin)
-        else:
-            theta = math.degrees(math.acos(hists[detectors[0]].GetBinCenter(xBin)))
-        sint = math.sin(math.radians(theta))
-        cost = math.cos(math.radians(theta))
-        tant = math.tan(math.radians(theta))
-        for g in geometry:
-            if g[1] == 'MAG':
-                continue
-            x0 = 0
-
-            # barrel
-            if g[0] == 1:
-                r = g[4]
-                z_max = g[3]
-                z = r / tant
-                if z < z_max:
-                    x0 = 100.*g[5]/g[6]/sint
-
-            # endcap
-            if g[0] == 2:
-                r_min = g[2]
-                r_max = g[3]
-                z = g[4]
-                r = z * tant
-                if z < 0: continue # only one quadrant, assume symmetric
-                if r < r_max and r > r_min:
-                    x0 = 100.*g[5]/g[6]/cost
-
-            hists[g[1]].SetBinContent(xBin, hists[g[1]].GetBinContent(xBin) + x0)
-
     # plotting
     c = ROOT.TCanvas("", "", 800, 800)
     c.SetTopMargin(0.055)
@@ -142,6 +169,74 @@ def main(args, detector_groups, colors):
 
 
 
+def main_library(args, colors):
+
+    cards = []
+    for path in args.library:
+        if os.path.isdir(path):
+            cards += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".tcl") and f != "output.tcl")
+        else:
+            cards.append(path)
+    names = [os.path.splitext(os.path.basename(card))[0] for card in cards]
+    bins_max = 90 if args.xaxis == "theta" else 1
+
+    centers = (np.arange(args.bins) + 0.5) * bins_max / args.bins
+    theta = centers if args.xaxis == "theta" else np.degrees(np.arccos(centers))
+    materials, budget = library_budget(cards, theta)
+
+    # one dataset for the whole library: per card and material, and the total of the selected materials
+    selected = [i for i, m in enumerate(materials) if args.materials is None or m in args.materials]
+    total = budget[:, selected].sum(axis=1)
+    np.savez_compressed(f"{args.output}.npz", cards=np.array(names), materials=np.array(materials),
+                        x=centers, theta=theta, budget=budget, total=total)
+    print(f"Material budget of {len(cards)} cards saved to {args.output}.npz")
+
+    # overlay of the totals
+    c = ROOT.TCanvas("", "", 800, 800)
+    c.SetTopMargin(0.055)
+    c.SetRightMargin(0.05)
+    c.SetLeftMargin(0.12)
+    c.SetBottomMargin(0.11)
+
+    dummy = ROOT.TH1D("dummy", "", args.bins, 0, bins_max)
+    dummy.GetYaxis().SetRangeUser(0, args.ymax)
+    dummy.GetXaxis().SetTitle("#theta (deg)" if args.xaxis == "theta" else "cos(#theta)")
+    dummy.GetYaxis().SetTitle("Material budget x/X_{0} (%)")
+    for axis in [dummy.GetXaxis(), dummy.GetYaxis()]:
+        axis.SetTitleFont(43)
+        axis.SetTitleSize(32)
+        axis.SetLabelFont(43)
+        axis.SetLabelSize(28)
+    dummy.Draw("HIST")
+
+    # a legend only when it stays readable
+    leg = None
+    if len(cards) <= 15:
+        leg = ROOT.TLegend(0.5 if args.xaxis == "theta" else 0.2, 0.9-0.04*(len(cards)+1), 0.9 if args.xaxis == "theta" else 0.55, 0.9)
+        leg.SetBorderSize(0)
+        leg.SetFillStyle(0)
+        leg.SetTextSize(0.025)
+        leg.SetHeader(args.title)
+
+    hists = []
+    for i, name in enumerate(names):
+        h = ROOT.TH1D(f"h_{i}", "", args.bins, 0, bins_max)
+        h.SetContent(np.concatenate([[0.], total[i], [0.]]))
+        h.SetLineColor(colors[i % len(colors)])
+        h.SetLineWidth(2)
+        h.Draw("HIST SAME")
+        hists.append(h)
+        if leg is not None:
+            leg.AddEntry(h, name, "L")
+
+    if leg is not None:
+        leg.Draw()
+    ROOT.gPad.SetTicks()
+    ROOT.gPad.RedrawAxis()
+    c.SaveAs(f"{args.output}.png")
+    c.SaveAs(f"{args.output}.pdf")
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input", default="card_CLD_Winter2023.tcl", type=str, help="Input Delphes card (.tcl)")
@@ -150,8 +245,15 @@ if __name__ == '__main__':
     parser.add_argument("-x", "--xaxis", type=str, default="theta", help="X-axis definition", choices=["theta", "costheta"])
     parser.add_argument("-b", "--bins", type=int, default=180, help="Number of theta bins")
     parser.add_argument("-y", "--ymax", type=int, default=30, help="Maximum y-axis")
+    parser.add_argument("-l", "--library", type=str, nargs="+", help="Cards and/or directories of cards: overlay of their total material budget, and one .npz dataset, instead of the single card plot")
+    parser.add_argument("-m", "--materials", type=str, nargs="+", help="With --library: layer labels counted in the total (default: all but MAG)")
     args = parser.parse_args()
 
+    if args.library:
+        colors = [ROOT.kRed, ROOT.kBlue, ROOT.kGreen+2, ROOT.kGray+1, ROOT.kMagenta, ROOT.kOrange, ROOT.kCyan+1, ROOT.kBlack]
+        main_library(args, colors)
+        sys.exit(0)
+
     # define detector groups
     if "CLD" in args.input or "CLD" in args.output or "SiTracking" in args.input:
         detector_groups = OrderedDict()
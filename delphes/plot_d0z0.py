@@ -3,12 +3,20 @@ import sys,array,ROOT,math,os,copy
 import numpy as np
 import json
 
+from dataclasses import asdict
+
+from resolution import hist_contents, hist_quantiles, load_residuals, quantile_resolution_error, resolution, shape_metrics
+
+# the results store lives next to d0z0.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import append_result
+
 ROOT.gROOT.SetBatch(True)
 ROOT.gStyle.SetOptStat(0)
 ROOT.gStyle.SetOptTitle(0)
 
 
-def compute_res(input_file, output_name, input_card, hist_name, hist_abrev, subsystem, layer, radius, plotGauss=True):
+def compute_res(input_file, output_name, input_card, hist_name, hist_abrev, subsystem, layer, radius, plotGauss=True, render=True, results_db=None, detector=None):
 
     fIn = ROOT.TFile(input_file)
     hist = fIn.Get(hist_name)
@@ -24,6 +32,7 @@ def compute_res(input_file, output_name, input_card, hist_name, hist_abrev, subs
     hist.GetQuantiles(4, quantiles, probabilities)
     xMin, xMax = min([quantiles[0], -quantiles[1]]), max([-quantiles[0], quantiles[1]])
     res_quantile = 0.5*(quantiles[2] - quantiles[3])
+    res_quantile_err = quantile_resolution_error(lambda p: hist_quantiles(hist, p), hist.Integral())
 
     # compute RMS
     rms, rms_err = hist.GetRMS(), hist.GetRMSError()
@@ -36,32 +45,140 @@ def compute_res(input_file, output_name, input_card, hist_name, hist_abrev, subs
     hist.Fit("gauss2", "R")
 
     mu, sigma = gauss.GetParameter(1), gauss.GetParameter(2)
-    sigma_FWHM = 0
-    xMin, xMax = mu - 3*sigma, mu + 3*sigma
     sigma_err = gauss.GetParError(2)
 
-    # full width at half length sigma
-    def helper_fwhm():
-        half_max = 0.5 * gauss.GetMaximum()
+    # FWHM in closed form from the fit, the other shape metrics from the bin contents
+    centers, contents = hist_contents(hist)
+    shape = shape_metrics(centers, mu, sigma, weights=contents)
+
+    metrics = {
+        "mean": hist.GetMean(),
+        "rms": rms,
+        "rms_err": rms_err,
+        "mu": mu,
+        "gauss_norm": gauss.GetParameter(0),
+        "sigma": sigma,
+        "sigma_err": sigma_err,
+        "res_quantile": res_quantile,
+        "res_quantile_err": res_quantile_err,
+        **asdict(shape),
+    }
+
+    # the canvases are the slow part, they can be drawn later with render_res
+    if render:
+        draw_fit(hist, gauss, hist_abrev, output_name, metrics, plotGauss)
+
+    del gauss
+
+    # release the histograms, this can run many times in one long-lived worker
+    fIn.Close()
+
+    write_json(output_name, input_card, subsystem, layer, radius, metrics)
+
+    if results_db is not None:
+        append_result(results_db, detector, hist_abrev, read_json(output_name))
+
+    return metrics
+
 
-        x1, x2 = None, None
+def compute_res_unbinned(input_file, output_name, input_card, hist_name, hist_abrev, subsystem, layer, radius, plotGauss=True, render=True, results_db=None, detector=None):
+    """
+    Same output as compute_res, from the raw residuals written by analysis_trk.py --unbinned:
+    quantiles, RMS and fits are computed on the tracks themselves, no binning involved.
+    A histogram is only filled for display.
+    """
 
-        for x in np.linspace(xMin, xMax, 10000):
-            y = gauss.Eval(x)
+    x = load_residuals(input_file, hist_name)
+    res = resolution(x)
 
-            if y >= half_max:
-                # this is the first time we're here so, from left to right, this is the leftmost value (x1)
-                if x1 is None: 
-                    x1 = x
+    shape = shape_metrics(x, res["mu"], res["sigma"])
 
-                # second time -> rightmost
-                x2 = x
-                
-        return abs(x2-x1)
+    metrics = {
+        "mean": res["mean"],
+        "rms": res["rms"],
+        "rms_err": res["rms_err"],
+        "mu": res["mu"],
+        "sigma": res["sigma"],
+        "sigma_err": res["sigma_err"],
+        "res_quantile": res["res_quantile"],
+        "res_quantile_err": res["res_quantile_err"],
+        **asdict(shape),
+        "t_mu": res["t_mu"],
+        "t_sigma": res["t_sigma"],
+        "t_nu": res["t_nu"],
+    }
 
-    sigma_FWHM = helper_fwhm()
+    if render:
+        hist, gauss = display_unbinned(x, hist_name, metrics)
+        draw_fit(hist, gauss, hist_abrev, output_name, metrics, plotGauss)
+        del gauss, hist
 
+    write_json(output_name, input_card, subsystem, layer, radius, metrics)
 
+    if results_db is not None:
+        append_result(results_db, detector, hist_abrev, read_json(output_name))
+
+    return metrics
+
+
+def render_res(input_file, output_name, hist_name, hist_abrev, unbinned=False, plotGauss=True):
+    """
+    Draws the .png/.pdf of a sample whose metrics were computed with render=False (--metricsOnly),
+    from the fit results stored in its JSON.
+    """
+
+    metrics = read_json(output_name)
+
+    if unbinned:
+        hist, gauss = display_unbinned(load_residuals(input_file, hist_name), hist_name, metrics)
+        draw_fit(hist, gauss, hist_abrev, output_name, metrics, plotGauss)
+        del gauss, hist
+        return
+
+    fIn = ROOT.TFile(input_file)
+    hist = fIn.Get(hist_name)
+
+    gauss = ROOT.TF1("gauss2", "gaus", metrics["mu"] - 3*metrics["sigma"], metrics["mu"] + 3*metrics["sigma"])
+    gauss.SetParameters(metrics["gauss_norm"], metrics["mu"], metrics["sigma"])
+
+    draw_fit(hist, gauss, hist_abrev, output_name, metrics, plotGauss)
+
+    del gauss
+    fIn.Close()
+
+
+def display_unbinned(x, hist_name, metrics, display_bins=200):
+
+    mu, sigma = metrics["mu"], metrics["sigma"]
+    xMin, xMax = mu - 3*sigma, mu + 3*sigma
+
+    hist = ROOT.TH1D(f"{hist_name}_display", "", display_bins, xMin, xMax)
+    hist.FillN(len(x), x, ROOT.nullptr)
+
+    # Gaussian with the unbinned fit parameters, normalized to the display binning
+    gauss = ROOT.TF1("gauss2", "gaus", xMin, xMax)
+    gauss.SetParameters(len(x)*hist.GetBinWidth(1)/(math.sqrt(2*math.pi)*sigma), mu, sigma)
+
+    return hist, gauss
+
+
+def draw_fit(hist, gauss, hist_abrev, output_name, metrics, plotGauss=True):
+
+    mu, sigma = metrics["mu"], metrics["sigma"]
+    xMin, xMax = mu - 3*sigma, mu + 3*sigma
+
+    labels = [
+        f"Mean/RMS = {metrics['mean']:.4f}/{metrics['rms']:.4f}",
+        f"Resolution = {metrics['res_quantile']:.4f} %",
+    ]
+    if plotGauss:
+        labels += [
+            f"#sigma = {sigma}",
+            f"#sigma_FWHL= {metrics['sigma_FWHM']}",
+            f"Gauss #mu/#sigma = {mu:.4f}/{sigma:.4f}",
+        ]
+        if "t_sigma" in metrics:
+            labels.append(f"Student-t #sigma/#nu = {metrics['t_sigma']:.4f}/{metrics['t_nu']:.2f}")
 
     gauss.SetLineColor(ROOT.kRed)
     gauss.SetLineWidth(3)
@@ -114,18 +231,15 @@ def compute_res(input_file, output_name, input_card, hist_name, hist_abrev, subs
     latex.SetTextSize(0.035)
     latex.SetTextColor(1)
     latex.SetTextFont(42)
-    latex.DrawLatex(0.2, 0.9, f"Mean/RMS = {hist.GetMean():.4f}/{rms:.4f}")
-    latex.DrawLatex(0.2, 0.85, f"Resolution = {res_quantile:.4f} %")
-    if plotGauss:
-        latex.DrawLatex(0.2, 0.80, f"#sigma = {sigma}")
-        latex.DrawLatex(0.2, 0.75, f"#sigma_FWHL= {sigma_FWHM}")
-        latex.DrawLatex(0.2, 0.70, f"Gauss #mu/#sigma = {mu:.4f}/{sigma:.4f}")
+    for i, label in enumerate(labels):
+        latex.DrawLatex(0.2, 0.9 - 0.05*i, label)
 
     canvas.SaveAs(f"{output_name}.png")
     canvas.SaveAs(f"{output_name}.pdf")
     canvas.Close()
 
-    del gauss
+
+def write_json(output_name, input_card, subsystem, layer, radius, metrics):
 
     data = {}
 
@@ -140,30 +254,37 @@ def compute_res(input_file, output_name, input_card, hist_name, hist_abrev, subs
                 key, value = line.split(' ', 1)
                 data[key] = value
 
-    data["rms"] = rms
-    data["rms_err"] = rms_err
-    data["sigma"] = sigma
-    data["sigma_err"] = sigma_err
-    data["res_quantile"] = res_quantile
-    data["sigma_FWHM"] = sigma_FWHM
+    data.update(metrics)
     
     # Write it to a JSON file
     with open(f"{output_name}.json", "w") as f:
         json.dump(data, f, indent=4)
 
+
+def read_json(output_name):
+    with open(f"{output_name}.json", "r") as f:
+        return json.load(f)
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input", type=str, help="Input file", required=True)
     parser.add_argument("-o", "--output", type=str, help="Output file base name", required=True)
-    parser.add_argument("-ic", "--inputCard", type=str, help=".input file where gun info is stored", required=True)
     parser.add_argument("-n", "--histName", type=str, help="Histogram to plot", required=True)
-    parser.add_argument("-ss", "--subsystem", type=str, help="detector subsystem that the file is from (e.g. VTXIB)", required=True)
-    parser.add_argument("-l", "--layer", type=int, help="layer of the detector subsystem", required=True)
-    parser.add_argument("-r", "--radius", type=float, help="radius of the specified layer of the detector subsystem", required=True)
+
+    # required unless --render
+    parser.add_argument("-ic", "--inputCard", type=str, help=".input file where gun info is stored")
+    parser.add_argument("-ss", "--subsystem", type=str, help="detector subsystem that the file is from (e.g. VTXIB)")
+    parser.add_argument("-l", "--layer", type=int, help="layer of the detector subsystem")
+    parser.add_argument("-r", "--radius", type=float, help="radius of the specified layer of the detector subsystem")
     
     #not required
     parser.add_argument("-a", "--histAbreviation", type=str, help="shorter reference to the histogram name")
+    parser.add_argument("-u", "--unbinned", action="store_true", help="input is the .npz of raw residuals from analysis_trk.py --unbinned")
+    parser.add_argument("-m", "--metricsOnly", action="store_true", help="only write the JSON, skip the .png/.pdf")
+    parser.add_argument("-R", "--render", action="store_true", help="only draw the .png/.pdf from the JSON of an earlier --metricsOnly run")
+    parser.add_argument("-db", "--resultsDb", type=str, help="campaign results store (results.sqlite) to append the metrics to")
+    parser.add_argument("-d", "--detector", type=str, help="detector name of the row appended to --resultsDb")
     
     args = parser.parse_args()
 
@@ -171,13 +292,34 @@ if __name__ == "__main__":
     if args.histAbreviation is None:
         args.histAbreviation = args.histName
 
-    compute_res(
-        input_file=args.input, 
-        output_name=args.output, 
-        input_card=args.inputCard, 
-        hist_name=args.histName, 
-        hist_abrev=args.histAbreviation,
-        subsystem=args.subsystem,
-        layer=args.layer,
-        radius=args.radius,
-        )
+    if args.render:
+        render_res(
+            input_file=args.input,
+            output_name=args.output,
+            hist_name=args.histName,
+            hist_abrev=args.histAbreviation,
+            unbinned=args.unbinned,
+            )
+
+    else:
+        for name in ["inputCard", "subsystem", "layer", "radius"]:
+            if getattr(args, name) is None:
+                parser.error(f"--{name} is required unless --render")
+
+        if args.resultsDb is not None and args.detector is None:
+            parser.error("--detector is required with --resultsDb")
+
+        compute = compute_res_unbinned if args.unbinned else compute_res
+        compute(
+            input_file=args.input, 
+            output_name=args.output, 
+            input_card=args.inputCard, 
+            hist_name=args.histName, 
+            hist_abrev=args.histAbreviation,
+            subsystem=args.subsystem,
+            layer=args.layer,
+            radius=args.radius,
+            render=not args.metricsOnly,
+            results_db=args.resultsDb,
+            detector=args.detector,
+            )
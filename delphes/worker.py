@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+import traceback
+
+# Long-lived worker for d0z0.py: ROOT, libFCCAnalyses and functions.h are loaded once when this
+# process starts, then analysis()/compute_res() calls arrive one JSON line at a time on stdin.
+# Replies go one JSON line at a time to the original stdout; everything ROOT or the analysis
+# prints is sent to stderr instead, so it can never corrupt the reply stream.
+#
+# request: {"call": "analysis", "kwargs": {"input_file": ..., "output_file": ...}}
+# reply:   {"ok": true, "usage": {...}} or {"ok": false, "error": "<traceback>", "usage": {...}}
+# usage: CPU time, peak RSS and I/O (rchar/wchar and block I/O) of the call (see instrumentation.py)
+
+# functions.h is included relative to this directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+sys.path.insert(1, os.path.dirname(os.getcwd()))
+
+replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+import analysis_trk
+import plot_d0z0
+from instrumentation import self_usage
+
+calls = {
+    "analysis": analysis_trk.analysis,
+    "analysis_batch": analysis_trk.analysis_batch,
+    "analysis_unbinned": analysis_trk.analysis_unbinned,
+    "compute_res": plot_d0z0.compute_res,
+    "compute_res_unbinned": plot_d0z0.compute_res_unbinned,
+    "render_res": plot_d0z0.render_res,
+}
+
+
+if __name__ == "__main__":
+
+    replies.write(json.dumps({"ok": True, "ready": True}) + "\n")
+    replies.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        request = json.loads(line)
+
+        before = self_usage()
+        try:
+            calls[request["call"]](**request["kwargs"])
+            reply = {"ok": True}
+        except Exception:
+            reply = {"ok": False, "error": traceback.format_exc()}
+
+        # the peak RSS is the one of the worker so far
+        after = self_usage()
+        reply["usage"] = {key: after[key] - before[key] if key != "maxrss" else after[key] for key in after}
+
+        sys.stdout.flush()
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
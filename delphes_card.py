@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+from dataclasses import dataclass, field
+
+### DELPHES CARD MODEL ###
+# One parser for the .tcl detector cards, shared by d0z0.py, sweep.py, fast_resolution.py and the
+# scripts of delphes/: the card is read into its top-level variables (set B 2.0), its execution
+# path, its modules with their parameters (set/add, with $variables substituted) and the layers of
+# the TrackCovariance DetectorGeometry. Geometry-derived metadata, such as the radius of a layer of
+# a subsystem, comes from there instead of being typed next to the card name. Files pulled in with
+# `source` are not followed: they are listed in sources, and the modules of the execution path they
+# would define in missing_modules.
+#
+# Parsed cards are memoized by the hash of their content, in memory and as pickles in cache_dir,
+# so a card read by every task of a sweep is only parsed once.
+
+cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "delphes_cards")
+
+# bump when the model below changes, so that older pickles are not used
+model_version = 2
+
+# columns of a DetectorGeometry line (after type and label), named as in the comment of the cards:
+# zmin/zmax are rmin/rmax and r is z for forward layers
+columns = ["zmin", "zmax", "r", "w", "X0", "n_meas", "th_up", "th_down", "reso_up", "reso_down", "flag"]
+
+# subsystem of d0z0.py -> (layer type, label in the card): 1 barrel, 2 forward
+subsystems = {
+    "PIPE": (1, "PIPE"),
+    "VTXIB": (1, "VTXLOW"),
+    "VTXOB": (1, "VTXHIGH"),
+    "VTXD": (2, "VTXDSK"),
+    "DCH": (1, "DCH"),
+    "SIWRB": (1, "BSILWRP"),
+    "SIWRD": (2, "FSILWRP"),
+}
+
+
+@dataclass
+class Layer:
+    type: int           # 1 barrel, 2 forward
+    label: str
+    zmin: float         # rmin for forward layers
+    zmax: float         # rmax for forward layers
+    r: float            # z for forward layers
+    w: float            # thickness
+    X0: float           # radiation length
+    n_meas: int
+    th_up: float
+    th_down: float
+    reso_up: float
+    reso_down: float
+    flag: int           # 1 measurement, 0 scattering only
+
+    @property
+    def barrel(self):
+        return self.type == 1
+
+
+@dataclass
+class Module:
+    type: str
+    name: str
+    # set: the value (a string, braces removed), add: the list of added word lists
+    parameters: dict = field(default_factory=dict)
+
+
+@dataclass
+class Card:
+    path: str
+    sha256: str
+    variables: dict
+    execution_path: list
+    modules: dict
+    geometry: list
+    sources: list = field(default_factory=list)
+
+    @property
+    def B(self):
+        # the field the track covariance is computed with
+        module = self.modules.get("TrackCovariance")
+        if module is not None and "Bz" in module.parameters:
+            return float(module.parameters["Bz"])
+        if "B" not in self.variables:
+            raise ValueError(f"{os.path.basename(self.path or 'card')} sets no magnetic field (no TrackCovariance Bz, no B variable)")
+        return float(self.variables["B"])
+
+    @property
+    def missing_modules(self):
+        # modules of the execution path without a module block in this file (e.g. in a sourced file)
+        return [name for name in self.execution_path if name not in self.modules]
+
+    def layers(self, subsystem):
+        """
+        Layers of a subsystem (see subsystems), numbered from 1 going outwards: lists of the
+        geometry lines at the same radius (barrel) or |z| (forward: the disks at +z and -z).
+        """
+
+        if subsystem not in subsystems:
+            raise ValueError(f"Unknown subsystem {subsystem}, known: {', '.join(subsystems)}")
+        layer_type, label = subsystems[subsystem]
+
+        positions = {}
+        for layer in self.geometry:
+            if layer.type == layer_type and layer.label == label:
+                positions.setdefault(abs(layer.r), []).append(layer)
+        return [positions[position] for position in sorted(positions)]
+
+    def layer_radius(self, subsystem, layer):
+        """
+        Radius (barrel) or |z| (forward) of layer (from 1) of a subsystem, in mm.
+        """
+
+        layers = self.layers(subsystem)
+        if not 1 <= layer <= len(layers):
+            raise ValueError(f"{subsystem} of {os.path.basename(self.path)} has {len(layers)} layer(s), no layer {layer}")
+        return round(abs(layers[layer - 1][0].r)*1000, 6)
+
+
+def split_commands(text):
+    """
+    TCL commands of a script as lists of words: a braced group (nested braces included) or a
+    quoted string is one word, commands end at a newline or ;, and # starts a comment where a
+    command would start.
+    """
+
+    commands, words, i = [], [], 0
+    while i < len(text):
+        char = text[i]
+        if char in "\n;":
+            if words:
+                commands.append(words)
+            words = []
+            i += 1
+        elif char.isspace():
+            i += 1
+        elif char == "#" and not words:
+            i = text.find("\n", i) if "\n" in text[i:] else len(text)
+        elif char == "{":
+            depth, start = 0, i
+            while True:
+                if text[i] == "{":
+                    depth += 1
+                elif text[i] == "}":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+                if i == len(text):
+                    raise ValueError(f"Unbalanced braces from: {text[start:start + 40]!r}")
+            words.append(text[start + 1:i])
+            i += 1
+        elif char == '"':
+            end = text.index('"', i + 1)
+            words.append(text[i + 1:end])
+            i = end + 1
+        elif char == "\\" and text[i + 1:i + 2] == "\n":
+            i += 2
+        else:
+            match = re.compile(r"[^\s;]+").match(text, i)
+            words.append(match.group())
+            i = match.end()
+
+    if words:
+        commands.append(words)
+    return commands
+
+
+def substitute(value, variables):
+    return re.sub(r"\$(\w+)", lambda match: variables.get(match.group(1), match.group()), value)
+
+
+def parse_geometry(value):
+    geometry = []
+    for line in value.splitlines():
+        fields = line.split("#")[0].split()
+        if len(fields) < 2 + len(columns):
+            continue
+        values = [float(x) for x in fields[2:2 + len(columns)]]
+        values[columns.index("n_meas")] = int(values[columns.index("n_meas")])
+        values[columns.index("flag")] = int(values[columns.index("flag")])
+        geometry.append(Layer(int(fields[0]), fields[1], *values))
+    return geometry
+
+
+def parse_card(text, path = None):
+
+    variables, execution_path, modules, geometry, sources = {}, [], {}, [], []
+
+    for words in split_commands(text):
+        if words[0] == "source" and len(words) >= 2:
+            sources.append(substitute(words[1], variables))
+
+        elif words[0] == "set" and len(words) >= 3:
+            if words[1] == "ExecutionPath":
+                execution_path = words[2].split()
+            else:
+                variables[words[1]] = substitute(words[2], variables)
+
+        elif words[0] == "module" and len(words) >= 4:
+            module = Module(words[1], words[2])
+            for command in split_commands(words[3]):
+                if command[0] == "set" and len(command) >= 3:
+                    module.parameters[command[1]] = substitute(command[2], variables)
+                elif command[0] == "add" and len(command) >= 2:
+                    module.parameters.setdefault(command[1], []).append([substitute(word, variables) for word in command[2:]])
+            modules[module.name] = module
+
+            if "DetectorGeometry" in module.parameters and module.type == "TrackCovariance":
+                geometry = parse_geometry(module.parameters["DetectorGeometry"])
+
+    sha256 = hashlib.sha256(text.encode()).hexdigest()
+    return Card(path, sha256, variables, execution_path, modules, geometry, sources)
+
+
+_memo = {}
+
+
+def read_card(path, cache = cache_dir):
+    """
+    Parsed card, memoized by the hash of its content (in memory, and as a pickle in cache if not None).
+    """
+
+    with open(path, 'r') as f:
+        text = f.read()
+    key = f"{hashlib.sha256(text.encode()).hexdigest()}.v{model_version}"
+
+    if key not in _memo:
+        pickle_file = os.path.join(cache, f"{key}.pkl") if cache is not None else None
+        card = None
+        if pickle_file is not None and os.path.exists(pickle_file):
+            try:
+                with open(pickle_file, 'rb') as f:
+                    card = pickle.load(f)
+            except Exception:
+                card = None
+
+        if card is None:
+            card = parse_card(text, path)
+            if pickle_file is not None:
+                # written under a temporary name, several processes may parse the same card
+                os.makedirs(cache, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=cache, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(card, f)
+                os.replace(tmp, pickle_file)
+
+        _memo[key] = card
+
+    # the same content may live under several names
+    card = _memo[key]
+    if card.path != path:
+        card = Card(path, card.sha256, card.variables, card.execution_path, card.modules, card.geometry, card.sources)
+    return card
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Summary of a Delphes card: modules and tracker layers")
+    parser.add_argument("card", type=str, help="Delphes card (.tcl)")
+    args = parser.parse_args()
+
+    card = read_card(args.card)
+    try:
+        field_text = f"B = {card.B} T"
+    except ValueError:
+        # e.g. output.tcl, only an output module
+        field_text = "no magnetic field"
+    print(f"{card.path}: {field_text}, {len(card.modules)} modules, {len(card.geometry)} geometry layers")
+    if card.sources:
+        print(f"  sourced, not read: {', '.join(card.sources)}")
+    if card.missing_modules:
+        print(f"  in the execution path but not defined here: {', '.join(card.missing_modules)}")
+    for subsystem in subsystems:
+        radii = [f"{card.layer_radius(subsystem, i + 1):g}" for i in range(len(card.layers(subsystem)))]
+        if len(radii) > 6:
+            radii = radii[:3] + ["..."] + radii[-2:]
+        if radii:
+            print(f"  {subsystem:<6} {len(card.layers(subsystem)):>3} layer(s): {', '.join(radii)} mm")
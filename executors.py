@@ -0,0 +1,211 @@
+import abc
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import time
+
+import instrumentation
+
+### WHERE THE STAGE COMMANDS RUN ###
+# Every d0z0.py stage ends up as one shell command (source a setup, run Delphes/analysis/plot).
+# An executor runs such a command and returns once it is done, raising CalledProcessError if it
+# failed, so the task graph does not care whether it ran here or on a cluster node.
+#
+#   LocalExecutor       bash -lc on this machine (the default)
+#   CondorExecutor      one HTCondor job per command
+#   SlurmExecutor       one Slurm job per command
+#   FakeQueueExecutor   same job files and polling as the batch executors, but the "queue" starts
+#                       them as local background processes: for trying a sweep without a cluster
+#
+# Batch jobs report back through files: each job gets a directory under job_dir with its script,
+# its log and, once finished, a "status" file with the exit code, which is what is polled.
+# The queue is asked about the job at the same time: a job that left it (evicted, killed, its
+# wrapper dead) without writing a status, or that ran past the timeout, raises JobLostError, which
+# d0z0.py retries like a crashed command.
+
+
+class JobLostError(RuntimeError):
+    pass
+
+
+class LocalExecutor:
+
+    def run(self, command, name = None):
+        # measured, see instrumentation.py
+        instrumentation.run(["bash", "-lc", command], check=True)
+
+
+class BatchExecutor(abc.ABC):
+    """
+    Base of the batch executors: writes the job script, submits it and polls for its status file.
+    Subclasses implement submit(job_dir, script, log), returning a job id, state(job_id), "queued",
+    "gone" or None when the queue could not be asked, and cancel(job_id).
+    timeout: seconds a job may take from its submission (None: no limit)
+    """
+
+    def __init__(self, job_dir, poll_interval = 30, timeout = 24*3600):
+        self.job_dir = job_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        os.makedirs(job_dir, exist_ok=True)
+
+    def run(self, command, name = None):
+        job = tempfile.mkdtemp(prefix=f"{name or 'job'}.", dir=self.job_dir)
+        script = os.path.join(job, "job.sh")
+        log = os.path.join(job, "job.log")
+        status = os.path.join(job, "status")
+
+        # the command runs in a subshell so that even an exit in it is followed by the status,
+        # which is written with a rename so that it is never seen half written
+        with open(script, 'w') as f:
+            f.write("#!/bin/bash -l\n")
+            f.write(f"(\n{command}\n)\n")
+            f.write(f"echo $? > {status}.tmp && mv {status}.tmp {status}\n")
+        os.chmod(script, 0o755)
+
+        job_id = self.submit(job, script, log)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        # a job that just ended can be out of the queue before its status shows up on a shared
+        # filesystem, so it is only lost once it has been gone for two polls
+        gone = 0
+        while not os.path.exists(status):
+            if deadline is not None and time.monotonic() > deadline:
+                self.cancel(job_id)
+                raise JobLostError(f"{command} (job {job}, id {job_id}) did not finish within {self.timeout} s, cancelled, log {log}")
+
+            gone = gone + 1 if self.state(job_id) == "gone" else 0
+            if gone >= 2 and not os.path.exists(status):
+                raise JobLostError(f"{command} (job {job}, id {job_id}) left the queue without an exit status ({self.describe(job_id)}), log {log}")
+
+            time.sleep(self.poll_interval)
+
+        with open(status, 'r') as f:
+            returncode = int(f.read())
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, f"{command} (job {job}, log {log})")
+
+    @abc.abstractmethod
+    def submit(self, job, script, log):
+        pass
+
+    @abc.abstractmethod
+    def state(self, job_id):
+        pass
+
+    @abc.abstractmethod
+    def cancel(self, job_id):
+        pass
+
+    def describe(self, job_id):
+        # what the batch system says about a job that is gone, for the error message
+        return "no accounting"
+
+
+def query(command):
+    # output of a batch system query, None if it failed (scheduler busy, timeout, ...)
+    try:
+        return subprocess.run(command, check=True, capture_output=True, text=True, timeout=120).stdout.strip()
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        return None
+
+
+class CondorExecutor(BatchExecutor):
+
+    # JobStatus of the jobs still on their way: idle, running, transferring output, suspended
+    # (held jobs never resume on their own, they count as gone)
+    active_states = {"1", "2", "6", "7"}
+
+    def __init__(self, job_dir, poll_interval = 30, timeout = 24*3600, requirements = None):
+        super().__init__(job_dir, poll_interval, timeout)
+        self.requirements = requirements
+
+    def submit(self, job, script, log):
+        submit_file = os.path.join(job, "job.sub")
+        with open(submit_file, 'w') as f:
+            f.write(f"executable = {script}\n")
+            f.write(f"output = {log}\n")
+            f.write(f"error = {log}\n")
+            f.write(f"log = {os.path.join(job, 'condor.log')}\n")
+            f.write("getenv = False\n")
+            if self.requirements is not None:
+                f.write(f"requirements = {self.requirements}\n")
+            f.write("queue 1\n")
+
+        output = subprocess.run(["condor_submit", submit_file], check=True, capture_output=True, text=True).stdout
+        return re.search(r"submitted to cluster (\d+)", output).group(1)
+
+    def state(self, job_id):
+        output = query(["condor_q", job_id, "-af", "JobStatus"])
+        if output is None:
+            return None
+        return "queued" if output in self.active_states else "gone"
+
+    def cancel(self, job_id):
+        query(["condor_rm", job_id])
+
+    def describe(self, job_id):
+        output = query(["condor_history", job_id, "-limit", "1", "-af", "JobStatus", "ExitCode", "RemoveReason"])
+        return f"condor_history: {output}" if output else "not in condor_history"
+
+
+class SlurmExecutor(BatchExecutor):
+
+    active_states = {"PENDING", "CONFIGURING", "RUNNING", "COMPLETING", "SUSPENDED", "REQUEUED", "RESIZING"}
+
+    def __init__(self, job_dir, poll_interval = 30, timeout = 24*3600, options = ()):
+        super().__init__(job_dir, poll_interval, timeout)
+        self.options = list(options)
+
+    def submit(self, job, script, log):
+        output = subprocess.run(["sbatch", "--parsable", "--output", log, *self.options, script], check=True, capture_output=True, text=True).stdout
+        return output.strip().split(";")[0]
+
+    def state(self, job_id):
+        try:
+            result = subprocess.run(["squeue", "-h", "-j", job_id, "-o", "%T"], capture_output=True, text=True, timeout=120)
+        except (subprocess.TimeoutExpired, OSError):
+            return None
+        if result.returncode != 0:
+            # jobs purged from squeue are an invalid id, anything else is the scheduler not answering
+            return "gone" if "Invalid job id" in result.stderr else None
+        return "queued" if result.stdout.strip() in self.active_states else "gone"
+
+    def cancel(self, job_id):
+        query(["scancel", job_id])
+
+    def describe(self, job_id):
+        output = query(["sacct", "-n", "-X", "-j", job_id, "-o", "State,ExitCode,Reason"])
+        return f"sacct: {' '.join(output.split())}" if output else "not in sacct"
+
+
+class FakeQueueExecutor(BatchExecutor):
+    """
+    Local stand-in for a batch system: jobs are started in the background on this machine.
+    """
+
+    def __init__(self, job_dir, poll_interval = 1, timeout = 24*3600):
+        super().__init__(job_dir, poll_interval, timeout)
+        self.processes = {}
+
+    def submit(self, job, script, log):
+        with open(log, 'w') as f:
+            process = subprocess.Popen(["bash", "-l", script], stdout=f, stderr=subprocess.STDOUT, start_new_session=True)
+        self.processes[process.pid] = process
+        return process.pid
+
+    def state(self, job_id):
+        return "queued" if self.processes[job_id].poll() is None else "gone"
+
+    def cancel(self, job_id):
+        try:
+            os.killpg(job_id, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.processes[job_id].wait()
+
+    def describe(self, job_id):
+        return f"exit code {self.processes[job_id].returncode}"
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from delphes_card import columns, read_card
+from results_store import load_campaign
+
+### ANALYTIC d0/z0 RESOLUTION FROM THE CARD GEOMETRY ###
+# Expected d0/z0 resolution of a detector card without any simulation, from the same ingredients as
+# the TrackCovariance module of Delphes: the DetectorGeometry layers (position, extent, measurement
+# resolution and stereo angle, thickness over radiation length) and the magnetic field.
+#
+# For every (theta, p) the track is followed through the layers it crosses, and its parameters
+# (D, phi0, C, z0, cot(theta)) are fitted to the hits by weighted least squares, in the linear
+# (Karimaki) approximation: the covariance is (A^T V^-1 A)^-1, A being the derivatives of the
+# measured coordinates, and V the hit resolutions plus the correlated displacements caused by
+# multiple scattering in every layer crossed before (Highland formula).
+# The whole (theta, p) grid is one batch of matrix operations: the 9 x 5 grid of gun.py takes about
+# 50 ms per card, so many candidate geometries (e.g. the cards of a sweep.py scan) can be screened
+# before running the full Delphes gun samples on a few of them.
+#
+# Checked against the Delphes gun samples of d0z0/VTXIB_r1 (res_quantile of IDEA_base25 and the
+# three IDEA_VTXIB_r1 cards): d0 and z0 agree within 5% from theta = 30 deg on, at every momentum.
+# At 10 and 20 deg it is lower than Delphes, by up to 30% at p = 1 GeV. check() and --check
+# repeat this comparison for a card with Delphes results.
+
+c_light = 0.299792458   # GeV/(T m)
+muon_mass = 0.10566
+
+
+def read_geometry(card):
+    """
+    The DetectorGeometry layers of a card as arrays (one per column, in metres, plus "type" and
+    "label"), and the magnetic field "B" (T).
+    """
+
+    card = read_card(card)
+    geometry = {"B": card.B, "type": np.array([layer.type for layer in card.geometry]), "label": np.array([layer.label for layer in card.geometry])}
+    for column in columns:
+        geometry[column] = np.array([getattr(layer, column) for layer in card.geometry], dtype=np.float64)
+    return geometry
+
+
+def track_hits(geometry, theta, pt):
+    """
+    Where the tracks cross the layers, arrays (tracks, layers): hit flag, transverse radius and
+    transverse path length from the origin.
+    """
+
+    barrel = geometry["type"] == 1
+    cot = 1/np.tan(theta)[:, None]
+    C = (0.5*c_light*geometry["B"]/pt)[:, None]      # half curvature
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # barrel: the track reaches the radius before curling back (C r < 1) within zmin..zmax
+        r_barrel = np.broadcast_to(geometry["r"], (len(theta), len(barrel)))
+        s_barrel = np.arcsin(np.minimum(C*r_barrel, 1))/C
+        z_barrel = cot*s_barrel
+        hit_barrel = (C*r_barrel < 1) & (z_barrel >= geometry["zmin"]) & (z_barrel <= geometry["zmax"])
+
+        # forward: the disk is on the side of the track, reached within rmin..rmax before the turning point
+        s_disk = geometry["r"]/cot
+        r_disk = np.sin(np.minimum(C*s_disk, np.pi/2))/C
+        hit_disk = (s_disk > 0) & (C*s_disk < np.pi/2) & (r_disk >= geometry["zmin"]) & (r_disk <= geometry["zmax"])
+
+    hit = np.where(barrel, hit_barrel, hit_disk)
+    radius = np.where(barrel, r_barrel, r_disk)
+    path = np.where(barrel, s_barrel, s_disk)
+    return hit, np.where(hit, radius, 0), np.where(hit, path, 0)
+
+
+def estimate(geometry, theta, p, mass = muon_mass):
+    """
+    d0 and z0 resolutions (um) for tracks of polar angle theta (deg) and momentum p (GeV), arrays
+    broadcast together. nan where the track has too few hits to be fitted.
+    """
+
+    theta, p = np.broadcast_arrays(np.asarray(theta, dtype=np.float64), np.asarray(p, dtype=np.float64))
+    shape = theta.shape
+    theta, p = np.radians(theta.ravel()), p.ravel()
+    sin, cos = np.sin(theta), np.cos(theta)
+    cot = cos/sin
+
+    hit, radius, path = track_hits(geometry, theta, p*sin)
+    barrel = geometry["type"] == 1
+
+    # only the layers crossed by at least one track matter
+    used = hit.any(axis=0)
+    hit, radius, path, barrel = hit[:, used], radius[:, used], path[:, used], barrel[used]
+    layer = {column: geometry[column][used] for column in columns}
+
+    # multiple scattering angle of every crossing (Highland), path through the layer at the track angle
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = layer["w"]/layer["X0"]/np.where(barrel, sin[:, None], np.abs(cos)[:, None])
+        beta = p/np.sqrt(p*p + mass*mass)
+        theta0 = 0.0136/(beta*p)[:, None]*np.sqrt(x)*(1 + 0.038*np.log(x))
+    theta0 = np.where(hit & (layer["w"] > 0) & (layer["X0"] > 0), theta0, 0)
+
+    # measurements: up to two per layer (upper and lower side), each along its stereo angle:
+    # u = r*phi, and v = z (barrel) or r (forward), measured = cos(a) u + sin(a) v
+    angle = np.concatenate([layer["th_up"], layer["th_down"]])
+    sigma = np.concatenate([layer["reso_up"], layer["reso_down"]])
+    measures = np.concatenate([layer["n_meas"] >= 1, layer["n_meas"] >= 2]) & (np.tile(layer["flag"], 2) == 1) & (sigma > 0)
+    valid = np.tile(hit, 2) & measures
+    R, S, is_barrel = np.tile(radius, 2), np.tile(path, 2), np.tile(barrel, 2)
+
+    # and only the measurements made on at least one track
+    kept = valid.any(axis=0)
+    angle, sigma, valid, R, S, is_barrel = angle[kept], sigma[kept], valid[:, kept], R[:, kept], S[:, kept], is_barrel[kept]
+
+    # derivatives of u and v with respect to (D, phi0, C, z0, cot(theta)). A barrel layer is crossed
+    # at a fixed radius R, after the transverse path s(R) = asin(C R)/C, so only z = z0 + cot s
+    # depends on z0 and cot. A forward layer is crossed at a fixed z, after s = (z - z0)/cot, so
+    # z0 and cot move the crossing along the track: its radius R = sin(C s)/C and, through the
+    # azimuth phi0 + C s, its r*phi as well.
+    C = (0.5*c_light*geometry["B"]/(p*sin))[:, None]
+    zeros, ones = np.zeros_like(R), np.ones_like(R)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ds_dC = R/np.sqrt(1 - (C*R)**2)
+        du = np.where(is_barrel[:, None], np.stack([ones, R, R*ds_dC, zeros, zeros], axis=-1),
+                      np.stack([ones, R, R*S, -R*C/cot[:, None], -R*C*S/cot[:, None]], axis=-1))
+        dr_ds = np.cos(C*S)
+        dv = np.where(is_barrel[:, None], np.stack([zeros, zeros, cot[:, None]*(ds_dC - S)/C, ones, S], axis=-1),
+                      np.stack([zeros, zeros, (S*dr_ds - R)/C, -dr_ds/cot[:, None], -S*dr_ds/cot[:, None]], axis=-1))
+    A = np.cos(angle)[:, None]*du + np.sin(angle)[:, None]*dv
+    A = np.where(np.isfinite(A) & valid[..., None], A, 0)
+
+    # multiple scattering: a kick in a layer crossed before measurements i and j moves both of them,
+    # by their transverse lever arms to it (S - s) times a factor f per measurement and direction of
+    # the kick. A transverse kick turns phi by theta0/sin(theta) and moves u. A kick in the r-z plane
+    # changes cot by -theta0/sin^2: it moves z by -(S - s)/sin^2 on a barrel layer, and r by
+    # cos(C S) (S - s)/(sin^2 cot) on a forward layer (the crossing slides along the track).
+    # As in the TrackCovariance of Delphes, the kicks in the r-z plane only move the measurements
+    # along v (stereo angle of 45 deg or more, e.g. the z side of the pixels), not the small-angle
+    # stereo ones (drift chamber wires), so the long lever arm of the drift chamber does constrain
+    # cot(theta) at the vertex.
+    # Summed over the layers crossed before the first of the two:
+    #   V_ij = (fu_i fu_j + fv_i fv_j) sum theta0^2 (S_i - s)(S_j - s)
+    # written with cumulative sums of theta0^2 s^n, so the layers are summed once per measurement
+    # and not once per pair.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fv = np.where(is_barrel, -1/sin[:, None]**2, dr_ds/(sin**2*cot)[:, None])
+    fu = np.where(valid, np.cos(angle)/sin[:, None], 0)
+    fv = np.where(valid & (np.abs(np.sin(angle)) >= np.sin(np.pi/4)), np.sin(angle)*fv, 0)
+
+    before = path[:, None, :] < S[:, :, None]
+    W = [np.einsum("nml,nl->nm", before, theta0**2*path**n) for n in range(3)]
+    Si, Sj = S[:, :, None], S[:, None, :]
+    first = Si <= Sj
+    W0, W1, W2 = [np.where(first, w[:, :, None], w[:, None, :]) for w in W]
+
+    V = (fu[:, :, None]*fu[:, None, :] + fv[:, :, None]*fv[:, None, :])*(Si*Sj*W0 - (Si + Sj)*W1 + W2)
+
+    # plus the hit resolutions; unused rows carry no information
+    V += np.eye(V.shape[1])*np.where(valid, sigma**2, 1)[:, :, None]
+
+    F = A.transpose(0, 2, 1) @ np.linalg.solve(V, A)
+    fitted = np.linalg.matrix_rank(F) == 5
+    cov = np.linalg.pinv(np.where(fitted[:, None, None], F, np.eye(5)))
+
+    d0 = np.where(fitted, np.sqrt(cov[:, 0, 0])*1e6, np.nan)
+    z0 = np.where(fitted, np.sqrt(cov[:, 3, 3])*1e6, np.nan)
+    return d0.reshape(shape), z0.reshape(shape)
+
+
+def screen(cards, thetas, moms, mass = muon_mass):
+    """
+    {card name: {"d0": ..., "z0": ...}} with (len(thetas), len(moms)) resolution grids (um).
+    """
+
+    theta, p = np.meshgrid(thetas, moms, indexing="ij")
+    results = {}
+    for card in cards:
+        d0, z0 = estimate(read_geometry(card), theta, p, mass=mass)
+        results[os.path.splitext(os.path.basename(card))[0]] = {"d0": d0, "z0": z0}
+    return results
+
+
+def check(card, campaign_dir, tolerance = 0.05, min_theta = 30, metric = "res_quantile", mass = muon_mass):
+    """
+    Compares the estimate of a card with the Delphes results of the detector of the same name in
+    a campaign (results_store.load_campaign). Returns the rows (param, theta, p, delphes, estimate)
+    of theta >= min_theta whose ratio estimate/delphes is off by more than tolerance.
+    """
+
+    detector = os.path.splitext(os.path.basename(card))[0]
+    rows = load_campaign(campaign_dir, [detector])
+    if not len(rows):
+        raise ValueError(f"No results of {detector} in {campaign_dir}")
+
+    d0, z0 = estimate(read_geometry(card), rows["theta"].astype(np.float64), rows["p"].astype(np.float64), mass=mass)
+    estimated = np.where(rows["param"].astype(str) == "d0", d0, z0)
+    delphes = rows[metric].astype(np.float64)
+
+    failed = []
+    for row, value, reference in zip(rows, estimated, delphes):
+        if row["theta"] >= min_theta and not abs(value/reference - 1) <= tolerance:
+            failed.append((str(row["param"]), float(row["theta"]), float(row["p"]), float(reference), float(value)))
+    return failed
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Analytic d0/z0 resolutions of Delphes cards from their DetectorGeometry")
+    parser.add_argument("-c", "--cards", type=str, nargs="+", required=True, help="Delphes cards (.tcl)")
+    parser.add_argument("-t", "--theta", type=float, nargs="+", default=[10, 20, 30, 40, 50, 60, 70, 80, 90], help="polar angles (deg)")
+    parser.add_argument("-p", "--mom", type=float, nargs="+", default=[1, 5, 10, 50, 100], help="momenta (GeV)")
+    parser.add_argument("-m", "--mass", type=float, default=muon_mass, help="particle mass (GeV)")
+    parser.add_argument("-o", "--output", type=str, help="also save the grids to this JSON file")
+    parser.add_argument("--check", type=str, help="campaign directory with Delphes results of the cards (e.g. d0z0/VTXIB_r1): compare instead of printing the grids")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="largest relative difference to Delphes accepted by --check")
+    parser.add_argument("--minTheta", type=float, default=30, help="smallest polar angle (deg) compared by --check")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = 0
+        for card in args.cards:
+            failed = check(card, args.check, tolerance=args.tolerance, min_theta=args.minTheta, mass=args.mass)
+            failures += len(failed)
+            print(f"{card}: {'OK' if not failed else f'{len(failed)} points off by more than {args.tolerance:.0%}'}")
+            for param, theta, p, reference, value in failed:
+                print(f"    {param} theta={theta:g} p={p:g}: {value:.2f} um, Delphes {reference:.2f} um ({value/reference:.2f})")
+        raise SystemExit(1 if failures else 0)
+
+    results = screen(args.cards, args.theta, args.mom, mass=args.mass)
+
+    for name, res in results.items():
+        for param in ["d0", "z0"]:
+            print(f"{name} {param} [um]")
+            print(f"{'theta':>7} " + " ".join(f"{f'p={p:g}':>9}" for p in args.mom))
+            for i, theta in enumerate(args.theta):
+                print(f"{theta:>7g} " + " ".join(f"{value:>9.2f}" for value in res[param][i]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"theta": args.theta, "p": args.mom,
+                       "results": {name: {param: grid.tolist() for param, grid in res.items()} for name, res in results.items()}}, f, indent=4)
+        print(f"Saved {args.output}")
@@ -0,0 +1,63 @@
+import os
+import struct
+import zipfile
+
+### INPUT CHECKS ###
+# A stage refuses to start on an input that is missing or was cut short (e.g. by a crashed or
+# killed upstream job) instead of quietly producing results from part of a sample.
+# Only headers and trailers are read, so the checks are cheap even on big files, and none of
+# them needs ROOT.
+
+
+def check_file(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing input {path}")
+    if os.path.getsize(path) == 0:
+        raise ValueError(f"Empty input {path}")
+
+
+def check_hepmc(hepmc_file):
+    check_file(hepmc_file)
+
+    # compressed files are checked while they are decompressed (pipefail)
+    if os.path.splitext(hepmc_file)[1] in [".gz", ".zst"]:
+        return
+
+    with open(hepmc_file, 'rb') as f:
+        f.seek(max(os.path.getsize(hepmc_file) - 64, 0))
+        if b"HepMC::Asciiv3-END_EVENT_LISTING" not in f.read():
+            raise ValueError(f"Truncated HepMC file {hepmc_file}: no end of event listing")
+
+
+def check_root(root_file):
+    """
+    A ROOT file is usable if its header points to the streamer info (fSeekInfo, written at the
+    latest when the file is closed) and to an end (fEND) that the file reaches.
+    """
+
+    check_file(root_file)
+
+    with open(root_file, 'rb') as f:
+        header = f.read(64)
+
+    if header[:4] != b"root":
+        raise ValueError(f"{root_file} is not a ROOT file")
+
+    # big files (version >= 1000000) use 64 bit pointers
+    if struct.unpack(">i", header[4:8])[0] >= 1000000:
+        end, seek_info = struct.unpack(">q", header[12:20])[0], struct.unpack(">q", header[45:53])[0]
+    else:
+        end, seek_info = struct.unpack(">i", header[12:16])[0], struct.unpack(">i", header[37:41])[0]
+
+    if seek_info == 0 or os.path.getsize(root_file) < end:
+        raise ValueError(f"Truncated ROOT file {root_file}: not closed properly or cut short")
+
+
+def check_analysis(analysis_file):
+    # histograms (.root) or unbinned residuals (.npz)
+    if analysis_file.endswith(".npz"):
+        check_file(analysis_file)
+        if not zipfile.is_zipfile(analysis_file):
+            raise ValueError(f"Truncated residuals file {analysis_file}")
+    else:
+        check_root(analysis_file)
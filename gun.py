@@ -1,7 +1,13 @@
 import concurrent.futures
+import json
 import os
+import re
 import subprocess
 
+import instrumentation
+from file_checks import check_hepmc
+from scheduler import Task, run_graph
+
 d0z0_path = "/home/submit/escaso/summer2025/d0z0"
 
 
@@ -28,14 +34,29 @@ pdg_dict = {
 }
 
 ### GENERATE INPUT GUN SAMPLES ###
-def generate_samples(input_dir, theta_range, mom_range, pid, nevents = 100000, npart = 1, max_workers = 12):
-    
+default_nevents = 100000
+
+
+def read_nevents(path):
+    # {(theta, mom): nevents} of precision.py
+    with open(path, 'r') as f:
+        return {(entry["theta"], entry["p"]): entry["nevents"] for entry in json.load(f)}
+
+
+def generate_samples(input_dir, theta_range, mom_range, pid, nevents = default_nevents, npart = 1, seed = None, nshards = 1, max_workers = 12):
+    """
+    nevents: events of every card, or {(theta, mom): events} (read_nevents), default_nevents for the
+    cards missing from it
+    seed: base seed, the i-th card gets seed + i (None: each gun seeds itself from the card name)
+    nshards: number of files (and threads) gunHEPMC3 splits each card into
+    """
+
     def helper_ranges():
         for theta in theta_range:
             for mom in mom_range:
                 yield theta, mom
 
-    def helper_write(theta, mom):
+    def helper_write(theta, mom, card_seed):
 
         filename = os.path.join(input_dir, f"{pdg_dict[pid]}_theta_{theta}_p_{mom}.input")
         
@@ -44,23 +65,42 @@ def generate_samples(input_dir, theta_range, mom_range, pid, nevents = 100000, n
             f.write(f"theta_range {theta}.0,{theta}.0\n")
             f.write(f"mom_range {mom}.0,{mom}.0\n")
             f.write(f"pid_list {pid}\n")
-            f.write(f"nevents {nevents}\n")
+            f.write(f"nevents {nevents.get((theta, mom), default_nevents) if isinstance(nevents, dict) else nevents}\n")
+            if card_seed is not None:
+                f.write(f"seed {card_seed}\n")
+            if nshards > 1:
+                f.write(f"nshards {nshards}\n")
 
         print(f"Generated {filename}")
 
     print("Starting gun generator")
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
-        for theta, mom in helper_ranges():
+        futures = []
+        for i, (theta, mom) in enumerate(helper_ranges()):
 
             # submit’s signature is: submit(fn, *args, **kwargs), so it knows that theta and mom are arguments
-            pool.submit(helper_write, theta, mom)
+            futures.append(pool.submit(helper_write, theta, mom, None if seed is None else seed + i))
+
+        # raises the first error, if any
+        for future in futures:
+            future.result()
 
     print("All tasks complete")
 
 
+def check_outputs(input_path, hepmcs_directory):
+    # <card name>.hepmc, or its shards, must be complete
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    outputs = [f for f in os.listdir(hepmcs_directory) if re.fullmatch(rf"{re.escape(name)}(_shard\d+)?\.hepmc(\.gz|\.zst)?", f)]
+    if not outputs:
+        raise FileNotFoundError(f"No HepMC output for {input_path} in {hepmcs_directory}")
+    for output in outputs:
+        check_hepmc(os.path.join(hepmcs_directory, output))
+
+
 ### RUN GUN ON SAMPLES ###
-def run_samples(samples_directory, hepmcs_directory, gun_path = f"{d0z0_path}/particleGun/run_gunHEPMC3_singularity.sh", max_workers = 12):
+def run_samples(samples_directory, hepmcs_directory, gun_path = f"{d0z0_path}/particleGun/run_gunHEPMC3_singularity.sh", max_workers = 12, retries = 2, tracer = None):
 
     path_to_gunHEPMC3 = f"{d0z0_path}/particleGun/gunHEPMC3"
 
@@ -71,23 +111,51 @@ def run_samples(samples_directory, hepmcs_directory, gun_path = f"{d0z0_path}/pa
         $3: argument to that command (input file)
         $4: directory to cd back to (starting directory)
         """
-        try:
-
-            subprocess.run([
-                gun_path, 
-                hepmcs_directory,
-                path_to_gunHEPMC3,
-                input_path,
-                d0z0_path
-            ], check=True)
+        instrumentation.run([
+            gun_path,
+            hepmcs_directory,
+            path_to_gunHEPMC3,
+            input_path,
+            d0z0_path
+        ], check=True)
+        check_outputs(input_path, hepmcs_directory)
+        print("Processed", input_path)
+
+    # failures are retried (container start-up), then reported in a status table
+    tasks = [Task(f"{sample_name}/gun", helper_run, os.path.join(samples_directory, sample_name)) for sample_name in os.listdir(samples_directory)]
+    run_graph(tasks, max_workers=max_workers, retries=retries, retry_on=(subprocess.CalledProcessError,), tracer=tracer)
+
+
+### RUN THE IN-PROCESS NUMPY GUN ON SAMPLES ###
+def run_samples_numpy(samples_directory, hepmcs_directory, compression = None, max_workers = 12, tracer = None):
+    """
+    Same output as run_samples (<card name>.hepmc in hepmcs_directory) with hepmc_gun.py instead of
+    gunHEPMC3: no container, no key4hep setup, and the same events every time for a given card
+    (but not the events gunHEPMC3 generates from that card).
+    compression: None, "gz" or "zst" (<card name>.hepmc.gz/.zst, read by d0z0.py through a pipe)
+    """
+
+    # numpy is only needed for this backend
+    import hepmc_gun
+
+    def helper_output(sample_name):
+        return os.path.join(hepmcs_directory, f"{os.path.splitext(sample_name)[0]}{hepmc_gun.compressions[compression]}")
+
+    # formatting the events holds the GIL, so one process per card
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+
+        def helper_run(sample_name):
+            input_path = os.path.join(samples_directory, sample_name)
+            # measured in the pool process, added to this task
+            _, usage = pool.submit(instrumentation.measured, hepmc_gun.generate, input_path, helper_output(sample_name)).result()
+            instrumentation.add_usage(**usage)
+            check_outputs(input_path, hepmcs_directory)
             print("Processed", input_path)
-        
-        except Exception as e:
-            print(f"Unknown error for {input_path}: {e}")
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
-        for sample_name in os.listdir(samples_directory):
-            pool.submit(helper_run, os.path.join(samples_directory, sample_name))
+        # deterministic, so nothing to retry: failures are reported in a status table
+        tasks = [Task(f"{sample_name}/gun", helper_run, sample_name) for sample_name in os.listdir(samples_directory)]
+        run_graph(tasks, max_workers=max_workers, tracer=tracer)
+
 
 if __name__ == "__main__":
 
@@ -100,8 +168,27 @@ if __name__ == "__main__":
     theta_ranges = [10, 20, 30, 40, 50, 60, 70, 80, 90]
     mom_ranges = [1, 5, 10, 50, 100]
     particle_id = 13
-    nevents = 100000
+    nevents = default_nevents
     npart = 1
+    # events needed per (theta, p) for a target precision, written by precision.py (None: nevents for all)
+    nevents_file = None
+    if nevents_file is not None:
+        nevents = read_nevents(nevents_file)
+
+    # "singularity": gunHEPMC3 in the key4hep container, "numpy": hepmc_gun.py in-process (other
+    # random streams, so not the events of existing gunHEPMC3 campaigns)
+    gun_backend = "singularity"
+    # numpy backend only: None (plain .hepmc), "gz" or "zst"
+    gun_compression = None
+
+    # wall/CPU/RSS/I/O of every sample, see instrumentation.py
+    tracer = instrumentation.Tracer(os.path.join(d0z0_path, "gun_trace.jsonl"))
 
     generate_samples(input_dir=input_path, theta_range=theta_ranges, mom_range=mom_ranges, pid=particle_id, nevents=nevents, npart=npart)
-    run_samples(samples_directory=input_path, hepmcs_directory=hepmc_path)
+    try:
+        if gun_backend == "numpy":
+            run_samples_numpy(samples_directory=input_path, hepmcs_directory=hepmc_path, compression=gun_compression, tracer=tracer)
+        else:
+            run_samples(samples_directory=input_path, hepmcs_directory=hepmc_path, tracer=tracer)
+    finally:
+        print(instrumentation.summary(tracer.events))
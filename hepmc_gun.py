@@ -0,0 +1,241 @@
+import argparse
+import gzip
+import hashlib
+import os
+import queue
+import subprocess
+import threading
+
+import numpy as np
+
+### IN-PROCESS PARTICLE GUN ###
+# NumPy version of particleGun/gunHEPMC3.cpp: same .input cards, same physics (uniform theta and phi,
+# log-uniform momentum, pid drawn from pid_list, two 125 GeV beam electrons into one vertex at the
+# origin) and the same HepMC3 ASCII layout as HepMC3::WriterAscii, but sampled in batches and
+# without the singularity container / key4hep setup. Generation is deterministic: the seed comes
+# from the "seed" entry of the card, or else from the card name.
+# The events are statistically equivalent to those of gunHEPMC3, not identical: the random streams
+# differ (NumPy PCG64 against the C++ engine) and so does the printed precision, so a campaign made
+# with one gun is not reproduced by the other.
+# Outputs ending in .gz or .zst are compressed on the fly (Delphes reads them back through a pipe,
+# see d0z0.response_sample).
+
+hepmc_version = "3.02.05"
+
+compressions = {None: ".hepmc", "gz": ".hepmc.gz", "zst": ".hepmc.zst"}
+
+# same PDG masses as gunHEPMC3.cpp, 0 for anything else
+masses = {
+    211: 0.139570, -211: 0.139570,      # charged pion
+    2212: 0.93827, -2212: 0.93827,      # proton
+    2112: 0.93957,                      # neutron
+    111: 0.13498,                       # pi0
+    130: 0.49767,                       # Klong
+    310: 0.49767,                       # K_S^0
+    11: 0.00051, -11: 0.00051,
+    22: 0.00000,
+    13: 0.10566, -13: 0.10566,
+    213: 0.76690, -213: 0.76690,        # rho(770)^+-
+}
+
+
+def read_card(input_card):
+    config = {}
+    with open(input_card, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, value = line.split(None, 1)
+            config[key] = value
+
+    return {
+        "npart": int(float(config["npart"])),
+        "theta_range": [float(x) for x in config["theta_range"].split(",")],
+        "mom_range": [float(x) for x in config["mom_range"].split(",")],
+        "pid_list": [int(x) for x in config["pid_list"].split(",")],
+        "nevents": int(float(config["nevents"])),
+        "seed": int(config["seed"]) if "seed" in config else None,
+    }
+
+
+def card_seed(input_card):
+    # stable across runs and machines, unlike hash()
+    name = os.path.splitext(os.path.basename(input_card))[0]
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "little")
+
+
+def as_float(x):
+    # gunHEPMC3.cpp keeps angles and momenta in float
+    return x.astype(np.float32).astype(np.float64)
+
+
+def sample_particles(rng, card, nevents):
+    """
+    Kinematics of nevents events at once, arrays of shape (nevents, npart).
+    """
+
+    shape = (nevents, card["npart"])
+
+    pid = np.asarray(card["pid_list"])[rng.integers(0, len(card["pid_list"]), size=shape)]
+    theta = as_float(rng.uniform(*card["theta_range"], size=shape)*2.0*np.pi/360.)
+    phi = as_float(rng.uniform(-np.pi, np.pi, size=shape))
+    momp = as_float(np.exp(rng.uniform(*np.log(card["mom_range"]), size=shape)))
+
+    mass = np.vectorize(lambda p: masses.get(p, 0.0), otypes=[np.float64])(pid)
+
+    px = as_float(momp*np.sin(theta)*np.cos(phi))
+    py = as_float(momp*np.sin(theta)*np.sin(phi))
+    pz = as_float(momp*np.cos(theta))
+    e = as_float(np.sqrt(px*px + py*py + pz*pz + mass*mass))
+
+    # WriterAscii writes the mass computed from the four-momentum
+    m2 = e*e - (px*px + py*py + pz*pz)
+    m = np.sign(m2)*np.sqrt(np.abs(m2))
+
+    return pid, px, py, pz, e, m
+
+
+class HepMC3AsciiWriter:
+    """
+    Writes events the way HepMC3::WriterAscii does, to one or several streams at once
+    (several streams: the same events are teed to all of them).
+    """
+
+    beams = (
+        "P 1 0 11 0.0000000000000000e+00 0.0000000000000000e+00 1.2500000000000000e+02 1.2500000000000000e+02 0.0000000000000000e+00 3\n"
+        "P 2 0 11 0.0000000000000000e+00 0.0000000000000000e+00 -1.2500000000000000e+02 1.2500000000000000e+02 0.0000000000000000e+00 3\n"
+        "V -1 0 [1,2]\n"
+    )
+
+    def __init__(self, streams, npart):
+        self.streams = streams if isinstance(streams, (list, tuple)) else [streams]
+        particles = "".join(f"P {3 + i} -1 %d %.16e %.16e %.16e %.16e %.16e 1\n" for i in range(npart))
+        self.event_template = f"E %d 1 {2 + npart}\nU GEV MM\n" + self.beams + particles
+        self.write(f"HepMC::Version {hepmc_version}\nHepMC::Asciiv3-START_EVENT_LISTING\n")
+
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+
+    def write_events(self, first_event, pid, px, py, pz, e, m):
+        nevents, npart = pid.shape
+
+        # one row per event: event number, then (pid, px, py, pz, e, m) of every particle
+        values = np.empty((nevents, 1 + 6*npart), dtype=np.float64)
+        values[:, 0] = np.arange(first_event, first_event + nevents)
+        for i, column in enumerate([pid, px, py, pz, e, m]):
+            values[:, 1 + i::6] = column
+
+        self.write((self.event_template*nevents) % tuple(values.ravel().tolist()))
+
+    def close(self):
+        self.write("HepMC::Asciiv3-END_EVENT_LISTING\n\n")
+
+
+def open_output(output):
+    # the events are highly repetitive text, the fastest levels already compress them well
+    if output.endswith(".gz"):
+        return gzip.open(output, 'wt', compresslevel=1)
+    if output.endswith(".zst"):
+        return CompressorPipe(["zstd", "-q", "-f", "-3", "-o", output])
+    return open(output, 'w')
+
+
+class CompressorPipe:
+    """
+    Text stream into a compressor command (the zstd CLI, also needed to read the files back).
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, text=True)
+
+    def write(self, text):
+        self.process.stdin.write(text)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise subprocess.CalledProcessError(self.process.returncode, self.command)
+
+
+class ThreadedStream:
+    """
+    Writes to a stream (e.g. the FIFO of one Delphes process) from its own thread, through a
+    bounded queue. When events are teed to several readers, a slow one then only holds back
+    the generation once its queue is full, instead of stalling every other reader at each write.
+    """
+
+    def __init__(self, stream, maxsize = 8):
+        self.stream = stream
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            text = self.queue.get()
+            if text is None:
+                break
+            if self.error is None:
+                try:
+                    self.stream.write(text)
+                    self.stream.flush()
+                except Exception as e:
+                    # keep draining, so write() never blocks on a dead reader
+                    self.error = e
+
+    def write(self, text):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(text)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.stream.close()
+        except Exception as e:
+            self.error = self.error or e
+        if self.error is not None:
+            raise self.error
+
+
+def generate(input_card, output, seed = None, chunk_size = 10000):
+    """
+    Generates the events of one .input card into output: a path (compressed if it ends in .gz/.zst),
+    an open text stream, or a list of streams that all get the same events (streams are left open).
+    seed: overrides the seed of the card / the one derived from its name
+    """
+
+    card = read_card(input_card)
+    if seed is None:
+        seed = card["seed"] if card["seed"] is not None else card_seed(input_card)
+    rng = np.random.default_rng(seed)
+
+    f = open_output(output) if isinstance(output, str) else output
+    writer = HepMC3AsciiWriter(f, card["npart"])
+
+    for first_event in range(0, card["nevents"], chunk_size):
+        nevents = min(chunk_size, card["nevents"] - first_event)
+        writer.write_events(first_event, *sample_particles(rng, card, nevents))
+
+    writer.close()
+    if isinstance(output, str):
+        f.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", type=str, help="gun .input card", required=True)
+    parser.add_argument("-o", "--output", type=str, help="output .hepmc[.gz|.zst] file (default: <card name>.hepmc)")
+    parser.add_argument("-c", "--compression", type=str, choices=["gz", "zst"], help="compress the default output")
+    parser.add_argument("-s", "--seed", type=int, help="random seed (default: from the card, or its name)")
+    args = parser.parse_args()
+
+    output = args.output or f"{os.path.splitext(os.path.basename(args.input))[0]}{compressions[args.compression]}"
+    generate(args.input, output, seed=args.seed)
+    print("Generated", output)
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+
+### PER-STAGE TIMING AND RESOURCES ###
+# Every task of the d0z0.py/gun.py task graphs is measured: wall time, CPU time, peak RSS and I/O.
+# I/O comes as two pairs of counters of /proc/<pid>/io:
+#   rchar/wchar            bytes passed to read()/write(): what the task actually read and wrote,
+#                          on any filesystem (network filesystems such as ceph and eos included),
+#                          but also through pipes and from the page cache
+#   read_bytes/write_bytes block device I/O only: local disk reads that missed the cache and
+#                          writeback; about 0 for files on ceph/eos
+# A task's numbers include
+#   - the commands it runs (Delphes, analysis_trk.py, ...), through os.wait4 of the process and
+#     its /proc/<pid>/io read just before it is reaped,
+#   - the calls it sends to the persistent ROOT workers (measured in the worker),
+#   - its own Python code (thread CPU time and /proc/thread-self/io).
+# One JSON line per task attempt goes to the trace file; write_chrome_trace converts it for
+# chrome://tracing / Perfetto, and summary() lists the slowest stages and samples per detector.
+#
+# The usage of commands and worker calls is added to whatever task runs in the current thread
+# (add_usage), so the stage functions themselves need no changes. Batch jobs (executors.py)
+# only get their wall time.
+
+_local = threading.local()
+
+io_keys = ["rchar", "wchar", "read_bytes", "write_bytes"]
+
+
+def proc_io(path = "/proc/thread-self/io"):
+    # I/O counters of a /proc io file (this thread by default), 0 where /proc is not available
+    io = dict.fromkeys(io_keys, 0)
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, value = line.split(":")
+                if key in io:
+                    io[key] = int(value)
+    except OSError:
+        pass
+    return io
+
+
+def self_usage():
+    # CPU, peak RSS and I/O of this process so far (threads and waited children included)
+    usage = rusage_dict(resource.getrusage(resource.RUSAGE_SELF))
+    usage.update(proc_io("/proc/self/io"))
+    return usage
+
+
+def add_usage(cpu = 0.0, maxrss = 0, rchar = 0, wchar = 0, read_bytes = 0, write_bytes = 0):
+    """
+    Adds the usage of a process or worker call to the task running in this thread (if measured).
+    maxrss in bytes
+    """
+
+    usage = getattr(_local, "usage", None)
+    if usage is None:
+        return
+    usage["cpu"] += cpu
+    usage["maxrss"] = max(usage["maxrss"], maxrss)
+    usage["rchar"] += rchar
+    usage["wchar"] += wchar
+    usage["read_bytes"] += read_bytes
+    usage["write_bytes"] += write_bytes
+
+
+def rusage_dict(ru):
+    # ru_maxrss is in kB on Linux, blocks are 512 bytes
+    return {
+        "cpu": ru.ru_utime + ru.ru_stime,
+        "maxrss": ru.ru_maxrss*1024,
+        "read_bytes": ru.ru_inblock*512,
+        "write_bytes": ru.ru_oublock*512,
+    }
+
+
+def wait(process):
+    """
+    process.wait() that also adds the resources used by the process (and the children it
+    waited for) to the current task.
+    """
+
+    # rchar/wchar are not in the rusage: they are read from /proc while the finished process is
+    # still a zombie (WNOWAIT), before wait4 reaps it
+    os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+    io = proc_io(f"/proc/{process.pid}/io")
+
+    _, status, ru = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    usage = rusage_dict(ru)
+    usage.update(rchar=io["rchar"], wchar=io["wchar"])
+    add_usage(**usage)
+    return process.returncode
+
+
+def run(args, check = False, **kwargs):
+    """
+    subprocess.run (without input/capture) measured with wait().
+    """
+
+    process = subprocess.Popen(args, **kwargs)
+    try:
+        wait(process)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    return subprocess.CompletedProcess(args, process.returncode)
+
+
+def measured(fn, *args, **kwargs):
+    """
+    Runs fn in this process and returns (result, usage): for functions sent to a process pool,
+    whose usage is then added in the parent with add_usage(**usage).
+    """
+
+    before = self_usage()
+    result = fn(*args, **kwargs)
+    after = self_usage()
+
+    usage = {key: after[key] - value for key, value in before.items() if key != "maxrss"}
+    usage["maxrss"] = after["maxrss"]
+    return result, usage
+
+
+class Tracer:
+
+    def __init__(self, trace_file = None):
+        self.trace_file = trace_file
+        self.events = []
+        self.lock = threading.Lock()
+
+        if trace_file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+            open(trace_file, 'w').close()
+
+    @contextlib.contextmanager
+    def task(self, name, attempt = 1):
+        """
+        Measures everything done in this thread (and the processes/worker calls it waits for)
+        until the end of the block as one trace event.
+        """
+
+        usage = {"cpu": 0.0, "maxrss": 0, **dict.fromkeys(io_keys, 0)}
+        previous, _local.usage = getattr(_local, "usage", None), usage
+
+        start, wall_start, cpu_start, io_start = time.time(), time.perf_counter(), time.thread_time(), proc_io()
+        status = "failed"
+        try:
+            yield
+            status = "done"
+        finally:
+            io_end = proc_io()
+            event = {
+                "name": name,
+                "attempt": attempt,
+                "status": status,
+                "thread": threading.get_ident(),
+                "start": start,
+                "wall": time.perf_counter() - wall_start,
+                "cpu": usage["cpu"] + time.thread_time() - cpu_start,
+                # peak of the processes it ran, or of this process for pure Python stages
+                "maxrss": usage["maxrss"] or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024,
+                **{key: usage[key] + io_end[key] - io_start[key] for key in io_keys},
+            }
+            _local.usage = previous
+            self.record(event)
+
+    def record(self, event):
+        with self.lock:
+            self.events.append(event)
+            if self.trace_file is not None:
+                with open(self.trace_file, 'a') as f:
+                    f.write(json.dumps(event) + "\n")
+
+
+def read_trace(trace_file):
+    with open(trace_file, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def split_name(name):
+    """
+    Task names are <detector>/<sample>/<stage> (d0z0.py) or <sample>/<stage> and <sample>
+    (helpers, gun.py): returns (detector, sample, stage), "-" where absent.
+    """
+
+    parts = name.split("/")
+    if len(parts) >= 3:
+        return parts[0], "/".join(parts[1:-1]), parts[-1]
+    if len(parts) == 2:
+        return "-", parts[0], parts[1]
+    return "-", name, "-"
+
+
+def write_chrome_trace(events, output_file):
+    """
+    Chrome trace event format: one row (pid) per detector and one lane (tid) per thread.
+    """
+
+    trace = []
+    for event in events:
+        detector, sample, stage = split_name(event["name"])
+        trace.append({
+            "name": f"{stage} {sample}",
+            "cat": stage,
+            "ph": "X",
+            "ts": event["start"]*1e6,
+            "dur": event["wall"]*1e6,
+            "pid": detector,
+            "tid": event["thread"],
+            "args": {key: event[key] for key in ["name", "attempt", "status", "cpu", "maxrss"] + io_keys if key in event},
+        })
+
+    with open(output_file, 'w') as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+def summary(events, top = 5):
+    """
+    Per detector: wall/CPU time and peak RSS per stage, and the slowest samples and tasks.
+    """
+
+    detectors = {}
+    for event in events:
+        detector, sample, stage = split_name(event["name"])
+        detectors.setdefault(detector, []).append((sample, stage, event))
+
+    lines = []
+    for detector, entries in sorted(detectors.items()):
+        lines.append(f"=== {detector} ===")
+
+        # shards (delphes0, delphes1, ...) count as one stage
+        stages = {}
+        for _, stage, event in entries:
+            stage = stage.rstrip("0123456789")
+            total = stages.setdefault(stage, {"n": 0, "wall": 0.0, "cpu": 0.0, "maxrss": 0, "io": 0, "block": 0})
+            total["n"] += 1
+            total["wall"] += event["wall"]
+            total["cpu"] += event["cpu"]
+            total["maxrss"] = max(total["maxrss"], event["maxrss"])
+            # traces written before rchar/wchar were recorded only have the block I/O
+            total["io"] += event.get("rchar", 0) + event.get("wchar", 0)
+            total["block"] += event["read_bytes"] + event["write_bytes"]
+
+        # read+write: rchar + wchar (any filesystem, pipes), disk: block device I/O only
+        lines.append(f"{'stage':<12} {'tasks':>6} {'wall [s]':>10} {'cpu [s]':>10} {'max RSS [MB]':>13} {'read+write [MB]':>16} {'disk [MB]':>10}")
+        for stage, total in sorted(stages.items(), key=lambda item: -item[1]["wall"]):
+            lines.append(f"{stage:<12} {total['n']:>6} {total['wall']:>10.1f} {total['cpu']:>10.1f} {total['maxrss']/2**20:>13.0f} {total['io']/2**20:>16.0f} {total['block']/2**20:>10.0f}")
+
+        samples = {}
+        for sample, _, event in entries:
+            samples[sample] = samples.get(sample, 0.0) + event["wall"]
+        lines.append("slowest samples: " + ", ".join(f"{sample} ({wall:.1f} s)" for sample, wall in sorted(samples.items(), key=lambda item: -item[1])[:top]))
+
+        slowest = sorted(entries, key=lambda entry: -entry[2]["wall"])[:top]
+        lines.append("slowest tasks: " + ", ".join(f"{event['name']} ({event['wall']:.1f} s)" for _, _, event in slowest))
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Summarize a d0z0.py/gun.py trace")
+    parser.add_argument("trace", type=str, help="trace file (JSON lines)")
+    parser.add_argument("-c", "--chrome", type=str, help="also write it in Chrome trace format to this file")
+    parser.add_argument("-n", "--top", type=int, default=5, help="number of slowest samples/tasks listed per detector")
+    args = parser.parse_args()
+
+    events = read_trace(args.trace)
+    print(summary(events, top=args.top))
+    if args.chrome:
+        write_chrome_trace(events, args.chrome)
+        print(f"Chrome trace saved to {args.chrome}")
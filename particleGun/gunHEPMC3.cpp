@@ -11,15 +11,13 @@
 #include <string>
 #include <random>
 #include <cmath>
+#include <thread>
 
 using namespace HepMC3;
 
-#include <random>
-#include <cmath>
-
 double get_mass(int pid) {
     // PDG mass values
-    std::map<int, double> masses = {
+    static const std::map<int, double> masses = {
         {211, 0.139570},    // charged pion
         {-211, 0.139570},   // charged pion
         {2212, 0.93827},    // proton
@@ -38,15 +36,34 @@ double get_mass(int pid) {
 
     };
     // Return the mass if found, 0 otherwise
-    return masses.count(pid) ? masses[pid] : 0;
+    auto it = masses.find(pid);
+    return it != masses.end() ? it->second : 0;
 }
 
-void generate_event(int iEv, WriterAscii& writer, const std::vector<int>& pid_list, 
-                    int npart, const std::vector<float>& theta_range, 
-                    const std::vector<float>& mom_range) {
-    // Create a random number generator
-    std::random_device rd;
-    std::mt19937 gen(rd());
+// Everything needed to generate events, built once per shard: the seeded engine, the
+// distributions and the masses of pid_list.
+struct Generator {
+    std::mt19937 gen;
+    std::vector<int> pid_list;
+    std::vector<double> mass_list;
+    int npart;
+    std::uniform_int_distribution<> pid_dist;
+    std::uniform_real_distribution<> theta_dist;
+    std::uniform_real_distribution<> phi_dist;
+    std::uniform_real_distribution<> log_mom_dist;
+
+    Generator(std::seed_seq& seed, const std::vector<int>& pids, int n,
+              const std::vector<float>& theta_range, const std::vector<float>& mom_range)
+        : gen(seed), pid_list(pids), npart(n),
+          pid_dist(0, pids.size() - 1),
+          theta_dist(theta_range[0], theta_range[1]),
+          phi_dist(-M_PI, M_PI),
+          log_mom_dist(log(mom_range[0]), log(mom_range[1])) {
+        for (int pid : pid_list) mass_list.push_back(get_mass(pid));
+    }
+};
+
+void generate_event(int iEv, WriterAscii& writer, Generator& g) {
 
     // Create a new event
     GenEvent evt(Units::GEV, Units::MM);
@@ -61,30 +78,23 @@ void generate_event(int iEv, WriterAscii& writer, const std::vector<int>& pid_li
     v->add_particle_in(p2);
 
     // Loop over each particle
-    for (int i = 0; i < npart; i++) {
+    for (int i = 0; i < g.npart; i++) {
         // Generate random PID
-        std::uniform_int_distribution<> pid_dist(0, pid_list.size() - 1);
-        int pid = pid_list[pid_dist(gen)];
-
+        int ipid = g.pid_dist(g.gen);
+        int pid = g.pid_list[ipid];
 
         // Generate random theta
-        std::uniform_real_distribution<> theta_dist(theta_range[0], theta_range[1]);
-        float theta = theta_dist(gen) * 2.0*M_PI/360.;
+        float theta = g.theta_dist(g.gen) * 2.0*M_PI/360.;
 
         // Generate random phi
-        std::uniform_real_distribution<> phi_dist(-M_PI, M_PI);
-        float phi = phi_dist(gen);
-
-        // Create the particle
+        float phi = g.phi_dist(g.gen);
 
         // Get the particle mass
-        double mass = get_mass(pid);
+        double mass = g.mass_list[ipid];
 
         // Generate random momentum
-        std::uniform_real_distribution<> log_mom_dist(log(mom_range[0]), log(mom_range[1]));
-        float momp = exp(log_mom_dist(gen));
+        float momp = exp(g.log_mom_dist(g.gen));
 
-         //std::cout<<"  "<<i<<","<<pid<<","<<momp<<","<<etap<<","<<phip<<"\n";
         // Compute px, py, pz, E
         float px = momp * sin(theta) * cos(phi);
         float py = momp * sin(theta) * sin(phi);
@@ -95,7 +105,6 @@ void generate_event(int iEv, WriterAscii& writer, const std::vector<int>& pid_li
         GenParticlePtr particle = make_shared<GenParticle>(FourVector(px, py, pz, e), pid, 1);
 
         // add the particle to the vertex
-        //v->add_particle_in(particle);
         v->add_particle_out(particle);
 
     }
@@ -107,6 +116,31 @@ void generate_event(int iEv, WriterAscii& writer, const std::vector<int>& pid_li
     writer.write_event(evt);
 }
 
+// Generates events [first, last) of the card into one file, with its own engine seeded from
+// (seed, shard): the same card, seed and nshards always give the same files.
+void generate_shard(int shard, unsigned long seed, int first, int last, const std::string& output,
+                    const std::vector<int>& pid_list, int npart,
+                    const std::vector<float>& theta_range, const std::vector<float>& mom_range) {
+
+    std::seed_seq seq{(unsigned) (seed & 0xffffffff), (unsigned) (seed >> 32), (unsigned) shard};
+    Generator g(seq, pid_list, npart, theta_range, mom_range);
+
+    WriterAscii writer(output);
+    for (int i = first; i < last; i++) {
+        generate_event(i, writer, g);
+    }
+    writer.close();  // This will add the "HepMC::Asciiv3-END_EVENT_LISTING" line
+}
+
+// Default seed when the card has none: FNV-1a of the card name, stable across runs
+unsigned long name_seed(const std::string& name) {
+    unsigned long long hash = 14695981039346656037ULL;
+    for (char c : name) {
+        hash ^= (unsigned char) c;
+        hash *= 1099511628211ULL;
+    }
+    return hash;
+}
 
 int main(int argc, char** argv) {
     // Check that the correct number of parameters were passed
@@ -174,6 +208,10 @@ int main(int argc, char** argv) {
         pid_list.push_back(std::stoi(pid));
     }
 
+    // Optional: seed (default: from the card name) and number of output shards (default: 1)
+    unsigned long seed = config.count("seed") ? std::stoul(config["seed"]) : name_seed(filename_name_only);
+    int nshards = config.count("nshards") ? std::stoi(config["nshards"]) : 1;
+
     // Print the parsed values for debugging
     std::cout << "nevents: " << nevents << "\n";
 
@@ -199,14 +237,24 @@ int main(int argc, char** argv) {
     }
     std::cout << "\n";
 
-    // Open the output file
-    WriterAscii writer(filename_name_only + ".hepmc");
-
-    // Generate and write n events
-    for (int i = 0; i < nevents; i++) {
-        generate_event(i, writer, pid_list, npart, theta_range, mom_range);
+    std::cout << "seed: " << seed << "\n";
+    std::cout << "nshards: " << nshards << "\n";
+
+    // One thread and one file per shard, each with a contiguous range of event numbers.
+    // A single shard keeps the old output name.
+    int ntotal = nevents;
+    std::vector<std::thread> threads;
+    for (int shard = 0; shard < nshards; shard++) {
+        int first = (long) ntotal * shard / nshards;
+        int last = (long) ntotal * (shard + 1) / nshards;
+        std::string output = nshards == 1 ? filename_name_only + ".hepmc"
+                                          : filename_name_only + "_shard" + std::to_string(shard) + ".hepmc";
+        threads.emplace_back(generate_shard, shard, seed, first, last, output,
+                             std::cref(pid_list), npart, std::cref(theta_range), std::cref(mom_range));
+    }
+    for (std::thread& t : threads) {
+        t.join();
     }
 
-    writer.close();  // This will add the "HepMC::Asciiv3-END_EVENT_LISTING" line
     return 0;
 }
\ No newline at end of file
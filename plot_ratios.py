@@ -1,250 +1,249 @@
-import math
 import ROOT
 import os
-import array
-import json
 import argparse
 
-class DataPoint:
-
-    # class variables (shared accross all instances)
-    momentum_ranges = [1, 5, 10, 50, 100]
-    theta_ranges = [10,20,30,40,50,60,70,80,90]
-    markers = [20,21,22,23,33]
-    colors = [ROOT.kBlack, ROOT.kRed, ROOT.kBlue, ROOT.kGreen+2, ROOT.kMagenta+1]
-    momentum_markers = {mom: (c,m) for mom,c,m in zip(momentum_ranges, colors, markers)}
-
-
-    def __init__(self, p, theta, param):
-        self.p = p
-        self.theta = theta
-        self.cosTheta = math.cos(math.radians(theta))
-        self.param = param
-        self.color, self.marker = DataPoint.momentum_markers[p]
-
-    def __str__(self):
-        return f"p = {self.p}; theta = {self.theta}; cosTheta = {self.cosTheta}; param: {self.param}"
-
-
-def plot_detector_resolutions(param_detector_data, plotting_param, path):
-    for param_num, param_name in enumerate(["d0", "z0"]):
-        for detector, momentum_dict in param_detector_data[param_num].items():
-            c = ROOT.TCanvas(f"c_{detector}_{param_name}", f"{param_name} resolution {detector}", 800, 600)
-            c.SetLogy()  # Set logarithmic y-axis
-            c.SetGrid(0, 0)  # No grid lines
-            c.SetTickx(1)
-            c.SetTicky(1)
-
-            mg = ROOT.TMultiGraph()
-            mg.SetTitle(f"{param_name} resolution vs cos#theta for {detector};cos#theta;{plotting_param} [{param_name}] [#mu m]")
-
-            legend = ROOT.TLegend(0.1, 0.7, 0.3, 0.9)
-
-            for momentum, points in momentum_dict.items():
-                x_arr = array.array("d", [pt.cosTheta for pt in points])
-                y_arr = array.array("d", [pt.param for pt in points])
-
-                graph = ROOT.TGraph(len(points), x_arr, y_arr)
-                graph.SetMarkerColor(points[0].color)
-                graph.SetMarkerStyle(points[0].marker)
-                graph.SetMarkerSize(1.2)
-                graph.SetLineColor(points[0].color)
-
-                mg.Add(graph, "LP")  # Lines + Points
-                legend.AddEntry(graph, f"p = {momentum} GeV", "lp")  # Use the actual graph for legend
-            
-            mg.Draw("A")
-            mg.GetXaxis().SetTitle("cos#theta")
-            mg.GetYaxis().SetTitle(f"{plotting_param} (#Delta{param_name}) [#mum]")
-            legend.Draw()
-            c.SaveAs(f"{path}/{param_name}_plots/{detector}_{param_name}_individual.pdf")
-            c.SaveAs(f"{path}/{param_name}_plots/{detector}_{param_name}_individual.png")
-
-
-def plot_detector_comparisons(data, default_detector, detectors, plotting_param, path):
-
-    for param_num, param_name in enumerate(["d0", "z0"]):
-        for det in detectors:
-            c = ROOT.TCanvas(f"c_{param_name}_{det}_over_{default_detector}", f"{plotting_param} ratio: {det}/{default_detector} - {param_name}", 800, 900)
-
-            # Split canvas into upper and lower pads for main plot and ratio
-            pad1 = ROOT.TPad("pad1", "Top pad", 0, 0.33, 1, 1.0)   # Left, Bottom, Right, Top (normalized [0,1])
-            pad1.SetLogy()
-            pad1.SetBottomMargin(0.02)   # No x-axis label space for upper pad
-            pad1.SetTopMargin(0.08)      # Space for title
-            pad1.SetGridx()              # Add grid in x
-            pad1.Draw()                 # Attach pad to canvas
-            pad1.cd()                   # Make pad1 the current drawing pad
-            
-            # TMultiGraph to hold all points from both detectors
-            multigraph = ROOT.TMultiGraph()
-
-            # Add a legend in the upper right corner
-            legend = ROOT.TLegend(0.1, 0.5, 0.5, 0.9)  
-            # (x1, y1, x2, y2) in normalized pad coordinates
-            legend.SetTextSize(0.025)
-
-            ratio_graphs = []
-
-            for momentum, points1 in data[param_num][det].items():
-
-                points2 = data[param_num][default_detector][momentum]
-
-                color = points1[0].color
-                contrast_markers = {20: 24, 21: 25, 22: 26, 23: 32, 33: 27}
-
-                # --- Plot detector ---
-                x1 = array.array("d", [p.cosTheta for p in points1])
-                y1 = array.array("d", [p.param for p in points1])
-                g1 = ROOT.TGraph(len(points1), x1, y1)
-                g1.SetMarkerColor(color)
-                g1.SetMarkerStyle(points1[0].marker)
-                g1.SetMarkerSize(1.2)
-                g1.SetLineColor(color)
-                multigraph.Add(g1, "P")
-                legend.AddEntry(g1, f"{momentum} GeV ({det})", "p")
-
-                # --- Plot default_detector ---
-                x2 = array.array("d", [p.cosTheta for p in points2])
-                y2 = array.array("d", [p.param for p in points2])
-                g2 = ROOT.TGraph(len(points2), x2, y2)
-                g2.SetMarkerColor(color)
-                g2.SetMarkerStyle(contrast_markers[points1[0].marker])
-                g2.SetMarkerSize(1.2)
-                g2.SetLineColor(color)
-                multigraph.Add(g2, "P")
-                legend.AddEntry(g2, f"{momentum} GeV ({default_detector})", "p")
-
-                # --- Create ratio graph ---
-                ratio_x, ratio_y = [], []
-                for p1, p2 in zip(points1, points2):
-                    ratio_x.append(p1.cosTheta)
-                    ratio_y.append(p1.param / p2.param if p2.param != 0 else 0)
-
-                gr_ratio = ROOT.TGraph(len(ratio_x), array.array("d", ratio_x), array.array("d", ratio_y))
-                gr_ratio.SetMarkerColor(DataPoint.momentum_markers[momentum][0])
-                gr_ratio.SetMarkerStyle(20)  # Uniform marker for ratio panel
-                gr_ratio.SetMarkerSize(1.2)
-                gr_ratio.SetLineColor(DataPoint.momentum_markers[momentum][0])
-                ratio_graphs.append(gr_ratio)
-
-
-            # Draw top pad
-            multigraph.SetTitle(f"{param_name} resolution: {det} vs {default_detector};cos#theta;{plotting_param} (#Delta{param_name}) [#mum]")
-            multigraph.Draw("A")
-            multigraph.GetYaxis().SetTitleSize(0.045)
-            multigraph.GetYaxis().SetTitleOffset(1.1)
-            multigraph.GetXaxis().SetLabelSize(0)
-            x_min = multigraph.GetXaxis().GetXmin()
-            x_max = multigraph.GetXaxis().GetXmax()
-            legend.Draw()
-
-            # Lower pad
-            c.cd()
-            pad2 = ROOT.TPad("pad2", "pad2", 0, 0.05, 1, 0.33)
-            pad2.SetTopMargin(0.01)
-            pad2.SetBottomMargin(0.35)
-            pad2.SetGridx()
-            pad2.Draw()
-            pad2.cd()
-
-            # Collect all y-values from ratio graphs
-            all_ratio_y = []
-            for gr in ratio_graphs:
-                y_array = gr.GetY()  # This returns a Python array-like object (double*)
-                all_ratio_y.extend([y_array[i] for i in range(gr.GetN())])
-
-            ymin = None
-            ymax = None
-
-            if all_ratio_y:
-                ymin = min(all_ratio_y)
-                ymax = max(all_ratio_y)
-                # Add some padding (10% of range)
-                padding = 0.1 * (ymax - ymin) if (ymax - ymin) != 0 else 0.1
-                ymin -= padding
-                ymax += padding
-
-            frame = ROOT.TH1F("frame", "", 1, x_min, x_max)
-            frame.SetStats(0)
-            frame.SetMinimum(ymin)
-            frame.SetMaximum(ymax)
-
-            frame.GetXaxis().SetTitle("cos#theta")
-            frame.GetXaxis().SetTitleSize(0.12)
-            frame.GetXaxis().SetTitleOffset(1.0)    
-            frame.GetXaxis().SetLabelSize(0.10)
-
-            frame.GetYaxis().SetTitle(f"{det} / {default_detector}")
-            frame.GetYaxis().SetTitleSize(0.08)
-            frame.GetYaxis().SetTitleOffset(0.4)
-            frame.GetYaxis().SetLabelSize(0.08)
-
-            frame.Draw()
-
-            line = ROOT.TLine(frame.GetXaxis().GetXmin(), 1, frame.GetXaxis().GetXmax(), 1)
-            line.SetLineColor(ROOT.kBlack)     # Black line (or any color you want)
-            line.SetLineWidth(1)               # Thin line
-            line.SetLineStyle(ROOT.kDashed)   # Dashed line (ROOT.kDashed is dotted/dashed style)
-            line.Draw("same")
- 
-            for gr in ratio_graphs:
-                gr.Draw("P SAME")
-
-            # Save the canvas
-            c.SaveAs(f"{path}/{param_name}_plots/{param_name}_ratio_{det}_over_{default_detector}.pdf")
-            c.SaveAs(f"{path}/{param_name}_plots/{param_name}_ratio_{det}_over_{default_detector}.png")
+import numpy as np
+
+from datapoints import DataPoints
+from render_pool import error_graph, render
+from results_store import load_campaign
+
+# color and marker of each momentum
+momentum_ranges = [1, 5, 10, 50, 100]
+markers = [20,21,22,23,33]
+colors = [ROOT.kBlack, ROOT.kRed, ROOT.kBlue, ROOT.kGreen+2, ROOT.kMagenta+1]
+momentum_markers = {mom: (c,m) for mom,c,m in zip(momentum_ranges, colors, markers)}
+
+
+### PAYLOADS AND DRAWING ###
+# Every figure is first reduced to a plain payload (dicts of numbers, strings and arrays), which
+# draw() turns into a canvas: the payloads are sent to the ROOT worker processes of render_pool.
+# The x/y arrays are the float64 columns of DataPoints, which TGraph takes as they are.
+
+def resolution_payloads(points, detectors, plotting_param, path):
+    payloads = []
+    for (param_name, detector), detector_points in points.groups("param", "detector"):
+        if detector not in detectors:
+            continue
+        payloads.append({
+            "kind": "resolution", "param": param_name, "detector": detector, "plotting_param": plotting_param,
+            "output": f"{path}/{param_name}_plots/{detector}_{param_name}_individual",
+            "series": [{"p": momentum, "color": momentum_markers[momentum][0], "marker": momentum_markers[momentum][1],
+                        "x": series["cosTheta"], "y": series["value"], "ey": series["error"]}
+                       for (momentum,), series in detector_points.groups("p", order=["cosTheta"])],
+        })
+    return payloads
+
+
+def comparison_payloads(points, default_detector, detectors, plotting_param, path):
+    payloads = []
+    for (param_name, det), detector_points in points.groups("param", "detector"):
+        if det not in detectors:
+            continue
+        default_points = points.select(param=param_name, detector=default_detector)
+
+        series = []
+        for (momentum,), points1 in detector_points.groups("p", order=["cosTheta"]):
+            points2 = default_points.select(p=momentum).sort("cosTheta")
+            ratio = points1.ratio(points2, ["theta"])
+            series.append({
+                "p": momentum, "color": momentum_markers[momentum][0], "marker": momentum_markers[momentum][1],
+                "x": points1["cosTheta"], "y": points1["value"], "ey": points1["error"],
+                "default_x": points2["cosTheta"], "default_y": points2["value"], "default_ey": points2["error"],
+                "ratio_x": ratio["cosTheta"], "ratio_y": ratio["value"], "ratio_ey": ratio["error"],
+            })
+        payloads.append({
+            "kind": "comparison", "param": param_name, "detector": det, "default_detector": default_detector,
+            "plotting_param": plotting_param,
+            "output": f"{path}/{param_name}_plots/{param_name}_ratio_{det}_over_{default_detector}",
+            "series": series,
+        })
+    return payloads
+
+
+def draw_resolution(payload):
+    param_name, detector, plotting_param = payload["param"], payload["detector"], payload["plotting_param"]
+
+    c = ROOT.TCanvas(f"c_{detector}_{param_name}", f"{param_name} resolution {detector}", 800, 600)
+    c.SetLogy()  # Set logarithmic y-axis
+    c.SetGrid(0, 0)  # No grid lines
+    c.SetTickx(1)
+    c.SetTicky(1)
+
+    mg = ROOT.TMultiGraph()
+    mg.SetTitle(f"{param_name} resolution vs cos#theta for {detector};cos#theta;{plotting_param} [{param_name}] [#mu m]")
+
+    legend = ROOT.TLegend(0.1, 0.7, 0.3, 0.9)
+
+    for series in payload["series"]:
+        graph = error_graph(series["x"], series["y"], series["ey"])
+        graph.SetMarkerColor(series["color"])
+        graph.SetMarkerStyle(series["marker"])
+        graph.SetMarkerSize(1.2)
+        graph.SetLineColor(series["color"])
+
+        mg.Add(graph, "LP")  # Lines + Points
+        legend.AddEntry(graph, f"p = {series['p']:g} GeV", "lp")  # Use the actual graph for legend
+
+    mg.Draw("A")
+    mg.GetXaxis().SetTitle("cos#theta")
+    mg.GetYaxis().SetTitle(f"{plotting_param} (#Delta{param_name}) [#mum]")
+    legend.Draw()
+    return c, [mg, legend]
+
+
+def draw_comparison(payload):
+    param_name, det, plotting_param = payload["param"], payload["detector"], payload["plotting_param"]
+    default_detector = payload["default_detector"]
+
+    c = ROOT.TCanvas(f"c_{param_name}_{det}_over_{default_detector}", f"{plotting_param} ratio: {det}/{default_detector} - {param_name}", 800, 900)
+
+    # Split canvas into upper and lower pads for main plot and ratio
+    pad1 = ROOT.TPad("pad1", "Top pad", 0, 0.33, 1, 1.0)   # Left, Bottom, Right, Top (normalized [0,1])
+    pad1.SetLogy()
+    pad1.SetBottomMargin(0.02)   # No x-axis label space for upper pad
+    pad1.SetTopMargin(0.08)      # Space for title
+    pad1.SetGridx()              # Add grid in x
+    pad1.Draw()                 # Attach pad to canvas
+    pad1.cd()                   # Make pad1 the current drawing pad
+
+    # TMultiGraph to hold all points from both detectors
+    multigraph = ROOT.TMultiGraph()
+
+    # Add a legend in the upper right corner
+    legend = ROOT.TLegend(0.1, 0.5, 0.5, 0.9)
+    # (x1, y1, x2, y2) in normalized pad coordinates
+    legend.SetTextSize(0.025)
+
+    ratio_graphs = []
+    contrast_markers = {20: 24, 21: 25, 22: 26, 23: 32, 33: 27}
+
+    for series in payload["series"]:
+        momentum, color = series["p"], series["color"]
+
+        # --- Plot detector ---
+        g1 = error_graph(series["x"], series["y"], series["ey"])
+        g1.SetMarkerColor(color)
+        g1.SetMarkerStyle(series["marker"])
+        g1.SetMarkerSize(1.2)
+        g1.SetLineColor(color)
+        multigraph.Add(g1, "P")
+        legend.AddEntry(g1, f"{momentum:g} GeV ({det})", "p")
+
+        # --- Plot default_detector ---
+        g2 = error_graph(series["default_x"], series["default_y"], series["default_ey"])
+        g2.SetMarkerColor(color)
+        g2.SetMarkerStyle(contrast_markers[series["marker"]])
+        g2.SetMarkerSize(1.2)
+        g2.SetLineColor(color)
+        multigraph.Add(g2, "P")
+        legend.AddEntry(g2, f"{momentum:g} GeV ({default_detector})", "p")
+
+        # --- Ratio graph ---
+        gr_ratio = error_graph(series["ratio_x"], series["ratio_y"], series["ratio_ey"])
+        gr_ratio.SetMarkerColor(color)
+        gr_ratio.SetMarkerStyle(20)  # Uniform marker for ratio panel
+        gr_ratio.SetMarkerSize(1.2)
+        gr_ratio.SetLineColor(color)
+        ratio_graphs.append(gr_ratio)
+
+    # Draw top pad
+    multigraph.SetTitle(f"{param_name} resolution: {det} vs {default_detector};cos#theta;{plotting_param} (#Delta{param_name}) [#mum]")
+    multigraph.Draw("A")
+    multigraph.GetYaxis().SetTitleSize(0.045)
+    multigraph.GetYaxis().SetTitleOffset(1.1)
+    multigraph.GetXaxis().SetLabelSize(0)
+    x_min = multigraph.GetXaxis().GetXmin()
+    x_max = multigraph.GetXaxis().GetXmax()
+    legend.Draw()
+
+    # Lower pad
+    c.cd()
+    pad2 = ROOT.TPad("pad2", "pad2", 0, 0.05, 1, 0.33)
+    pad2.SetTopMargin(0.01)
+    pad2.SetBottomMargin(0.35)
+    pad2.SetGridx()
+    pad2.Draw()
+    pad2.cd()
+
+    # Collect all y-values from ratio graphs, with their error bars
+    ratio_y = np.concatenate([np.zeros(0)] + [series["ratio_y"] for series in payload["series"]])
+    ratio_ey = np.nan_to_num(np.concatenate([np.zeros(0)] + [series["ratio_ey"] for series in payload["series"]]))
+
+    ymin = None
+    ymax = None
+
+    if len(ratio_y):
+        ymin = float(np.min(ratio_y - ratio_ey))
+        ymax = float(np.max(ratio_y + ratio_ey))
+        # Add some padding (10% of range)
+        padding = 0.1 * (ymax - ymin) if (ymax - ymin) != 0 else 0.1
+        ymin -= padding
+        ymax += padding
+
+    frame = ROOT.TH1F(f"frame_{param_name}_{det}", "", 1, x_min, x_max)
+    frame.SetStats(0)
+    frame.SetMinimum(ymin)
+    frame.SetMaximum(ymax)
+
+    frame.GetXaxis().SetTitle("cos#theta")
+    frame.GetXaxis().SetTitleSize(0.12)
+    frame.GetXaxis().SetTitleOffset(1.0)
+    frame.GetXaxis().SetLabelSize(0.10)
 
+    frame.GetYaxis().SetTitle(f"{det} / {default_detector}")
+    frame.GetYaxis().SetTitleSize(0.08)
+    frame.GetYaxis().SetTitleOffset(0.4)
+    frame.GetYaxis().SetLabelSize(0.08)
+
+    frame.Draw()
+
+    line = ROOT.TLine(frame.GetXaxis().GetXmin(), 1, frame.GetXaxis().GetXmax(), 1)
+    line.SetLineColor(ROOT.kBlack)     # Black line (or any color you want)
+    line.SetLineWidth(1)               # Thin line
+    line.SetLineStyle(ROOT.kDashed)   # Dashed line (ROOT.kDashed is dotted/dashed style)
+    line.Draw("same")
+
+    for gr in ratio_graphs:
+        gr.Draw("P SAME")
+
+    return c, [pad1, pad2, multigraph, legend, ratio_graphs, frame, line]
+
+
+drawers = {"resolution": draw_resolution, "comparison": draw_comparison}
+
+
+def draw(payload):
+    return drawers[payload["kind"]](payload)
+
+
+def plot_detector_resolutions(points, detectors, plotting_param, path, workers = 1, multipage = None):
+    render(draw, resolution_payloads(points, detectors, plotting_param, path), workers=workers, multipage=multipage)
+
+
+def plot_detector_comparisons(points, default_detector, detectors, plotting_param, path, workers = 1, multipage = None):
+    render(draw, comparison_payloads(points, default_detector, detectors, plotting_param, path), workers=workers, multipage=multipage)
 
 
 def gather_data(plotting_param_name, detector_names, default_detector, path):
-    data = [{}, {}]
     detectors = detector_names + [default_detector]
 
-    for param_num, param_name in enumerate(["d0", "z0"]):
-        data[param_num] = {name: {} for name in detectors}
-
-        for detector in detectors:
-
-            detector_path = os.path.join(path, detector)
-            input_dir = os.path.join(detector_path, f"gun_{param_name}_plots")
-
-            for filename in os.listdir(input_dir):
-                if filename.endswith(".json"):
-
-                    # Open and load the JSON file
-                    with open(os.path.join(input_dir, filename), 'r') as json_file:
-                        json_data = json.load(json_file)
-
-                    # ONLY WORKS FOR SINGLE NUMBER RANGE (e.g. 10.0,10.0)
-                    theta = float(json_data["theta_range"].split(",")[0])
-                    p = int(float(json_data["mom_range"].split(",")[0]))
-                    plotting_param = float(json_data[plotting_param_name])
-
-                    if p not in data[param_num][detector]:
-                        data[param_num][detector][p] = []
-                    
-                    data[param_num][detector][p].append(DataPoint(p,theta, plotting_param))
-
-            for momentum, _ in data[param_num][detector].items():
-                # order tuples by theta, from smallest theta to largest theta
-                # data[param_num][detector][momentum].sort(key=lambda point: point.theta)
-                data[param_num][detector][momentum].sort(key=lambda point: point.cosTheta)
-
-            # order momenta from smallest to largest
-            data[param_num][detector] = dict(sorted(data[param_num][detector].items()))
+    # one read for the whole campaign (results store, or the JSON files of older campaigns)
+    rows = load_campaign(path, detectors)
+    rows = rows[(rows["param"] == "d0") | (rows["param"] == "z0")]
 
-    return data
+    # ordered by param, detector, momentum (smallest to largest) and cos(theta)
+    return DataPoints.from_rows(rows, plotting_param_name).sort("param", "detector", "p", "cosTheta")
 
-def print_data(data):
-    for param_num, param_name in enumerate(["d0", "z0"]):
+def print_data(points):
+    for (param_name,), param_points in points.groups("param"):
         print(f"\nParameter: {param_name}")
-        for detector, momentum_dict in data[param_num].items():
+        for (detector,), detector_points in param_points.groups("detector"):
             print(f"  Detector: {detector}")
-            for momentum, point_list in momentum_dict.items():
-                print(f"    Momentum: {momentum} GeV")
-                for point in point_list:
-                    print(f"      {point}")
+            for (momentum,), momentum_points in detector_points.groups("p", order=["cosTheta"]):
+                print(f"    Momentum: {momentum:g} GeV")
+                for theta, cosTheta, value in zip(momentum_points["theta"], momentum_points["cosTheta"], momentum_points["value"]):
+                    print(f"      p = {momentum:g}; theta = {theta}; cosTheta = {cosTheta}; param: {value}")
 
 def print_json_params():
     # only prints the relevant ones
@@ -253,6 +252,10 @@ def print_json_params():
     print('"sigma": automatically generated gaussian fit sigma')
     print('"res_quantile": resolution by quantiles')
     print('"sigma_FWHM": full width half maximum sigma')
+    print('"width_68": half width around the mean holding 68% of the tracks')
+    print('"width_95": half width around the mean holding 95% of the tracks')
+    print('"core_fraction": fraction of tracks within 2 sigma of the mean')
+    print('"tail_fraction": fraction of tracks beyond 3 sigma of the mean')
     print()
 
 
@@ -274,6 +277,8 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--inputDir", type=str, default=detector_path, help="Directory where the detector plot folders are")
     parser.add_argument("-dis", "--displayParams", type=int, help="1: ONLY displays the parameters to choose from")
     parser.add_argument("-def", "--defaultDetector", type=str, default="IDEA_inside_10", help="Detector that every detector will be compared to")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of processes drawing the figures")
+    parser.add_argument("-mp", "--multipage", action="store_true", help="one multi-page PDF for the campaign instead of one PDF per figure (PNGs are still written, drawn in one process)")
 
     args = parser.parse_args()
 
@@ -283,7 +288,11 @@ if __name__ == "__main__":
 
     # do one thing or the other
     else:
-        data = gather_data(plotting_param_name=args.parameter, detector_names=args.detectorNames, default_detector=args.defaultDetector, path=detector_path)
-        print_data(data=data)
-        plot_detector_resolutions(param_detector_data=data, plotting_param=args.parameter, path=detector_path)
-        plot_detector_comparisons(data=data, default_detector=args.defaultDetector, detectors=args.detectorNames, plotting_param=args.parameter, path=detector_path)
\ No newline at end of file
+        points = gather_data(plotting_param_name=args.parameter, detector_names=args.detectorNames, default_detector=args.defaultDetector, path=args.inputDir)
+        print_data(points=points)
+
+        # all the figures of the campaign in one batch, so that they share the pool and the multi-page PDF
+        payloads = resolution_payloads(points=points, detectors=args.detectorNames + [args.defaultDetector], plotting_param=args.parameter, path=detector_path)
+        payloads += comparison_payloads(points=points, default_detector=args.defaultDetector, detectors=args.detectorNames, plotting_param=args.parameter, path=detector_path)
+        multipage = os.path.join(detector_path, f"{args.parameter}_plots.pdf") if args.multipage else None
+        render(draw, payloads, workers=args.jobs, multipage=multipage)
@@ -0,0 +1,80 @@
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from datapoints import DataPoints
+from results_store import load_campaign
+
+### EVENTS NEEDED FOR A TARGET PRECISION ###
+# The statistical error of a resolution metric scales as 1/sqrt(nevents), so the error measured on
+# a sample of nevents events tells how many events reach a target relative error (e.g. 1%):
+#   nevents*(error/value/target)^2
+# For the ratio of two detectors with samples of the same size both errors add in quadrature, so a
+# target on the ratio is target/sqrt(2) on each sample (ratio=True).
+# The result, one number of events per (theta, p), the largest over the detectors and d0/z0, is
+# read by gun.py (read_nevents) instead of generating the same 100k events for every sample.
+
+def events_needed(points, target, ratio = False, minimum = 1000, maximum = 1000000, step = 1000):
+    """
+    {(theta, p): events} for the relative error target of the plotted value of points (DataPoints),
+    rounded up to a multiple of step within [minimum, maximum]. Points without an error (older
+    campaigns, metrics without _err) are left out.
+    """
+
+    if ratio:
+        target = target/math.sqrt(2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        needed = points["nevents"]*(points["error"]/points["value"]/target)**2
+    known = np.isfinite(needed) & (points["nevents"] > 0)
+    if not known.any():
+        return {}
+
+    # largest need of every (theta, p)
+    keys = np.stack([points["theta"][known], points["p"][known]], axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    largest = np.zeros(len(unique))
+    np.maximum.at(largest, inverse.ravel(), needed[known])
+
+    events = np.clip(np.ceil(largest/step)*step, minimum, maximum).astype(np.int64)
+    return {(float(theta), float(p)): int(n) for (theta, p), n in zip(unique, events)}
+
+
+def write_nevents(path, nevents):
+    with open(path, 'w') as f:
+        json.dump([{"theta": theta, "p": p, "nevents": n} for (theta, p), n in sorted(nevents.items())], f, indent=4)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Events needed per (theta, p) for a target relative precision, from the errors of a campaign")
+    parser.add_argument("-i", "--inputDir", type=str, required=True, help="campaign directory (e.g. d0z0/VTXIB_r1)")
+    parser.add_argument("-d", "--detectorNames", type=str, nargs="+", required=True, help="detectors whose errors are used")
+    parser.add_argument("-p", "--parameter", type=str, default="res_quantile", help="metric, with a <metric>_err in the results")
+    parser.add_argument("-t", "--target", type=float, default=0.01, help="relative error wanted (0.01: 1%%)")
+    parser.add_argument("-r", "--ratio", action="store_true", help="the target is on the ratio of two detectors")
+    parser.add_argument("--min", type=int, default=1000, help="fewest events per sample")
+    parser.add_argument("--max", type=int, default=1000000, help="most events per sample")
+    parser.add_argument("-o", "--output", type=str, help="JSON for gun.py (default: <inputDir>/nevents.json)")
+    args = parser.parse_args()
+
+    rows = load_campaign(args.inputDir, args.detectorNames)
+    points = DataPoints.from_rows(rows, args.parameter)
+    nevents = events_needed(points, args.target, ratio=args.ratio, minimum=args.min, maximum=args.max)
+
+    if not nevents:
+        raise SystemExit(f"No {args.parameter}_err in {args.inputDir}, the errors are written by plot_d0z0.py")
+
+    thetas = sorted({theta for theta, _ in nevents})
+    moms = sorted({p for _, p in nevents})
+    print(f"events for {args.target:.2%} on {args.parameter}{' ratios' if args.ratio else ''}")
+    print(f"{'theta':>7} " + " ".join(f"{f'p={p:g}':>9}" for p in moms))
+    for theta in thetas:
+        print(f"{theta:>7g} " + " ".join(f"{nevents.get((theta, p), 0):>9}" for p in moms))
+
+    output = args.output or os.path.join(args.inputDir, "nevents.json")
+    write_nevents(output, nevents)
+    print(f"Saved {output}")
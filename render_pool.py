@@ -0,0 +1,65 @@
+import concurrent.futures
+import functools
+
+import numpy as np
+import ROOT
+
+### PARALLEL CANVAS RENDERING ###
+# The plotting scripts turn their data into one plain payload per figure (dicts of numbers,
+# strings and numpy arrays, no DataPoints) and a draw(payload) function of their own that builds
+# the canvas. render() then draws and saves the figures in a pool of processes, each with its own
+# ROOT, or puts every page of a campaign into one multi-page PDF instead of one PDF per figure,
+# which saves opening and closing hundreds of files (drawn in a single pass, see render).
+#
+# draw(payload) returns (canvas, objects): everything drawn on the canvas has to stay referenced
+# until it is saved. payload["output"] is the output path without extension.
+
+ROOT.gROOT.SetBatch(True)
+
+
+def error_graph(x, y, ey = None):
+    # TGraphErrors straight from the float64 arrays of a payload, errors not measured (nan) drawn as 0
+    x, y = np.ascontiguousarray(x, dtype=np.float64), np.ascontiguousarray(y, dtype=np.float64)
+    ey = np.zeros(len(x)) if ey is None else np.nan_to_num(np.asarray(ey, dtype=np.float64))
+    return ROOT.TGraphErrors(len(x), x, y, np.zeros(len(x)), ey)
+
+
+def render_one(draw, formats, payload, multipage = None, first = False, last = False):
+    canvas, objects = draw(payload)
+    for ext in formats:
+        canvas.SaveAs(f"{payload['output']}.{ext}")
+    if multipage:
+        # one file kept open for all the pages: "file.pdf[" opens it, "file.pdf]" closes it
+        if first:
+            canvas.Print(f"{multipage}[")
+        canvas.Print(multipage, f"Title:{payload['output'].split('/')[-1]}")
+        if last:
+            canvas.Print(f"{multipage}]")
+    canvas.Close()
+
+
+def render(draw, payloads, workers = 1, multipage = None):
+    """
+    Draws and saves every payload as .pdf and .png, in workers processes.
+    multipage: path of one PDF receiving all the figures as pages; then only the .png are
+    written per figure. The pages have to go to the open PDF in order from one process, so every
+    figure is then drawn once, in this process, for both its .png and its page (workers unused).
+    """
+
+    if multipage:
+        for i, payload in enumerate(payloads):
+            render_one(draw, ["png"], payload, multipage, first=i == 0, last=i == len(payloads) - 1)
+        if payloads:
+            print(f"{len(payloads)} pages saved to {multipage}")
+        return
+
+    formats = ["pdf", "png"]
+
+    if workers > 1 and len(payloads) > 1:
+        # forked workers inherit draw and the loaded ROOT libraries
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(payloads)//(4*workers))
+            list(pool.map(functools.partial(render_one, draw, formats), payloads, chunksize=chunksize))
+    else:
+        for payload in payloads:
+            render_one(draw, formats, payload)
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+
+### CONSOLIDATED RESULTS STORE ###
+# One SQLite table per optimisation campaign (e.g. d0z0/VTXIB_r1/results.sqlite) with one row per
+# (detector, param, theta, p). plot_d0z0.py appends a row next to every JSON it writes, and the
+# plotting scripts load the whole campaign with a single query instead of walking hundreds of JSONs.
+# Metric columns are added on demand, so new metrics written by compute_res need no migration.
+
+db_name = "results.sqlite"
+
+# parsed rows of the per-sample JSON files, for campaigns without a store (see read_json_rows)
+index_name = "results_index.json"
+
+key_columns = ["detector", "param", "theta", "p"]
+info_columns = {
+    "detector": "TEXT NOT NULL",
+    "param": "TEXT NOT NULL",
+    "theta": "REAL NOT NULL",
+    "p": "REAL NOT NULL",
+    "subsystem": "TEXT",
+    "layer": "INTEGER",
+    "radius": "REAL",
+    "pid": "INTEGER",
+    "nevents": "INTEGER",
+    "npart": "INTEGER",
+}
+
+
+def results_db_path(campaign_dir):
+    return os.path.join(campaign_dir, db_name)
+
+
+def connect(db_path):
+    # several plot workers append at the same time, wait for the lock instead of failing
+    con = sqlite3.connect(db_path, timeout=120)
+    columns = ", ".join(f"{name} {kind}" for name, kind in info_columns.items())
+    con.execute(f"CREATE TABLE IF NOT EXISTS results ({columns}, PRIMARY KEY ({', '.join(key_columns)}))")
+    con.execute(f"CREATE INDEX IF NOT EXISTS results_lookup ON results ({', '.join(key_columns)})")
+    return con
+
+
+def row_from_json(detector, param, json_data):
+    """
+    Row of the table for one compute_res JSON. The gun ranges are parsed once, here.
+    ONLY WORKS FOR SINGLE NUMBER RANGE (e.g. 10.0,10.0)
+    """
+
+    row = {
+        "detector": detector,
+        "param": param,
+        "theta": float(json_data["theta_range"].split(",")[0]),
+        "p": float(json_data["mom_range"].split(",")[0]),
+        "subsystem": json_data.get("subsystem"),
+        "layer": int(json_data.get("layer", -1)),
+        "radius": float(json_data.get("radius", -1)),
+        "pid": int(str(json_data.get("pid_list", "0")).split(",")[0]),
+        "nevents": int(float(json_data.get("nevents", 0))),
+        "npart": int(float(json_data.get("npart", 0))),
+    }
+
+    # everything else that is a number is a metric
+    for name, value in json_data.items():
+        if name not in row and name not in ["theta_range", "mom_range", "pid_list"] and isinstance(value, (int, float)):
+            row[name] = float(value)
+
+    return row
+
+
+def append_rows(db_path, rows):
+
+    with connect(db_path) as con:
+        # the columns are read and added under the write lock: several workers append to a new
+        # store at once, each adding the same metric columns with its first row
+        con.execute("BEGIN IMMEDIATE")
+        known = {column[1] for column in con.execute("PRAGMA table_info(results)")}
+
+        for row in rows:
+            for name in row:
+                if name not in known:
+                    try:
+                        con.execute(f'ALTER TABLE results ADD COLUMN "{name}" REAL')
+                    except sqlite3.OperationalError as e:
+                        if "duplicate column" not in str(e):
+                            raise
+                    known.add(name)
+
+            names = ", ".join(f'"{name}"' for name in row)
+            marks = ", ".join("?" for _ in row)
+            con.execute(f"INSERT OR REPLACE INTO results ({names}) VALUES ({marks})", list(row.values()))
+
+    con.close()
+
+
+def append_result(db_path, detector, param, json_data):
+    append_rows(db_path, [row_from_json(detector, param, json_data)])
+
+
+def load_results(db_path, detectors = None, params = None):
+    """
+    All the rows for the given detectors/params (None: all) in one read, as a NumPy structured
+    array (one field per column) ordered by detector, param, p and theta.
+    """
+
+    # only needed for reading: d0z0.py imports this module outside of the key4hep environment
+    import numpy as np
+
+    query = "SELECT * FROM results"
+    conditions, values = [], []
+    for column, selected in [("detector", detectors), ("param", params)]:
+        if selected is not None:
+            conditions.append(f"{column} IN ({', '.join('?' for _ in selected)})")
+            values += list(selected)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY detector, param, p, theta"
+
+    con = connect(db_path)
+    cursor = con.execute(query, values)
+    names = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+    con.close()
+
+    return to_array(names, rows)
+
+
+def to_array(names, rows):
+
+    import numpy as np
+
+    dtypes = []
+    for i, name in enumerate(names):
+        kind = info_columns.get(name, "REAL")
+        if kind.startswith("TEXT"):
+            size = max([len(row[i] or "") for row in rows] + [1])
+            dtypes.append((name, f"U{size}"))
+        elif kind.startswith("INTEGER"):
+            dtypes.append((name, np.int64))
+        else:
+            dtypes.append((name, np.float64))
+
+    # missing metrics (e.g. t_sigma of a binned sample) become nan
+    rows = [tuple(np.nan if value is None and dtype[1] == np.float64 else value for value, dtype in zip(row, dtypes)) for row in rows]
+
+    return np.array(rows, dtype=dtypes)
+
+
+def read_json_rows(campaign_dir, detectors):
+    """
+    Rows of the per-sample JSON files of the given detectors. The parsed rows are kept in an index
+    next to them (results_index.json), keyed on each file's mtime and size, so only new or changed
+    files are read again.
+    """
+
+    index_path = os.path.join(campaign_dir, index_name)
+    index = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except ValueError:
+            index = {}
+
+    rows, changed = [], False
+    for detector in detectors:
+        # entries of files that are gone are dropped
+        seen = set()
+        for param in ["d0", "z0"]:
+            input_dir = os.path.join(campaign_dir, detector, f"gun_{param}_plots")
+            for filename in sorted(os.listdir(input_dir)):
+                if not filename.endswith(".json"):
+                    continue
+                key = f"{detector}/gun_{param}_plots/{filename}"
+                stat = os.stat(os.path.join(input_dir, filename))
+                stamp = [stat.st_mtime_ns, stat.st_size]
+
+                if index.get(key, {}).get("stamp") != stamp:
+                    with open(os.path.join(input_dir, filename), 'r') as json_file:
+                        index[key] = {"stamp": stamp, "row": row_from_json(detector, param, json.load(json_file))}
+                    changed = True
+                rows.append(index[key]["row"])
+                seen.add(key)
+
+        for key in [key for key in index if key.startswith(f"{detector}/") and key not in seen]:
+            del index[key]
+            changed = True
+
+    if changed:
+        # written under a temporary name: never seen half written by another reader
+        try:
+            fd, tmp = tempfile.mkstemp(dir=campaign_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp, index_path)
+        except OSError as e:
+            print(f"Could not update {index_path}: {e}")
+
+    return rows
+
+
+def import_json(db_path, campaign_dir, detectors):
+    """
+    Fills the store from the per-sample JSON files of campaigns made before it existed.
+    """
+
+    rows = read_json_rows(campaign_dir, detectors)
+    append_rows(db_path, rows)
+    return len(rows)
+
+
+def load_campaign(campaign_dir, detectors):
+    """
+    Rows of the given detectors of a campaign: from its results store when there is one, and from
+    the per-sample JSON files for the detectors it does not have (campaigns made before it existed,
+    or extended by a run that created it).
+    """
+
+    rows = []
+    db_path = results_db_path(campaign_dir)
+    if os.path.exists(db_path):
+        stored = load_results(db_path, detectors=detectors)
+        if len(stored):
+            rows = [dict(zip(stored.dtype.names, row.tolist())) for row in stored]
+
+    in_store = {row["detector"] for row in rows}
+    missing = [detector for detector in detectors if detector not in in_store and os.path.isdir(os.path.join(campaign_dir, detector))]
+    if missing:
+        rows += read_json_rows(campaign_dir, missing)
+
+    names = list(info_columns) + sorted({name for row in rows for name in row if name not in info_columns})
+    rows = sorted(rows, key=lambda row: tuple(row[name] for name in ["detector", "param", "p", "theta"]))
+
+    return to_array(names, [tuple(row.get(name) for name in names) for row in rows])
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Import the per-sample JSON files of a campaign into its results store")
+    parser.add_argument("-i", "--inputDir", type=str, required=True, help="Campaign directory (e.g. d0z0/VTXIB_r1)")
+    parser.add_argument("-d", "--detectorNames", type=str, nargs="+", help="detectors to import (default: every subdirectory)")
+    args = parser.parse_args()
+
+    detectors = args.detectorNames
+    if detectors is None:
+        detectors = sorted(d for d in os.listdir(args.inputDir) if os.path.isdir(os.path.join(args.inputDir, d, "gun_d0_plots")))
+
+    n = import_json(results_db_path(args.inputDir), args.inputDir, detectors)
+    print(f"Imported {n} rows into {results_db_path(args.inputDir)}")
@@ -0,0 +1,165 @@
+import concurrent.futures
+import contextlib
+import time
+
+### DEPENDENCY-AWARE TASK GRAPH ###
+# A task is started as soon as all the tasks it depends on are done, so a sample moves on to
+# its next stage without waiting for the other samples (or the other detectors) to catch up.
+# All tasks share one pool, i.e. one global worker budget: max_workers is counted in slots, a task
+# taking as many as the processes it starts (slots=N for N Delphes fed at once), so it only starts
+# when that many are free (or alone, if it needs more than max_workers).
+#
+# Every future is checked: a failed task is retried up to `retries` times if its exception is
+# one of `retry_on` (transient failures, e.g. a crashed Delphes job), otherwise it is marked as
+# failed and everything downstream of it is skipped instead of running on missing outputs.
+# Independent tasks still run to the end, then a status table is printed and GraphError raised.
+
+
+class GraphError(RuntimeError):
+
+    def __init__(self, status):
+        self.status = status
+        failed = [name for name, info in status.items() if info["status"] == "failed"]
+        skipped = [name for name, info in status.items() if info["status"] == "skipped"]
+        super().__init__(f"{len(failed)} task(s) failed ({', '.join(failed)}), {len(skipped)} skipped")
+
+
+class Task:
+
+    def __init__(self, name, fn, *args, deps=(), slots=1, **kwargs):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deps = [dep.name if isinstance(dep, Task) else dep for dep in deps]
+        self.slots = slots
+
+    def run(self):
+        return self.fn(*self.args, **self.kwargs)
+
+    def __str__(self):
+        return f"{self.name} (after: {', '.join(self.deps) if self.deps else '-'})"
+
+
+def format_status(status, only_problems = False):
+    """
+    One line per task: status, attempts, wall time of the last attempt and the error, if any.
+    """
+
+    width = max([len(name) for name in status] + [4])
+    lines = [f"{'task':<{width}}  {'status':<8}  {'tries':>5}  {'time [s]':>9}  error"]
+    for name, info in status.items():
+        if only_problems and info["status"] == "done":
+            continue
+        error = info["error"].splitlines()[0] if info["error"] else ""
+        lines.append(f"{name:<{width}}  {info['status']:<8}  {info['attempts']:>5}  {info['time']:>9.1f}  {error}")
+
+    counts = {}
+    for info in status.values():
+        counts[info["status"]] = counts.get(info["status"], 0) + 1
+    lines.append(", ".join(f"{n} {state}" for state, n in sorted(counts.items())))
+
+    return "\n".join(lines)
+
+
+def run_graph(tasks, max_workers = 12, retries = 0, retry_on = (Exception,), status_file = None, tracer = None):
+    """
+    Runs the tasks and returns {name: result}. Raises GraphError once everything that could
+    run has run if any task failed.
+    max_workers: slots running at once, see Task.slots
+    retries: extra attempts of a task failing with one of retry_on
+    status_file: where to write the status table of all tasks (None: only printed on failure)
+    tracer: instrumentation.Tracer measuring every attempt of every task
+    """
+
+    tasks = {task.name: task for task in tasks}
+
+    for task in tasks.values():
+        for dep in task.deps:
+            if dep not in tasks:
+                raise ValueError(f"Task {task.name} depends on unknown task {dep}")
+
+    pending = dict(tasks)
+    ready = []
+    results = {}
+    status = {name: {"status": "pending", "attempts": 0, "time": 0.0, "error": None} for name in tasks}
+
+    def helper_run(task):
+        start = time.time()
+        try:
+            with tracer.task(task.name, status[task.name]["attempts"]) if tracer is not None else contextlib.nullcontext():
+                return task.run()
+        finally:
+            status[task.name]["time"] = time.time() - start
+
+    def helper_submit(pool, name):
+        status[name]["status"] = "running"
+        status[name]["attempts"] += 1
+        return pool.submit(helper_run, tasks[name])
+
+    def helper_used(running):
+        return sum(tasks[name].slots for name in running.values())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+
+        while pending or ready or running:
+
+            # a task waits for its dependencies to be done, and is skipped if one of them will never be
+            # (repeated until nothing changes, skipping propagates down whole chains)
+            changed = True
+            while changed:
+                changed = False
+                for name, task in list(pending.items()):
+                    blocking = [dep for dep in task.deps if status[dep]["status"] in ["failed", "skipped"]]
+                    if blocking:
+                        status[name]["status"] = "skipped"
+                        status[name]["error"] = f"dependency {blocking[0]} did not finish"
+                        del pending[name]
+                        changed = True
+                    elif all(status[dep]["status"] == "done" for dep in task.deps):
+                        del pending[name]
+                        ready.append(name)
+
+            # ready tasks start in order while their slots are free, a task larger than the whole
+            # budget once nothing else runs (smaller ones behind it may pass it meanwhile)
+            for name in list(ready):
+                if not running or helper_used(running) + tasks[name].slots <= max_workers:
+                    ready.remove(name)
+                    running[helper_submit(pool, name)] = name
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle between tasks: {', '.join(pending)}")
+                break
+
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in finished:
+                name = running.pop(future)
+                error = future.exception()
+
+                if error is None:
+                    results[name] = future.result()
+                    status[name]["status"] = "done"
+                    status[name]["error"] = None
+                    continue
+
+                status[name]["error"] = f"{type(error).__name__}: {error}"
+                if isinstance(error, retry_on) and status[name]["attempts"] <= retries:
+                    print(f"Task {name} failed (attempt {status[name]['attempts']}), retrying: {status[name]['error']}")
+                    status[name]["status"] = "pending"
+                    ready.append(name)
+                else:
+                    print(f"Task {name} failed: {status[name]['error']}")
+                    status[name]["status"] = "failed"
+
+    if status_file is not None:
+        with open(status_file, 'w') as f:
+            f.write(format_status(status) + "\n")
+
+    if any(info["status"] != "done" for info in status.values()):
+        print(format_status(status, only_problems=True))
+        raise GraphError(status)
+
+    return results
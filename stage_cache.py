@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+
+### CONTENT-ADDRESSED STAGE CACHE ###
+# Every pipeline stage (Delphes, analysis, plot) gets a key that is a hash of everything it depends on:
+# the content of its input files, the version (content) of the script that runs it and its parameters,
+# and of where it writes: two campaigns or detectors with byte-identical cards get their own keys.
+# Upstream artifacts contribute the key that produced them, so a change anywhere up the chain
+# propagates down without re-hashing big ROOT files.
+#
+# Layout of the cache directory (normally under ceph_path):
+#   records/<key>.json     finished stage, lists the artifacts it produced
+#   artifacts/<hash>.json  key that produced a given artifact path
+#   digests.json           file digests memoized by (size, mtime) so HepMC files are hashed only once
+
+
+def _hash_strings(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class StageCache:
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.records_dir = os.path.join(cache_dir, "records")
+        self.artifacts_dir = os.path.join(cache_dir, "artifacts")
+        self.digests_file = os.path.join(cache_dir, "digests.json")
+
+        os.makedirs(self.records_dir, exist_ok=True)
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+
+        # stages run from a thread pool
+        self.lock = threading.Lock()
+
+        self.digests = {}
+        if os.path.exists(self.digests_file):
+            with open(self.digests_file, 'r') as f:
+                self.digests = json.load(f)
+
+    def digest(self, path, chunk_size=1 << 20):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+
+        with self.lock:
+            known = self.digests.get(path)
+            if known is not None and known["stamp"] == stamp:
+                return known["digest"]
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+
+        with self.lock:
+            self.digests[path] = {"stamp": stamp, "digest": h.hexdigest()}
+            self._dump(self.digests_file, self.digests)
+
+        return h.hexdigest()
+
+    def artifact_key(self, path):
+        # key of the stage that produced path, or its content digest if it was made outside the cache
+        record = self._artifact_record(path)
+        if os.path.exists(record):
+            with open(record, 'r') as f:
+                return json.load(f)["key"]
+        return self.digest(path)
+
+    def key(self, stage, files=(), artifacts=(), params=(), outputs=()):
+        """
+        stage: name of the stage (e.g. "delphes")
+        files: plain inputs (cards, scripts), hashed by content
+        artifacts: outputs of upstream stages, identified by the key that produced them
+        params: anything else the output depends on
+        outputs: paths the stage writes, hashed by path
+        """
+        parts = [stage]
+        parts += [self.digest(f) for f in files]
+        parts += [self.artifact_key(a) for a in artifacts]
+        parts += [repr(p) for p in params]
+        parts += [os.path.abspath(o) for o in outputs]
+        return _hash_strings(*parts)
+
+    def is_done(self, key):
+        record = os.path.join(self.records_dir, f"{key}.json")
+        if not os.path.exists(record):
+            return False
+
+        with open(record, 'r') as f:
+            outputs = json.load(f)["artifacts"]
+
+        return all(os.path.exists(path) for path in outputs)
+
+    def mark_done(self, key, outputs):
+        outputs = [os.path.abspath(path) for path in outputs]
+
+        with self.lock:
+            self._dump(os.path.join(self.records_dir, f"{key}.json"), {"key": key, "artifacts": outputs})
+            for path in outputs:
+                self._dump(self._artifact_record(path), {"key": key, "path": path})
+
+    def _artifact_record(self, path):
+        name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return os.path.join(self.artifacts_dir, f"{name}.json")
+
+    @staticmethod
+    def _dump(path, content):
+        # write-then-rename so an interrupted run never leaves a half written record
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, 'w') as f:
+            json.dump(content, f, indent=4)
+        os.replace(tmp, path)
@@ -0,0 +1,148 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from delphes_card import columns, read_card, subsystems
+
+### GEOMETRY SWEEPS FROM A BASE CARD ###
+# Instead of hand-copying a whole Delphes card for every variant (IDEA_VTXIB_r1_117, _157, ...),
+# a sweep takes one base card and one layer of it, e.g. VTXIB layer 1, and writes one card per value
+# of one of the layer's columns into the DetectorGeometry block of the TrackCovariance module.
+# Only that line (or, for forward disks, the pair of disks at +-z) changes, the rest of the card is
+# copied as is. generate_cards returns the (detector, subsystem, layer, radius) entries d0z0.py runs
+# over, and writes the same metadata next to each card (<variant>.json).
+#
+# Lengths are given in mm, like the radius of the d0z0.py detector entries; the card is in metres.
+
+length_columns = ["zmin", "zmax", "r", "w", "X0", "reso_up", "reso_down"]
+
+
+def sweep_values(start, stop, step):
+    """
+    start, start + step, ..., stop (included), without accumulating floating point steps.
+    """
+
+    n = int(round((stop - start)/step))
+    return [round(start + i*step, 10) for i in range(n + 1)]
+
+
+def geometry_block(lines):
+    """
+    (first, last) line indices of the content of the "set DetectorGeometry { ... }" block.
+    """
+
+    for i, line in enumerate(lines):
+        if re.match(r"\s*set\s+DetectorGeometry\s*\{", line):
+            for j in range(i + 1, len(lines)):
+                if lines[j].strip().startswith("}"):
+                    return i + 1, j
+    raise ValueError("No DetectorGeometry block in the card")
+
+
+def layer_lines(lines, subsystem, layer):
+    """
+    Indices of the card lines of one layer, numbered like delphes_card.Card.layers: from 1 going
+    outwards (radius for the barrel, |z| for forward layers, whose +z and -z disks are one layer).
+    """
+
+    if subsystem not in subsystems:
+        raise ValueError(f"Unknown subsystem {subsystem}, known: {', '.join(subsystems)}")
+    layer_type, label = subsystems[subsystem]
+
+    positions = {}
+    first, last = geometry_block(lines)
+    for i in range(first, last):
+        fields = lines[i].split("#")[0].split()
+        if len(fields) >= 2 + len(columns) and fields[0] == str(layer_type) and fields[1] == label:
+            positions.setdefault(abs(float(fields[2 + columns.index("r")])), []).append(i)
+
+    if not 1 <= layer <= len(positions):
+        raise ValueError(f"{subsystem} has {len(positions)} layer(s) ({label}), no layer {layer}")
+    return positions[sorted(positions)[layer - 1]]
+
+
+def patch_line(line, parameter, value):
+    # replaces one field, keeping the spacing and any trailing comment
+    index = 2 + columns.index(parameter)
+    matches = list(re.finditer(r"\S+", line.split("#")[0]))
+    start, end = matches[index].span()
+
+    if parameter in length_columns:
+        # forward disks keep their side
+        sign = -1 if parameter == "r" and matches[index].group().startswith("-") else 1
+        new = f"{sign*value/1000:.6g}"
+    else:
+        new = f"{value:g}"
+    return line[:start] + new + line[end:]
+
+
+def variant_name(base, subsystem, layer, parameter, value):
+    # e.g. IDEA_base25_VTXIB_r1_11p5, following IDEA_VTXIB_r1_117
+    return f"{base}_{subsystem}_{parameter}{layer}_{value:g}".replace(".", "p").replace("-", "m")
+
+
+def generate_cards(base_card, subsystem, layer, parameter, values, output_directory):
+    """
+    One card per value in output_directory. Cards that already exist with the same content are
+    not rewritten (the stage cache of d0z0.py then keeps their outputs).
+    Returns [(detector, subsystem, layer, radius)] in the order of values, radius in mm.
+    """
+
+    if parameter not in columns:
+        raise ValueError(f"Unknown parameter {parameter}, known: {', '.join(columns)}")
+
+    with open(base_card, 'r') as f:
+        lines = f.readlines()
+    base = os.path.splitext(os.path.basename(base_card))[0]
+    base_hash = hashlib.sha256("".join(lines).encode()).hexdigest()
+
+    indices = layer_lines(lines, subsystem, layer)
+    os.makedirs(output_directory, exist_ok=True)
+
+    detectors = []
+    for value in values:
+        patched = list(lines)
+        for i in indices:
+            patched[i] = patch_line(patched[i], parameter, value)
+
+        name = variant_name(base, subsystem, layer, parameter, value)
+
+        card = os.path.join(output_directory, f"{name}.tcl")
+        content = "".join(patched)
+        if not os.path.exists(card) or open(card, 'r').read() != content:
+            with open(card, 'w') as f:
+                f.write(content)
+
+        radius = read_card(card).layer_radius(subsystem, layer)
+
+        metadata = {
+            "detector": name, "subsystem": subsystem, "layer": layer, "radius": radius,
+            "parameter": parameter, "value": value, "base_card": base, "base_sha256": base_hash,
+        }
+        with open(os.path.join(output_directory, f"{name}.json"), 'w') as f:
+            json.dump(metadata, f, indent=4)
+
+        detectors.append((name, subsystem, layer, radius))
+
+    return detectors
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Write the cards of a geometry sweep of one layer of a base Delphes card")
+    parser.add_argument("-b", "--base", type=str, required=True, help="base Delphes card (.tcl)")
+    parser.add_argument("-s", "--subsystem", type=str, required=True, choices=list(subsystems), help="subsystem of the layer")
+    parser.add_argument("-l", "--layer", type=int, required=True, help="layer of the subsystem, from 1 going outwards")
+    parser.add_argument("-p", "--parameter", type=str, default="r", choices=columns, help="column of the layer to sweep")
+    values = parser.add_mutually_exclusive_group(required=True)
+    values.add_argument("-v", "--values", type=float, nargs="+", help="values (mm for lengths)")
+    values.add_argument("-r", "--range", type=float, nargs=3, metavar=("START", "STOP", "STEP"), help="values from START to STOP (included)")
+    parser.add_argument("-o", "--outputDir", type=str, required=True, help="where the cards are written")
+    args = parser.parse_args()
+
+    detectors = generate_cards(args.base, args.subsystem, args.layer, args.parameter,
+                               args.values or sweep_values(*args.range), args.outputDir)
+    for detector in detectors:
+        print(detector)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules are scripts at the top of the repository and in delphes/, not an installed package
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [repo, os.path.join(repo, "delphes")]
+
+cards_dir = os.path.join(repo, "delphes", "cards")
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from datapoints import DataPoints, columns
+
+
+def points(detector, thetas, moms, values, errors):
+    n = len(values)
+    data = {name: np.zeros(n) for name in columns}
+    data.update({
+        "detector": np.array([detector]*n),
+        "param": np.array(["d0"]*n),
+        "theta": np.asarray(thetas, dtype=np.float64),
+        "p": np.asarray(moms, dtype=np.float64),
+        "subsystem": np.array(["VTXIB"]*n),
+        "value": np.asarray(values, dtype=np.float64),
+        "error": np.asarray(errors, dtype=np.float64),
+    })
+    return DataPoints(data)
+
+
+def test_match():
+    mine = points("a", [10, 20, 30], [1, 1, 5], [1, 2, 3], [0, 0, 0])
+    other = points("b", [30, 10, 90], [5, 1, 1], [1, 1, 1], [0, 0, 0])
+    np.testing.assert_array_equal(mine.match(other, ["theta", "p"]), [1, -1, 0])
+    np.testing.assert_array_equal(mine.match(points("b", [], [], [], []), ["theta", "p"]), [-1, -1, -1])
+
+
+def test_ratio():
+    mine = points("a", [10, 20, 30], [1, 1, 1], [2.0, 3.0, 4.0], [0.2, 0.3, np.nan])
+    other = points("b", [20, 10], [1, 1], [6.0, 4.0], [0.6, 0.0])
+    ratio = mine.ratio(other, ["theta", "p"])
+
+    # the point without a partner is dropped
+    np.testing.assert_array_equal(ratio["theta"], [10, 20])
+    np.testing.assert_allclose(ratio["value"], [0.5, 0.5])
+    # independent samples: relative errors in quadrature
+    np.testing.assert_allclose(ratio["error"], [0.5*0.1, 0.5*np.hypot(0.1, 0.1)])
+
+
+def test_ratio_to_itself_and_zero():
+    mine = points("a", [10, 20], [1, 1], [2.0, 3.0], [0.2, 0.3])
+    ratio = mine.ratio(mine, ["theta", "p"])
+    np.testing.assert_allclose(ratio["value"], [1, 1])
+    np.testing.assert_array_equal(ratio["error"], [0, 0])
+
+    zero = points("b", [10, 20], [1, 1], [0.0, 3.0], [0.0, 0.3])
+    ratio = mine.ratio(zero, ["theta", "p"])
+    assert ratio["value"][0] == 0 and np.isnan(ratio["error"][0])
+
+
+def test_groups_and_select():
+    data = points("a", [30, 10, 20, 10], [5, 1, 1, 5], [1, 2, 3, 4], [0, 0, 0, 0])
+    groups = list(data.groups("p", order=("theta",)))
+    assert [key for key, _ in groups] == [(1.0,), (5.0,)]
+    np.testing.assert_array_equal(groups[1][1]["theta"], [10, 30])
+    assert len(data.select(p=1.0, theta=20.0)) == 1
+
+
+def test_from_rows_unknown_metric():
+    rows = np.array([("a", "d0", 10.0, 1.0, "VTXIB", 1, 13.7, 1000, 5.0)],
+                    dtype=[("detector", "U8"), ("param", "U2"), ("theta", "f8"), ("p", "f8"), ("subsystem", "U8"),
+                           ("layer", "i8"), ("radius", "f8"), ("nevents", "i8"), ("sigma", "f8")])
+    data = DataPoints.from_rows(rows, "sigma")
+    assert data["value"][0] == 5.0 and np.isnan(data["error"][0])
+    with pytest.raises(ValueError, match="No res_quantile"):
+        DataPoints.from_rows(rows, "res_quantile")
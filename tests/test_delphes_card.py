@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from conftest import cards_dir
+from delphes_card import parse_card, read_card
+
+card_text = """
+set B 2.0
+source common.tcl
+set ExecutionPath {
+  ParticlePropagator
+  TrackCovariance
+  TrackMerger
+}
+module TrackCovariance TrackCovariance {
+  set InputArray ParticlePropagator/stableParticles
+  set Bz $B
+  set DetectorGeometry {
+    1 PIPE -100 100 0.01 0.0012 0.35276 0 0 0 0 0 0
+    1 VTXLOW -0.0965 0.0965 0.0137 0.000309 0.0937 2 0 1.5708 3e-06 3e-06 1
+    1 VTXLOW -0.0965 0.0965 0.0235 0.000309 0.0937 2 0 1.5708 3e-06 3e-06 1
+    2 VTXDSK 0.034 0.28 -0.3023 0.000909 0.0937 2 0 1.5708 7e-06 7e-06 1
+    2 VTXDSK 0.034 0.28 0.3023 0.000909 0.0937 2 0 1.5708 7e-06 7e-06 1
+  }
+}
+module Merger TrackMerger {
+  add InputArray TrackCovariance/tracks
+  add InputArray TrackCovariance/other
+}
+"""
+
+
+def test_parse_card():
+    card = parse_card(card_text, "test.tcl")
+    assert card.B == 2.0
+    assert card.execution_path == ["ParticlePropagator", "TrackCovariance", "TrackMerger"]
+    assert card.modules["TrackMerger"].parameters["InputArray"] == [["TrackCovariance/tracks"], ["TrackCovariance/other"]]
+    assert len(card.geometry) == 5 and card.geometry[1].label == "VTXLOW" and card.geometry[1].reso_up == 3e-06
+
+
+def test_layers():
+    card = parse_card(card_text, "test.tcl")
+    assert card.layer_radius("VTXIB", 1) == 13.7
+    assert card.layer_radius("VTXIB", 2) == 23.5
+    # the disks at +-z are one layer
+    assert [len(layer) for layer in card.layers("VTXD")] == [2]
+    assert card.layer_radius("VTXD", 1) == 302.3
+    with pytest.raises(ValueError, match="no layer 3"):
+        card.layer_radius("VTXIB", 3)
+    with pytest.raises(ValueError, match="Unknown subsystem"):
+        card.layers("TPC")
+
+
+def test_sources_and_missing_modules():
+    card = parse_card(card_text, "test.tcl")
+    assert card.sources == ["common.tcl"]
+    assert card.missing_modules == ["ParticlePropagator"]
+
+
+def test_no_field():
+    card = parse_card(card_text.replace("set B 2.0\n", "").replace("set Bz $B\n", ""), "nofield.tcl")
+    with pytest.raises(ValueError, match="nofield.tcl sets no magnetic field"):
+        card.B
+
+
+def test_read_card_memo(tmp_path):
+    card_file = tmp_path / "card.tcl"
+    card_file.write_text(card_text)
+    copy = tmp_path / "copy.tcl"
+    copy.write_text(card_text)
+
+    card = read_card(str(card_file), cache=str(tmp_path / "cache"))
+    # same content under another name, and from the pickle in a new process (memo cleared)
+    assert read_card(str(copy), cache=None).path == str(copy)
+    import delphes_card
+    delphes_card._memo.clear()
+    assert read_card(str(card_file), cache=str(tmp_path / "cache")).geometry == card.geometry
+
+
+def test_real_card():
+    card = read_card(os.path.join(cards_dir, "IDEA_base25.tcl"), cache=None)
+    assert card.B == 2.0
+    assert card.layer_radius("VTXIB", 1) == 13.7
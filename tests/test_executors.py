@@ -0,0 +1,47 @@
+import subprocess
+
+import pytest
+
+from executors import BatchExecutor, FakeQueueExecutor, JobLostError
+
+
+def test_fake_queue_success(tmp_path):
+    executor = FakeQueueExecutor(str(tmp_path / "jobs"), poll_interval=0.1)
+    executor.run(f"echo done > {tmp_path / 'out.txt'}", name="ok")
+    assert (tmp_path / "out.txt").read_text() == "done\n"
+
+
+def test_fake_queue_failure(tmp_path):
+    executor = FakeQueueExecutor(str(tmp_path / "jobs"), poll_interval=0.1)
+    # even an exit in the command is followed by its status
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        executor.run("exit 3", name="failing")
+    assert error.value.returncode == 3
+
+
+def test_fake_queue_timeout(tmp_path):
+    executor = FakeQueueExecutor(str(tmp_path / "jobs"), poll_interval=0.1, timeout=1)
+    with pytest.raises(JobLostError, match="did not finish within 1 s"):
+        executor.run("sleep 30", name="slow")
+
+
+def test_lost_job(tmp_path):
+    # a job that leaves the queue without writing its status, e.g. evicted
+    class Evicting(FakeQueueExecutor):
+        def submit(self, job, script, log):
+            return super().submit(job, "/bin/true", log)
+
+    with pytest.raises(JobLostError, match="left the queue without an exit status"):
+        Evicting(str(tmp_path / "jobs"), poll_interval=0.1).run("echo never", name="lost")
+
+
+def test_incomplete_backend(tmp_path):
+    class NoCancel(BatchExecutor):
+        def submit(self, job, script, log):
+            pass
+
+        def state(self, job_id):
+            pass
+
+    with pytest.raises(TypeError, match="cancel"):
+        NoCancel(str(tmp_path / "jobs"))
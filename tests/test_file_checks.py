@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+from file_checks import check_analysis, check_file, check_hepmc, check_root
+
+
+def root_header(end, seek_info, big = False):
+    # the fields of a TFile header read by check_root, everything else zero
+    if big:
+        header = b"root" + struct.pack(">i", 1062206) + struct.pack(">i", 100) + struct.pack(">q", end)
+        header = header.ljust(45, b"\0") + struct.pack(">q", seek_info)
+    else:
+        header = b"root" + struct.pack(">i", 62206) + struct.pack(">i", 100) + struct.pack(">i", end)
+        header = header.ljust(37, b"\0") + struct.pack(">i", seek_info)
+    return header.ljust(64, b"\0")
+
+
+def write_root(path, size, end, seek_info, big = False):
+    with open(path, 'wb') as f:
+        f.write(root_header(end, seek_info, big).ljust(size, b"\0"))
+    return str(path)
+
+
+@pytest.mark.parametrize("big", [False, True])
+def test_closed_root_file(tmp_path, big):
+    check_root(write_root(tmp_path / "ok.root", 1000, 1000, 900, big))
+
+
+@pytest.mark.parametrize("big", [False, True])
+def test_truncated_root_file(tmp_path, big):
+    # cut short: the header points past the end of the file
+    root_file = write_root(tmp_path / "cut.root", 500, 1000, 900, big)
+    with pytest.raises(ValueError, match="Truncated"):
+        check_root(root_file)
+
+
+def test_root_file_not_closed(tmp_path):
+    # the streamer info is only written when the file is closed
+    root_file = write_root(tmp_path / "open.root", 1000, 1000, 0)
+    with pytest.raises(ValueError, match="Truncated"):
+        check_root(root_file)
+
+
+def test_not_a_root_file(tmp_path):
+    path = tmp_path / "text.root"
+    path.write_text("not a ROOT file at all, but long enough for a header" + " "*64)
+    with pytest.raises(ValueError, match="not a ROOT file"):
+        check_root(str(path))
+
+
+def test_missing_and_empty(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        check_file(str(tmp_path / "missing.root"))
+    (tmp_path / "empty.root").write_bytes(b"")
+    with pytest.raises(ValueError, match="Empty"):
+        check_root(str(tmp_path / "empty.root"))
+
+
+def test_hepmc(tmp_path):
+    complete = tmp_path / "complete.hepmc"
+    complete.write_text("HepMC::Version 3.02.05\nHepMC::Asciiv3-START_EVENT_LISTING\nE 0 1 3\nHepMC::Asciiv3-END_EVENT_LISTING\n\n")
+    check_hepmc(str(complete))
+
+    truncated = tmp_path / "truncated.hepmc"
+    truncated.write_text("HepMC::Version 3.02.05\nHepMC::Asciiv3-START_EVENT_LISTING\nE 0 1 3\n")
+    with pytest.raises(ValueError, match="no end of event listing"):
+        check_hepmc(str(truncated))
+
+
+def test_unbinned_analysis(tmp_path):
+    import numpy as np
+
+    residuals = tmp_path / "sample.npz"
+    np.savez_compressed(residuals, RP_TRK_D0_um=np.zeros(10, dtype=np.float32))
+    check_analysis(str(residuals))
+
+    data = residuals.read_bytes()
+    residuals.write_bytes(data[:len(data)//2])
+    with pytest.raises(ValueError, match="Truncated"):
+        check_analysis(str(residuals))
@@ -0,0 +1,74 @@
+import gzip
+import io
+import math
+
+import pytest
+
+import hepmc_gun
+from d0z0 import hepmc_event_ranges
+from file_checks import check_hepmc
+
+
+def write_card(path, nevents = 100, theta = "20.0,20.0", mom = "5.0,5.0", seed = None):
+    path.write_text(f"npart 1\ntheta_range {theta}\nmom_range {mom}\npid_list 13\nnevents {nevents}\n" + (f"seed {seed}\n" if seed is not None else ""))
+    return str(path)
+
+
+def particles(text):
+    # (pid, px, py, pz, e, m) of the generated (non beam) particles
+    return [tuple(float(x) for x in line.split()[3:9]) for line in text.splitlines() if line.startswith("P ") and line.split()[2] == "-1"]
+
+
+def test_events(tmp_path):
+    card = write_card(tmp_path / "mu.input", nevents=250)
+    output = tmp_path / "mu.hepmc"
+    hepmc_gun.generate(card, str(output), chunk_size=100)
+
+    text = output.read_text()
+    check_hepmc(str(output))
+    assert text.startswith(f"HepMC::Version {hepmc_gun.hepmc_version}\nHepMC::Asciiv3-START_EVENT_LISTING\n")
+    assert [line.split()[1] for line in text.splitlines() if line.startswith("E ")] == [str(i) for i in range(250)]
+
+    for pid, px, py, pz, e, m in particles(text):
+        p = math.sqrt(px*px + py*py + pz*pz)
+        # the mass is the one of the (float) four-momentum, as written by WriterAscii
+        assert pid == 13 and m == pytest.approx(0.10566, abs=1e-3)
+        assert p == pytest.approx(5, rel=1e-6)
+        assert math.degrees(math.acos(pz/p)) == pytest.approx(20, abs=1e-4)
+        assert e == pytest.approx(math.sqrt(p*p + m*m), rel=1e-6)
+
+
+def test_deterministic(tmp_path):
+    card = write_card(tmp_path / "mu.input", seed=7)
+    first, second = io.StringIO(), io.StringIO()
+    hepmc_gun.generate(card, first)
+    hepmc_gun.generate(card, second)
+    assert first.getvalue() == second.getvalue()
+
+    other = io.StringIO()
+    hepmc_gun.generate(card, other, seed=8)
+    assert other.getvalue() != first.getvalue()
+
+
+def test_teed_streams_and_gzip(tmp_path):
+    card = write_card(tmp_path / "mu.input", theta="10.0,90.0", mom="1.0,100.0")
+    streams = [io.StringIO(), io.StringIO()]
+    hepmc_gun.generate(card, streams)
+    assert streams[0].getvalue() == streams[1].getvalue()
+
+    hepmc_gun.generate(card, str(tmp_path / "mu.hepmc.gz"))
+    with gzip.open(tmp_path / "mu.hepmc.gz", 'rt') as f:
+        assert f.read() == streams[0].getvalue()
+
+
+def test_shards_cover_all_events(tmp_path):
+    card = write_card(tmp_path / "mu.input", nevents=1000)
+    output = tmp_path / "mu.hepmc"
+    hepmc_gun.generate(card, str(output))
+
+    data = output.read_bytes()
+    header_end, ranges = hepmc_event_ranges(str(output), 4)
+    assert len(ranges) == 4 and ranges[0][0] == header_end
+    events = b"".join(data[start:stop] for start, stop in ranges)
+    assert events == data[header_end:data.rfind(b"HepMC::Asciiv3-END_EVENT_LISTING")]
+    assert all(data[start:start + 2] == b"E " for start, _ in ranges)
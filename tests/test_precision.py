@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+
+from datapoints import DataPoints, columns
+from precision import events_needed, write_nevents
+
+
+def points(thetas, moms, values, errors, nevents):
+    n = len(values)
+    data = {name: np.zeros(n) for name in columns}
+    data.update({
+        "detector": np.array(["a"]*n), "param": np.array(["d0"]*n), "subsystem": np.array(["VTXIB"]*n),
+        "theta": np.asarray(thetas, dtype=np.float64), "p": np.asarray(moms, dtype=np.float64),
+        "value": np.asarray(values, dtype=np.float64), "error": np.asarray(errors, dtype=np.float64),
+        "nevents": np.asarray(nevents, dtype=np.int64),
+    })
+    return DataPoints(data)
+
+
+def test_events_needed():
+    # 2% error with 10k events: 1% needs 4 times more; the largest need of a (theta, p) wins
+    data = points([10, 10, 20], [1, 1, 1], [10, 10, 10], [0.2, 0.1, 0.05], [10000, 10000, 10000])
+    assert events_needed(data, 0.01) == {(10.0, 1.0): 40000, (20.0, 1.0): 3000}
+
+
+def test_events_needed_ratio_and_limits():
+    data = points([10], [1], [10], [0.12], [10000])
+    # the target on the ratio is target/sqrt(2) on each sample: 28800 events, rounded up
+    assert events_needed(data, 0.01, ratio=True) == {(10.0, 1.0): 29000}
+    assert events_needed(data, 0.001, maximum=500000) == {(10.0, 1.0): 500000}
+    assert events_needed(data, 0.5) == {(10.0, 1.0): 1000}
+
+
+def test_points_without_error():
+    data = points([10], [1], [10], [np.nan], [10000])
+    assert events_needed(data, 0.01) == {}
+
+
+def test_write_nevents(tmp_path):
+    output = tmp_path / "nevents.json"
+    write_nevents(str(output), {(20.0, 1.0): 3000, (10.0, 1.0): 40000})
+    assert json.loads(output.read_text()) == [{"theta": 10.0, "p": 1.0, "nevents": 40000}, {"theta": 20.0, "p": 1.0, "nevents": 3000}]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from resolution import fit_gauss, quantile_resolution, quantile_resolution_error, shape_metrics
+
+
+def bootstrap_error(x, rng, resamples = 400):
+    values = [0.5*np.subtract(*np.quantile(x[rng.integers(0, len(x), len(x))], [0.84, 0.16])) for _ in range(resamples)]
+    return float(np.std(values))
+
+
+@pytest.mark.parametrize("shape", ["gauss", "student_t"])
+def test_quantile_error_against_bootstrap(shape):
+    rng = np.random.default_rng(1)
+    x = rng.normal(0, 5, 20000) if shape == "gauss" else 5*rng.standard_t(3, 20000)
+
+    error = quantile_resolution_error(lambda probabilities: np.quantile(x, probabilities), len(x))
+    # 400 resamples measure the error to about 4%
+    assert error == pytest.approx(bootstrap_error(x, rng), rel=0.15)
+
+
+def test_quantile_error_undefined():
+    assert np.isnan(quantile_resolution_error(lambda probabilities: np.zeros(len(probabilities)), 100))
+    assert np.isnan(quantile_resolution_error(lambda probabilities: np.asarray(probabilities), 0))
+
+
+def test_quantile_resolution_gauss():
+    x = np.random.default_rng(2).normal(0, 3, 200000)
+    result = quantile_resolution(x)
+    assert result["res_quantile"] == pytest.approx(3, rel=0.01)
+    assert result["xMin"] < -9 and result["xMax"] > 9
+
+
+def test_fit_gauss_truncated():
+    x = np.random.default_rng(3).normal(1, 2, 100000)
+    fit = fit_gauss(x, -2, 4)
+    assert fit["mu"] == pytest.approx(1, abs=0.05)
+    assert fit["sigma"] == pytest.approx(2, rel=0.02)
+
+
+def test_shape_metrics_gauss():
+    x = np.random.default_rng(4).normal(0, 1, 200000)
+    metrics = shape_metrics(x, 0, 1)
+    assert metrics.sigma_FWHM == pytest.approx(2.3548, rel=1e-4)
+    assert metrics.core_fraction == pytest.approx(0.954, abs=0.005)
+    assert metrics.tail_fraction == pytest.approx(0.0027, abs=0.001)
+    assert metrics.width_68 == pytest.approx(1, rel=0.02)
+    assert metrics.width_95 == pytest.approx(2, rel=0.02)
+
+
+def test_shape_metrics_negative_sigma():
+    # the gaus fit of ROOT can return a negative sigma
+    x = np.random.default_rng(5).normal(0, 1, 10000)
+    assert shape_metrics(x, 0, -1) == shape_metrics(x, 0, 1)
+    assert shape_metrics(x, 0, -1).sigma_FWHM > 0
+
+
+def test_shape_metrics_binned():
+    # bin centers weighted by their contents give the same as the entries
+    centers = np.linspace(-5, 5, 101)
+    contents = np.exp(-0.5*centers**2)
+    metrics = shape_metrics(centers, 0, 1, weights=contents)
+    assert metrics.core_fraction == pytest.approx(0.95, abs=0.02)
+    assert metrics.width_68 < metrics.width_95
@@ -0,0 +1,83 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+import results_store
+from results_store import append_result, append_rows, load_campaign, load_results, results_db_path
+
+
+def sample_json(theta, p, **metrics):
+    # what plot_d0z0.py writes next to every plot
+    return {"theta_range": f"{theta},{theta}", "mom_range": f"{p},{p}", "pid_list": "13", "nevents": 1000, "npart": 1,
+            "subsystem": "VTXIB", "layer": 1, "radius": 13.7, **metrics}
+
+
+def write_campaign(campaign_dir, detector, thetas = (10, 20), p = 1):
+    for param in ["d0", "z0"]:
+        plots = os.path.join(campaign_dir, detector, f"gun_{param}_plots")
+        os.makedirs(plots)
+        for theta in thetas:
+            with open(os.path.join(plots, f"mu_minus_theta_{theta}_p_{p}.json"), 'w') as f:
+                json.dump(sample_json(theta, p, sigma=theta/10, res_quantile=theta/5), f)
+
+
+def helper_append(args):
+    db_path, detector = args
+    # every first row of a new store adds the same metric columns
+    append_result(db_path, detector, "d0", sample_json(10, 1, **{f"metric_{i}": float(i) for i in range(10)}))
+
+
+def test_concurrent_append_rows(tmp_path):
+    for trial in range(3):
+        db_path = str(tmp_path / f"results_{trial}.sqlite")
+        with multiprocessing.Pool(8) as pool:
+            pool.map(helper_append, [(db_path, f"detector_{i}") for i in range(8)])
+
+        rows = load_results(db_path)
+        assert len(rows) == 8
+        assert np.all(rows["metric_9"] == 9)
+
+
+def test_append_replaces_same_key(tmp_path):
+    db_path = str(tmp_path / "results.sqlite")
+    append_result(db_path, "IDEA_base25", "d0", sample_json(10, 1, sigma=1.0))
+    append_result(db_path, "IDEA_base25", "d0", sample_json(10, 1, sigma=2.0, rms=3.0))
+    rows = load_results(db_path)
+    assert len(rows) == 1 and rows["sigma"][0] == 2.0 and rows["rms"][0] == 3.0
+
+
+def test_load_campaign_json_only(tmp_path):
+    write_campaign(str(tmp_path), "IDEA_base25")
+    rows = load_campaign(str(tmp_path), ["IDEA_base25"])
+    assert len(rows) == 4
+    assert list(rows["theta"][rows["param"] == "d0"]) == [10, 20]
+    np.testing.assert_allclose(rows["sigma"], [1, 2, 1, 2])
+
+
+def test_load_campaign_store_and_json(tmp_path):
+    # a new run created the store of a campaign whose other detectors only have JSON files
+    write_campaign(str(tmp_path), "IDEA_base25")
+    append_rows(results_db_path(str(tmp_path)), [results_store.row_from_json("IDEA_new", "d0", sample_json(10, 1, sigma=5.0, t_sigma=4.0))])
+
+    rows = load_campaign(str(tmp_path), ["IDEA_base25", "IDEA_new"])
+    assert sorted(set(rows["detector"])) == ["IDEA_base25", "IDEA_new"]
+    new = rows[rows["detector"] == "IDEA_new"]
+    assert len(new) == 1 and new["sigma"][0] == 5.0 and new["t_sigma"][0] == 4.0
+    # metrics a detector does not have are nan
+    assert np.all(np.isnan(rows["t_sigma"][rows["detector"] == "IDEA_base25"]))
+
+
+def test_json_index_follows_changes(tmp_path):
+    write_campaign(str(tmp_path), "IDEA_base25")
+    load_campaign(str(tmp_path), ["IDEA_base25"])
+    assert os.path.exists(tmp_path / results_store.index_name)
+
+    sample = tmp_path / "IDEA_base25" / "gun_d0_plots" / "mu_minus_theta_10_p_1.json"
+    sample.write_text(json.dumps(sample_json(10, 1, sigma=7.5)))
+    os.remove(tmp_path / "IDEA_base25" / "gun_z0_plots" / "mu_minus_theta_20_p_1.json")
+
+    rows = load_campaign(str(tmp_path), ["IDEA_base25"])
+    assert len(rows) == 3
+    assert rows["sigma"][(rows["param"] == "d0") & (rows["theta"] == 10)][0] == 7.5
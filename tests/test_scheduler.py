@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import GraphError, Task, run_graph
+
+
+class Flaky:
+    # fails with error the first failures calls
+    def __init__(self, failures, error = OSError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error(f"attempt {self.calls}")
+        return self.calls
+
+
+def test_dependencies_run_first():
+    order = []
+    tasks = [
+        Task("plot", order.append, "plot", deps=["analysis"]),
+        Task("analysis", order.append, "analysis", deps=["delphes"]),
+        Task("delphes", order.append, "delphes"),
+    ]
+    run_graph(tasks, max_workers=4)
+    assert order == ["delphes", "analysis", "plot"]
+
+
+def test_retry_on_transient_error():
+    flaky = Flaky(2)
+    results = run_graph([Task("delphes", flaky)], retries=2, retry_on=(OSError,))
+    assert results == {"delphes": 3}
+
+
+def test_retries_exhausted():
+    flaky = Flaky(5)
+    with pytest.raises(GraphError) as error:
+        run_graph([Task("delphes", flaky)], retries=2, retry_on=(OSError,))
+    assert flaky.calls == 3
+    assert error.value.status["delphes"]["status"] == "failed"
+    assert error.value.status["delphes"]["attempts"] == 3
+
+
+def test_no_retry_on_other_errors():
+    flaky = Flaky(1, error=ValueError)
+    with pytest.raises(GraphError):
+        run_graph([Task("delphes", flaky)], retries=3, retry_on=(OSError,))
+    assert flaky.calls == 1
+
+
+def test_failure_skips_downstream_only(tmp_path):
+    done = []
+    tasks = [
+        Task("a/delphes", Flaky(1, error=ValueError)),
+        Task("a/analysis", done.append, "a/analysis", deps=["a/delphes"]),
+        Task("a/plot", done.append, "a/plot", deps=["a/analysis"]),
+        Task("b/delphes", done.append, "b/delphes"),
+        Task("b/analysis", done.append, "b/analysis", deps=["b/delphes"]),
+    ]
+    status_file = tmp_path / "status.txt"
+    with pytest.raises(GraphError) as error:
+        run_graph(tasks, max_workers=2, status_file=str(status_file))
+
+    status = error.value.status
+    assert status["a/delphes"]["status"] == "failed"
+    assert status["a/analysis"]["status"] == "skipped"
+    assert status["a/plot"]["status"] == "skipped"
+    assert sorted(done) == ["b/analysis", "b/delphes"]
+    assert "2 done, 1 failed, 2 skipped" in status_file.read_text()
+
+
+def test_cycle():
+    tasks = [Task("a", print, deps=["b"]), Task("b", print, deps=["a"])]
+    with pytest.raises(ValueError, match="cycle"):
+        run_graph(tasks)
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError, match="unknown task"):
+        run_graph([Task("a", print, deps=["missing"])])
+
+
+def test_slots_budget():
+    lock = threading.Lock()
+    used, peak = [0], [0]
+
+    def helper_work(slots):
+        with lock:
+            used[0] += slots
+            peak[0] = max(peak[0], used[0])
+        time.sleep(0.05)
+        with lock:
+            used[0] -= slots
+
+    tasks = [Task(f"stream{i}", helper_work, 3, slots=3) for i in range(3)]
+    tasks += [Task(f"single{i}", helper_work, 1) for i in range(4)]
+    tasks.append(Task("huge", helper_work, 6, slots=6))
+    run_graph(tasks, max_workers=4)
+
+    # the task larger than the budget ran alone
+    assert peak[0] == 6
+    tasks.pop()
+    peak[0] = 0
+    run_graph(tasks, max_workers=4)
+    assert peak[0] <= 4
@@ -0,0 +1,77 @@
+import os
+
+from stage_cache import StageCache
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_same_inputs_same_key(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    card = write(tmp_path / "card.tcl", "set B 2.0\n")
+    root_file = str(tmp_path / "out.root")
+    assert cache.key("delphes", files=[card], outputs=[root_file]) == cache.key("delphes", files=[card], outputs=[root_file])
+
+
+def test_input_content_changes_key(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    card = write(tmp_path / "card.tcl", "set B 2.0\n")
+    before = cache.key("delphes", files=[card])
+    write(card, "set B 3.0\n")
+    # a different size, so the memoized digest is not reused
+    assert cache.key("delphes", files=[card]) != before
+
+
+def test_output_path_changes_key(tmp_path):
+    # byte-identical cards of two campaigns, e.g. IDEA_base25 in VTXIB_r1 and in inside_pipe
+    cache = StageCache(str(tmp_path / "cache"))
+    first = write(tmp_path / "IDEA_base25.tcl", "set B 2.0\n")
+    os.makedirs(tmp_path / "other")
+    second = write(tmp_path / "other" / "IDEA_base25.tcl", "set B 2.0\n")
+
+    first_root, second_root = str(tmp_path / "VTXIB_r1.root"), str(tmp_path / "inside_pipe.root")
+    first_key = cache.key("delphes", files=[first], outputs=[first_root])
+    second_key = cache.key("delphes", files=[second], outputs=[second_root])
+    assert first_key != second_key
+
+    write(first_root, "root")
+    cache.mark_done(first_key, [first_root])
+    assert cache.is_done(first_key)
+    assert not cache.is_done(second_key)
+
+
+def test_done_until_output_removed(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    output = write(tmp_path / "out.root", "root")
+    key = cache.key("delphes", params=[1], outputs=[output])
+    assert not cache.is_done(key)
+
+    cache.mark_done(key, [output])
+    assert cache.is_done(key)
+    # records survive a new cache object (next run)
+    assert StageCache(str(tmp_path / "cache")).is_done(key)
+
+    os.remove(output)
+    assert not cache.is_done(key)
+
+
+def test_upstream_key_propagates(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    root_file = write(tmp_path / "out.root", "root")
+    analysis_file = str(tmp_path / "analysis.root")
+
+    cache.mark_done(cache.key("delphes", params=["card v1"], outputs=[root_file]), [root_file])
+    first = cache.key("analysis", artifacts=[root_file], outputs=[analysis_file])
+
+    # same ROOT file content, produced by another upstream key
+    cache.mark_done(cache.key("delphes", params=["card v2"], outputs=[root_file]), [root_file])
+    assert cache.key("analysis", artifacts=[root_file], outputs=[analysis_file]) != first
+
+
+def test_artifact_made_outside_the_cache(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    root_file = write(tmp_path / "out.root", "root")
+    assert cache.artifact_key(root_file) == cache.digest(root_file)
@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from conftest import cards_dir
+from sweep import generate_cards, sweep_values
+
+
+@pytest.mark.parametrize("radius", [11.7, 15.7, 17.7])
+def test_regenerates_hand_made_cards(tmp_path, radius):
+    # IDEA_VTXIB_r1_117.tcl & co were made by hand from IDEA_base25.tcl
+    detectors = generate_cards(os.path.join(cards_dir, "IDEA_base25.tcl"), "VTXIB", 1, "r", [radius], str(tmp_path))
+
+    name = f"IDEA_base25_VTXIB_r1_{radius:g}".replace(".", "p")
+    assert detectors == [(name, "VTXIB", 1, radius)]
+
+    with open(tmp_path / f"{name}.tcl", 'rb') as f, open(os.path.join(cards_dir, f"IDEA_VTXIB_r1_{radius*10:.0f}.tcl"), 'rb') as hand_made:
+        assert f.read() == hand_made.read()
+
+    with open(tmp_path / f"{name}.json", 'r') as f:
+        metadata = json.load(f)
+    assert metadata["radius"] == radius and metadata["base_card"] == "IDEA_base25"
+
+
+def test_existing_card_not_rewritten(tmp_path):
+    base = os.path.join(cards_dir, "IDEA_base25.tcl")
+    generate_cards(base, "VTXIB", 1, "r", [12], str(tmp_path))
+    card = tmp_path / "IDEA_base25_VTXIB_r1_12.tcl"
+    mtime = card.stat().st_mtime_ns
+    generate_cards(base, "VTXIB", 1, "r", [12], str(tmp_path))
+    assert card.stat().st_mtime_ns == mtime
+
+
+def test_forward_disks_keep_their_side(tmp_path):
+    base = os.path.join(cards_dir, "IDEA_base25.tcl")
+    (name, _, _, radius), = generate_cards(base, "VTXD", 1, "r", [310], str(tmp_path))
+    assert radius == 310
+
+    disks = [line.split() for line in open(tmp_path / f"{name}.tcl") if line.split()[:2] == ["2", "VTXDSK"]]
+    assert sorted(float(fields[4]) for fields in disks if abs(float(fields[4])) == 0.31) == [-0.31, 0.31]
+
+
+def test_unknown_layer(tmp_path):
+    with pytest.raises(ValueError, match="no layer 9"):
+        generate_cards(os.path.join(cards_dir, "IDEA_base25.tcl"), "VTXIB", 9, "r", [12], str(tmp_path))
+
+
+def test_sweep_values():
+    assert sweep_values(11, 12, 0.1) == [11, 11.1, 11.2, 11.3, 11.4, 11.5, 11.6, 11.7, 11.8, 11.9, 12]
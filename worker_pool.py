@@ -0,0 +1,144 @@
+import json
+import queue
+import select
+import subprocess
+import threading
+
+from instrumentation import add_usage
+
+### POOL OF PERSISTENT ROOT WORKERS ###
+# Each worker is one `python delphes/worker.py` started once inside the FCCAnalyses environment,
+# so the login shell, `import ROOT`, gSystem.Load("libFCCAnalyses") and the functions.h JIT
+# are paid once per worker instead of once per sample.
+# call() blocks until a worker is free, so it can be used straight from the task graph threads.
+#
+# Two kinds of failures: WorkerError when the worker itself is gone (crashed, e.g. a segfault in
+# ROOT, also while idle, or not answering within the timeout), after which it is restarted and the
+# call can be retried; WorkerCallError when the call ran and raised (bad input, missing file, ...),
+# which would fail the same way again. A worker that cannot be restarted leaves the pool.
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class WorkerCallError(RuntimeError):
+    pass
+
+
+class Worker:
+
+    def __init__(self, setup_script, worker_script, timeout = None):
+        self.setup_script = setup_script
+        self.worker_script = worker_script
+        self.timeout = timeout
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            ["bash", "-lc", f"source {self.setup_script} && exec python -u {self.worker_script}"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        # wait until ROOT and the libraries are loaded
+        self.receive()
+
+    def call(self, name, **kwargs):
+        try:
+            self.process.stdin.write(json.dumps({"call": name, "kwargs": kwargs}) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            # e.g. BrokenPipeError: the worker died since its last call
+            raise WorkerError(f"Worker {self.worker_script} is gone (exit code {self.process.wait()}): {e}") from e
+        return self.receive()
+
+    def receive(self):
+        # one reply line per request, so nothing is left in the stdout buffer between calls
+        if self.timeout is not None and not select.select([self.process.stdout], [], [], self.timeout)[0]:
+            raise WorkerError(f"Worker {self.worker_script} did not answer within {self.timeout} s")
+        line = self.process.stdout.readline()
+        if not line:
+            raise WorkerError(f"Worker {self.worker_script} exited with code {self.process.wait()}")
+        return json.loads(line)
+
+    def close(self, kill = False):
+        if self.process.poll() is None:
+            if kill:
+                self.process.kill()
+            else:
+                self.process.stdin.close()
+            self.process.wait()
+
+
+class WorkerPool:
+
+    def __init__(self, setup_script, worker_script, nworkers = 4, timeout = None):
+        """
+        timeout: seconds a call may take before its worker counts as hung (None: no limit)
+        """
+
+        self.idle = queue.Queue()
+        self.workers = []
+
+        # workers load ROOT concurrently
+        def helper_start():
+            worker = Worker(setup_script, worker_script, timeout)
+            self.workers.append(worker)
+            self.idle.put(worker)
+
+        threads = [threading.Thread(target=helper_start) for _ in range(nworkers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not self.workers:
+            raise WorkerError(f"Could not start any {worker_script} worker")
+
+    def call(self, name, **kwargs):
+        worker = self.idle.get()
+        if worker is None:
+            # no worker left: passed on so that every waiting call fails the same way
+            self.idle.put(None)
+            raise WorkerError("No worker left in the pool, they could not be restarted")
+
+        healthy = True
+        try:
+            reply = worker.call(name, **kwargs)
+        except WorkerError:
+            # the worker died or hangs: replace it and report the failed call
+            worker.close(kill=True)
+            healthy = self.restart(worker)
+            raise
+        finally:
+            if healthy:
+                self.idle.put(worker)
+            elif not self.workers:
+                self.idle.put(None)
+
+        # resources used by the call, measured in the worker
+        if "usage" in reply:
+            add_usage(**reply["usage"])
+
+        if not reply["ok"]:
+            raise WorkerCallError(f"{name}({kwargs}) failed in worker:\n{reply['error']}")
+
+    def restart(self, worker):
+        # False, and the worker leaves the pool, if it does not come back
+        try:
+            worker.start()
+            return True
+        except (WorkerError, OSError) as e:
+            print(f"Could not restart worker {worker.worker_script}: {e}")
+            worker.close(kill=True)
+            self.workers.remove(worker)
+            return False
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()